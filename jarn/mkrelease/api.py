@@ -0,0 +1,138 @@
+import threading
+
+from mkrelease import ReleaseMaker
+from exit import silent
+
+# Releases change the working directory
+_lock = threading.Lock()
+
+
+class ReleaseError(Exception):
+    """A release failed.
+
+    'msg' is the error message, 'code' the exit code the command line
+    would have returned, and 'phase' the release phase that failed.
+    """
+
+    def __init__(self, msg, code=1, phase=None):
+        Exception.__init__(self, msg)
+        self.msg = msg
+        self.code = code
+        self.phase = phase
+
+
+class UsageError(ReleaseError):
+    """Bad options or dist-locations."""
+
+
+class SCMError(ReleaseError):
+    """The sandbox or repository could not be checked, committed, or tagged."""
+
+
+class BuildError(ReleaseError):
+    """setup.py failed to describe or build the package."""
+
+
+class UploadError(ReleaseError):
+    """The release could not be stored, signed, or distributed."""
+
+
+PHASE_ERRORS = {
+    'get_python': UsageError,
+    'get_options': UsageError,
+    'get_package': SCMError,
+    'get_scm': SCMError,
+    'commit': SCMError,
+    'clone': SCMError,
+    'check_sandbox': SCMError,
+    'tag': SCMError,
+    'sandbox_info': BuildError,
+    'check_package': BuildError,
+    'package_info': BuildError,
+    'egg_info': BuildError,
+    'dist': BuildError,
+    'digest': UploadError,
+    'store': UploadError,
+    'distribute': UploadError,
+    'check_locations': UploadError,
+    'sign': UploadError,
+    'stream': UploadError,
+    'simple_index': UploadError,
+}
+
+
+def get_error(e, phase):
+    """Return the ReleaseError for SystemExit 'e' raised in 'phase'.
+    """
+    if phase and phase.startswith('upload '):
+        klass = UploadError
+    else:
+        klass = PHASE_ERRORS.get(phase, ReleaseError)
+    msg = getattr(e, 'msg', None)
+    code = e.code
+    if msg is None:
+        # Raised by msg_exit, e.g. for --help
+        msg = 'mkrelease: Exited without releasing'
+        klass = UsageError
+    if not isinstance(code, int):
+        msg, code = str(code), 1
+    return klass(msg, code, phase)
+
+
+class ReleaseResult(object):
+    """The outcome of a release.
+
+    'filename' is the name of the dist file, 'digests' its size and
+    digests, and 'locations' the dist-locations it was uploaded to.
+    'phases' is a list of (name, seconds) tuples and 'duration' the
+    total time taken.
+    """
+
+    def __init__(self, name, version, tagid='', url='', filename='', digests=None,
+                 locations=(), phases=(), duration=0.0):
+        self.name = name
+        self.version = version
+        self.tagid = tagid
+        self.url = url
+        self.filename = filename
+        self.digests = digests or {}
+        self.locations = list(locations)
+        self.phases = list(phases)
+        self.duration = duration
+
+    def __repr__(self):
+        return '<ReleaseResult %s %s>' % (self.name, self.version)
+
+
+def release(package, locations=(), options=()):
+    """Release 'package' to 'locations' and return a ReleaseResult.
+
+    'package' is an SCM URL or sandbox directory, 'locations' a list
+    of dist-locations, and 'options' a list of further command line
+    options, e.g. ['-e', '--git']. If 'package' is a URL, a branch or
+    tag may be given as ['scm-url', 'rev'].
+
+    Failures raise a ReleaseError subclass instead of exiting; error
+    messages and warnings are not printed, not even by worker threads.
+    Other output goes to stdout and stderr like on the command line. Releases run one at a time, because they
+    change the working directory.
+    """
+    args = list(options)
+    for location in locations:
+        args.extend(['-d', location])
+    args.append('--')
+    if isinstance(package, basestring):
+        args.append(package)
+    else:
+        args.extend(package)
+
+    with _lock, silent():
+        rm = ReleaseMaker(args)
+        try:
+            rm.run()
+        except SystemExit, e:
+            raise get_error(e, rm.timer.failed)
+    if rm.result is None:
+        raise UsageError('mkrelease: Nothing was released', 1)
+    return ReleaseResult(phases=rm.timer.phases, duration=rm.timer.total(),
+                         **rm.result)
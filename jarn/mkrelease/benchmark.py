@@ -0,0 +1,192 @@
+"""Benchmark uploads against in-process index servers.
+
+Usage: python -m jarn.mkrelease.benchmark [options] package-dir [mkrelease-options]
+       python -m jarn.mkrelease.benchmark -s [-r number] [-t seconds]
+
+Options:
+  -n number     Number of index servers (default: 3)
+  -r number     Number of releases to time (default: 1)
+  -l seconds    Response latency of the servers (default: 0)
+  -b bytes      Bandwidth of the servers in bytes/s (default: unlimited)
+  -c            Compare native uploads with and without --stream
+  -u            Upload with 'setup.py upload' instead of the native uploader
+  -s            Time the startup of 'mkrelease -v', '-l', and '--help'
+  -t seconds    Fail if a startup takes longer (default: no limit)
+
+The package is released with 'mkrelease -CTq' to all servers; additional
+mkrelease options, e.g. '-e' or '--git', are passed through. Uploads use
+the native uploader ('native-upload = yes') unless -u is given.
+
+Startup is timed in fresh interpreters; the best of -r runs counts.
+"""
+
+import sys
+import os
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+
+from os.path import abspath
+
+from jarn.mkrelease.exit import err_exit
+
+STARTUP_COMMANDS = (['-v'], ['-l'], ['--help'])
+STARTUP_SCRIPT = ('import sys; from jarn.mkrelease.mkrelease import main; '
+                  'sys.exit(main(sys.argv[1:]))')
+
+
+class Benchmark(object):
+    """Time releases to N index servers."""
+
+    def __init__(self, servers=3, latency=0, bandwidth=0, nativeupload=True):
+        self.servers = servers
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.nativeupload = nativeupload
+
+    def run_release(self, packagedir, args=()):
+        """Release 'packagedir' once and return (seconds, bytes).
+        """
+        from jarn.mkrelease.mkrelease import ReleaseMaker
+        from jarn.mkrelease.testing import IndexServer
+
+        servers = [IndexServer(self.latency, self.bandwidth)
+                   for x in range(self.servers)]
+        home = os.environ.get('HOME')
+        tempdir = tempfile.mkdtemp()
+        try:
+            names = ['server%d' % i for i in range(len(servers))]
+            with open(os.path.join(tempdir, '.pypirc'), 'wt') as file:
+                file.write('[distutils]\nindex-servers =\n')
+                for name in names:
+                    file.write('    %s\n' % name)
+                for name, server in zip(names, servers):
+                    file.write(server.get_pypirc(name))
+            with open(os.path.join(tempdir, '.mkrelease'), 'wt') as file:
+                file.write('[mkrelease]\nnative-upload = %s\n' %
+                           (self.nativeupload and 'yes' or 'no'))
+            os.environ['HOME'] = tempdir
+
+            locations = []
+            for name in names:
+                locations.extend(['-d', name])
+            started = time.time()
+            ReleaseMaker(['-CTq'] + locations + list(args) + [packagedir]).run()
+            seconds = time.time() - started
+            return seconds, sum(server.received for server in servers)
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+            for server in servers:
+                server.stop()
+            shutil.rmtree(tempdir)
+
+    def run(self, packagedir, args=(), repeat=1):
+        """Release 'packagedir' 'repeat' times and print a report.
+        """
+        packagedir = abspath(packagedir)
+        results = [self.run_release(packagedir, args) for x in range(repeat)]
+        for seconds, bytes in results:
+            rate = bytes / seconds if seconds else 0
+            print '%.3f s, %d bytes, %.0f bytes/s' % (seconds, bytes, rate)
+        best = min(seconds for seconds, bytes in results)
+        path = self.nativeupload and 'native upload' or 'setup.py upload'
+        print '%d server(s), %d run(s), %s, best %.3f s' % (self.servers, repeat, path, best)
+        return results
+
+
+def time_startup(args, repeat=5):
+    """Return the best time of 'mkrelease args' in a fresh interpreter.
+    """
+    cmd = [sys.executable, '-c', STARTUP_SCRIPT] + list(args)
+    best = None
+    with open(os.devnull, 'wb') as devnull:
+        for x in range(repeat):
+            started = time.time()
+            subprocess.call(cmd, stdout=devnull, stderr=devnull)
+            seconds = time.time() - started
+            if best is None or seconds < best:
+                best = seconds
+    return best
+
+
+def run_startup(repeat=5, threshold=0):
+    """Time all startup commands and print a report.
+
+    Returns 1 if a command is slower than 'threshold' seconds.
+    """
+    rc = 0
+    for args in STARTUP_COMMANDS:
+        seconds = time_startup(args, repeat)
+        status = ''
+        if threshold and seconds > threshold:
+            status = ' (over %.3f s)' % threshold
+            rc = 1
+        print 'mkrelease %-8s best %.3f s%s' % (' '.join(args), seconds, status)
+    return rc
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    try:
+        options, args = getopt.getopt(args, 'n:r:l:b:cust:h')
+    except getopt.GetoptError, e:
+        err_exit('benchmark: %s' % e.msg)
+
+    servers, repeat, latency, bandwidth, compare = 3, None, 0, 0, False
+    nativeupload = True
+    startup, threshold = False, 0
+    try:
+        for name, value in options:
+            if name == '-n':
+                servers = int(value)
+            elif name == '-r':
+                repeat = int(value)
+            elif name == '-l':
+                latency = float(value)
+            elif name == '-b':
+                bandwidth = int(value)
+            elif name == '-c':
+                compare = True
+            elif name == '-u':
+                nativeupload = False
+            elif name == '-s':
+                startup = True
+            elif name == '-t':
+                threshold = float(value)
+            elif name == '-h':
+                print __doc__.strip()
+                return 0
+    except ValueError, e:
+        err_exit('benchmark: %s' % e)
+
+    if startup:
+        return run_startup(repeat or 5, threshold)
+
+    if repeat is None:
+        repeat = 1
+
+    if not args:
+        err_exit('benchmark: missing package directory\n%s' % __doc__.strip())
+
+    # --stream skips servers uploaded to by setuptools
+    if compare and not nativeupload:
+        err_exit('benchmark: -c and -u are mutually exclusive')
+
+    benchmark = Benchmark(servers, latency, bandwidth, nativeupload)
+    if compare:
+        for label, extra in (('write-then-read', []), ('stream', ['--stream'])):
+            print label
+            benchmark.run(args[0], args[1:] + extra, repeat)
+    else:
+        benchmark.run(args[0], args[1:], repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import cPickle as pickle
+
+from os.path import abspath, dirname, isfile
+
+CACHE_VERSION = 1
+MAXENTRIES = 8
+
+# Cache file contents by path, kept for the life of the process
+_memory = {}
+
+
+class ConfigCache(object):
+    """Pickled results of reading config files.
+
+    Entries are keyed on the paths, mtimes, sizes, and inodes of the
+    config files and become stale when any of them changes. Up to
+    'maxentries' entries are kept, one per combination of files.
+
+    The contents of the cache file are also kept in memory, so
+    long-running processes do not read it again until it changes.
+    """
+
+    def __init__(self, filename, maxentries=MAXENTRIES):
+        self.filename = filename
+        self.maxentries = maxentries
+
+    def get_key(self, filenames):
+        """Return the cache key for 'filenames'.
+        """
+        key = [CACHE_VERSION]
+        for filename in filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                key.append((filename, None))
+            else:
+                key.append((filename, st.st_mtime, st.st_size, st.st_ino))
+        return tuple(key)
+
+    def read(self):
+        """Return the list of (key, state) entries, newest first.
+        """
+        if not self.filename:
+            return []
+        try:
+            filename = abspath(self.filename)
+            st = os.stat(filename)
+            stamp = (st.st_mtime, st.st_size, st.st_ino)
+            data = _memory.get(filename)
+            if data is None or data[0] != stamp:
+                with open(filename, 'rb') as file:
+                    data = _memory[filename] = (stamp, file.read())
+            entries = pickle.loads(data[1])
+        except Exception:
+            # Missing, corrupt, or written by another version
+            return []
+        if not isinstance(entries, list):
+            return []
+        return entries
+
+    def load(self, key):
+        """Return the state stored under 'key', or None if it is stale.
+        """
+        for entry_key, state in self.read():
+            if entry_key == key:
+                return state
+        return None
+
+    def save(self, key, state):
+        """Store 'state' under 'key'.
+
+        Failure to write the cache is not an error.
+        """
+        if not self.filename:
+            return
+        entries = [(key, state)]
+        paths = [x[0] for x in key[1:]]
+        for entry_key, entry_state in self.read():
+            if [x[0] for x in entry_key[1:]] != paths:
+                entries.append((entry_key, entry_state))
+        entries = entries[:self.maxentries]
+        try:
+            data = pickle.dumps(entries, pickle.HIGHEST_PROTOCOL)
+        except pickle.PicklingError:
+            return
+        try:
+            fd, tempname = tempfile.mkstemp(dir=dirname(self.filename) or os.curdir,
+                                            prefix='.mkrelease-cache.')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.rename(tempname, self.filename)
+            st = os.stat(self.filename)
+            _memory[abspath(self.filename)] = ((st.st_mtime, st.st_size, st.st_ino), data)
+        except (IOError, OSError):
+            if isfile(tempname):
+                os.remove(tempname)
@@ -25,9 +25,9 @@ class ConfigParser(SafeConfigParser, object):
         except Error, e:
             self.warn(str(e))
 
-    def get(self, section, option, default=None):
+    def get(self, section, option, default=None, raw=False):
         if self.has_option(section, option):
-            value = super(ConfigParser, self).get(section, option)
+            value = super(ConfigParser, self).get(section, option, raw)
             return value
         return default
 
@@ -0,0 +1,360 @@
+import os
+import sys
+import errno
+import select
+import signal
+import socket
+import threading
+import traceback
+
+from os.path import exists
+
+from exit import err_exit
+
+HEADER_SIZE = 9
+BUFFER_SIZE = 65536
+
+
+def send_frame(sock, channel, data=''):
+    """Send 'data' on 'channel' to 'sock'.
+
+    A frame is the one-letter channel name, the length of the data
+    as eight hex digits, and the data.
+    """
+    sock.sendall('%s%08x%s' % (channel, len(data), data))
+
+
+def read_frame(file):
+    """Return the next (channel, data) tuple from 'file'.
+
+    Returns (None, None) if the connection has been closed.
+    """
+    header = file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        return None, None
+    try:
+        size = int(header[1:], 16)
+    except ValueError:
+        return None, None
+    data = file.read(size)
+    if len(data) < size:
+        return None, None
+    return header[0], data
+
+
+def send_request(sock, args, cwd, env):
+    """Send a release request to the daemon.
+    """
+    for arg in args:
+        send_frame(sock, 'a', arg)
+    send_frame(sock, 'c', cwd)
+    for key, value in env.items():
+        send_frame(sock, 'v', '%s=%s' % (key, value))
+    send_frame(sock, 'r')
+
+
+def read_request(file):
+    """Return the (args, cwd, env) of a release request.
+
+    Returns None if the request is incomplete.
+    """
+    args, cwd, env = [], '', {}
+    while True:
+        channel, data = read_frame(file)
+        if channel == 'a':
+            args.append(data)
+        elif channel == 'c':
+            cwd = data
+        elif channel == 'v':
+            key, sep, value = data.partition('=')
+            env[key] = value
+        elif channel == 'r':
+            return args, cwd, env
+        else:
+            return None
+
+
+def get_exit_code(code):
+    """Return the process exit status for a SystemExit code.
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print >>sys.stderr, code
+    return 1
+
+
+def get_open_fds():
+    """Return the file descriptors open in this process.
+    """
+    try:
+        return [int(x) for x in os.listdir('/proc/self/fd')]
+    except OSError:
+        return range(256)
+
+
+def is_listening(socketpath):
+    """Return True if a daemon accepts connections on 'socketpath'.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketpath)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def run_client(socketpath, args):
+    """Run mkrelease with 'args' in the daemon listening on 'socketpath'.
+
+    Output is streamed to stdout and stderr as the release progresses.
+    Returns the exit code of the release.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketpath)
+    except socket.error, e:
+        err_exit('mkrelease: Cannot connect to daemon at %s: %s' % (socketpath, e.strerror or e))
+    try:
+        send_request(sock, args, os.getcwd(), os.environ)
+        file = sock.makefile('rb', 0)
+        while True:
+            channel, data = read_frame(file)
+            if channel == 'o':
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            elif channel == 'e':
+                sys.stderr.write(data)
+                sys.stderr.flush()
+            elif channel == 'x':
+                return int(data)
+            else:
+                err_exit('mkrelease: Lost connection to daemon')
+    except socket.error, e:
+        err_exit('mkrelease: Lost connection to daemon: %s' % (e.strerror or e))
+    finally:
+        sock.close()
+
+
+class Daemon(object):
+    """Run release requests from clients connecting to a UNIX socket.
+
+    Every request runs as a job in a child forked from the daemon, so
+    imported modules, config files, environments, and SCM version
+    probes are shared by all jobs. At most 'jobs' jobs run at the
+    same time; further requests wait for a free slot.
+    """
+
+    def __init__(self, socketpath, jobs=4):
+        self.socketpath = socketpath
+        self.jobs = jobs
+        self.slots = threading.Semaphore(jobs)
+        self.forklock = threading.Lock()
+        self.running = False
+        self.socket = None
+
+    def warm(self):
+        """Import modules and compute shared state ahead of the first job.
+        """
+        import setuptools, scp, local, gpg, upload, index, store, history
+        import sync, stream, simpleindex
+        from env import get_setuptools_env, get_scm_env
+        from scm import SCM, SCMFactory
+        from process import Process
+
+        get_setuptools_env()
+        SCM.version_cache = {}
+        for klass in SCMFactory.scms:
+            klass(Process(quiet=True, env=get_scm_env())).version_info
+
+    def bind(self):
+        """Create the socket and listen on it.
+
+        A socket left behind by a previous daemon is removed.
+        """
+        socketpath = self.socketpath
+        if exists(socketpath):
+            if is_listening(socketpath):
+                err_exit('mkrelease: Daemon already running at %(socketpath)s' % locals())
+            os.remove(socketpath)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0077)
+        try:
+            sock.bind(socketpath)
+        except socket.error, e:
+            sock.close()
+            err_exit('mkrelease: Cannot bind %s: %s' % (socketpath, e.strerror or e))
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+        sock.settimeout(0.5)
+        self.socket = sock
+        self.running = True
+
+    def close(self):
+        """Close and remove the socket.
+        """
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+            if exists(self.socketpath):
+                os.remove(self.socketpath)
+
+    def serve_forever(self):
+        """Accept connections until shutdown() is called.
+        """
+        try:
+            while self.running:
+                try:
+                    conn, addr = self.socket.accept()
+                except socket.timeout:
+                    continue
+                except socket.error, e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                conn.settimeout(None)
+                thread = threading.Thread(target=self.handle, args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop accepting connections.
+        """
+        self.running = False
+
+    def handle(self, conn):
+        """Run the request sent over 'conn'.
+        """
+        try:
+            request = read_request(conn.makefile('rb', 0))
+            if request is None:
+                return
+            if not self.slots.acquire(False):
+                send_frame(conn, 'e', 'Waiting for a free job slot\n')
+                self.slots.acquire()
+            try:
+                rc = self.run_job(conn, *request)
+            finally:
+                self.slots.release()
+            send_frame(conn, 'x', str(rc))
+        except socket.error:
+            pass # Client went away
+        finally:
+            conn.close()
+
+    def run_job(self, conn, args, cwd, env):
+        """Run mkrelease with 'args' in a child process.
+
+        Output is streamed to 'conn'. Returns the exit code.
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with self.forklock:
+            # No other job may inherit our pipes
+            out_r, out_w = os.pipe()
+            err_r, err_w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                self.run_child(args, cwd, env, out_w, err_w)
+            os.close(out_w)
+            os.close(err_w)
+        try:
+            self.forward(conn, {out_r: 'o', err_r: 'e'})
+        except socket.error:
+            self.kill(pid)
+            raise
+        finally:
+            os.close(out_r)
+            os.close(err_r)
+            status = self.wait(pid)
+        if os.WIFSIGNALED(status):
+            return 128 + os.WTERMSIG(status)
+        return os.WEXITSTATUS(status)
+
+    def kill(self, pid):
+        """Terminate job 'pid' and the commands it has started.
+        """
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except OSError:
+            # The child has not made its process group yet
+            os.kill(pid, signal.SIGTERM)
+
+    def run_child(self, args, cwd, env, out, err):
+        """Run mkrelease in the forked child. Does not return.
+
+        The child leads a new session, so setup.py, scp, and sftp run
+        by the job can be terminated together with it.
+        """
+        rc = 1
+        try:
+            os.setsid()
+            os.dup2(out, 1)
+            os.dup2(err, 2)
+            null = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(null, 0)
+            for fd in get_open_fds():
+                if fd > 2:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+            sys.stdout = os.fdopen(1, 'w', 1)
+            sys.stderr = os.fdopen(2, 'w', 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+            os.environ.clear()
+            os.environ.update(env)
+            try:
+                os.chdir(cwd)
+            except OSError, e:
+                err_exit('mkrelease: Cannot change to %s: %s' % (cwd, e.strerror))
+
+            from mkrelease import main
+            rc = get_exit_code(main(args))
+        except SystemExit, e:
+            rc = get_exit_code(e.code)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(rc)
+
+    def forward(self, conn, channels):
+        """Send the output read from the pipes in 'channels' to 'conn'.
+        """
+        fds = list(channels)
+        while fds:
+            try:
+                ready = select.select(fds, [], [])[0]
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in ready:
+                data = os.read(fd, BUFFER_SIZE)
+                if data:
+                    send_frame(conn, channels[fd], data)
+                else:
+                    fds.remove(fd)
+
+    def wait(self, pid):
+        """Wait for the child 'pid' and return its exit status.
+        """
+        while True:
+            try:
+                return os.waitpid(pid, 0)[1]
+            except OSError, e:
+                if e.errno != errno.EINTR:
+                    raise
@@ -0,0 +1,91 @@
+import os
+import mmap
+import hashlib
+
+MISSING = 'missing'
+IDENTICAL = 'identical'
+CONFLICT = 'conflict'
+UNKNOWN = 'unknown'
+
+BLOCKSIZE = 1024 * 1024
+MMAPSIZE = 16 * 1024 * 1024
+
+
+def get_hashes():
+    """Return a list of (name, hash) tuples to compute.
+
+    The blake2_256 digest is included if hashlib supports it.
+    """
+    hashes = [('md5', hashlib.md5()), ('sha256', hashlib.sha256())]
+    blake2b = getattr(hashlib, 'blake2b', None)
+    if blake2b is not None:
+        hashes.append(('blake2_256', blake2b(digest_size=32)))
+    return hashes
+
+
+def get_digests(filename):
+    """Return a dict with size, md5, sha256, and blake2_256 digest of 'filename'.
+
+    All digests are computed in a single pass over the file. Large
+    files are memory-mapped.
+    """
+    hashes = get_hashes()
+    with open(filename, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= MMAPSIZE:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(0, size, BLOCKSIZE):
+                    block = buffer(data, offset, BLOCKSIZE)
+                    for name, hash in hashes:
+                        hash.update(block)
+            finally:
+                data.close()
+        else:
+            while True:
+                block = file.read(BLOCKSIZE)
+                if not block:
+                    break
+                for name, hash in hashes:
+                    hash.update(block)
+    digests = {'size': size}
+    for name, hash in hashes:
+        digests[name] = hash.hexdigest()
+    return digests
+
+
+def write_sidecar(filename, digests, dir=None):
+    """Write a sha256sum compatible checksum file for 'filename'.
+
+    The file is written next to 'filename', or into 'dir' if given.
+    Returns the name of the sidecar file.
+    """
+    sidecar = filename + '.sha256'
+    if dir is not None:
+        sidecar = os.path.join(dir, os.path.basename(sidecar))
+    with open(sidecar, 'wt') as file:
+        file.write('%s  %s\n' % (digests['sha256'], os.path.basename(filename)))
+    return sidecar
+
+
+def compare_digests(local, remote):
+    """Compare 'local' digests with the digests of a 'remote' copy.
+
+    Returns MISSING if 'remote' is empty, UNKNOWN if 'remote' is None
+    or no digest can be compared, CONFLICT if any digest differs, and
+    IDENTICAL otherwise.
+    """
+    if remote is None:
+        return UNKNOWN
+    if not remote:
+        return MISSING
+    matched = False
+    for key, value in remote.items():
+        if key in local:
+            if local[key] != value:
+                return CONFLICT
+            if key != 'size':
+                matched = True
+    if matched:
+        return IDENTICAL
+    return UNKNOWN
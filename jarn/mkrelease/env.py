@@ -0,0 +1,74 @@
+import os
+
+_cache = {}
+_subscribed = []
+
+
+def invalidate(*ignored):
+    """Forget all computed environments.
+    """
+    _cache.clear()
+
+
+def cached(func):
+    """Decorate an environment factory to run once per process.
+
+    The result is shared by all callers and must not be modified. It
+    is recomputed when os.environ changes or invalidate() is called.
+    """
+    def wrapper():
+        entry = _cache.get(func.__name__)
+        if entry is None or entry[0] != os.environ:
+            entry = _cache[func.__name__] = (os.environ.copy(), func())
+        return entry[1]
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def get_setuptools_path():
+    """Return the locations of setuptools and its extensions.
+
+    The result depends on the working set only and survives changes
+    to os.environ.
+    """
+    path = _cache.get('get_setuptools_path')
+    if path is None:
+        import pkg_resources
+        if not _subscribed:
+            # Called for every distribution added to the working set
+            pkg_resources.working_set.subscribe(invalidate)
+            _subscribed.append(True)
+
+        path = []
+        for name in ('setuptools', 'setuptools-hg', 'setuptools-git',
+                     'setuptools-subversion'):
+            try:
+                dist = pkg_resources.get_distribution(name)
+            except pkg_resources.DistributionNotFound:
+                continue
+            path.append(dist.location)
+        path = _cache['get_setuptools_path'] = ':'.join(path)
+    return path
+
+
+@cached
+def get_setuptools_env():
+    """Return the environment for running setup.py.
+
+    Makes sure setuptools and its extensions are found if mkrelease
+    has been installed with zc.buildout.
+    """
+    env = os.environ.copy()
+    env['PYTHONPATH'] = get_setuptools_path()
+    env['HG_SETUPTOOLS_FORCE_CMD'] = '1'
+    return env
+
+
+@cached
+def get_scm_env():
+    """Return the environment for running SCM commands.
+    """
+    env = os.environ.copy()
+    env.pop('PYTHONPATH', None)
+    return env
@@ -1,4 +1,22 @@
 import sys
+import threading
+
+from contextlib import contextmanager
+
+# Nesting depth of silent(), shared by all threads
+_silent = 0
+_lock = threading.Lock()
+
+
+class ErrorExit(SystemExit):
+    """Raised by err_exit.
+
+    The exit code is in 'code' and the error message in 'msg'.
+    """
+
+    def __init__(self, msg, code=1):
+        SystemExit.__init__(self, code)
+        self.msg = msg
 
 
 def msg_exit(msg, rc=0):
@@ -10,13 +28,37 @@ def msg_exit(msg, rc=0):
 
 def err_exit(msg, rc=1):
     """Print msg to stderr and exit with rc.
+
+    Inside silent() the message is not printed.
     """
-    print >>sys.stderr, msg
-    sys.exit(rc)
+    if not _silent:
+        print >>sys.stderr, msg
+    raise ErrorExit(msg, rc)
+
+
+@contextmanager
+def silent():
+    """Have err_exit raise without printing, and warn not print.
+
+    For library callers, which receive the message with the exception.
+    Applies to all threads, so worker threads of a release stay quiet
+    too.
+    """
+    global _silent
+    with _lock:
+        _silent += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _silent -= 1
 
 
 def warn(msg):
     """Print a warning message to stderr.
+
+    Inside silent() the message is not printed.
     """
-    print >>sys.stderr, 'WARNING:', msg
+    if not _silent:
+        print >>sys.stderr, 'WARNING:', msg
 
@@ -0,0 +1,37 @@
+import os
+
+from os.path import isfile
+
+from process import Process
+from exit import err_exit
+
+
+class GPG(object):
+    """Interface to GnuPG."""
+
+    def __init__(self, process=None):
+        self.process = process or Process()
+
+    def run_sign(self, distfile, identity='', signature=None):
+        """Create a detached signature of 'distfile'.
+
+        The signature is written to 'signature', which defaults to
+        'distfile' plus '.asc'. Returns the name of the signature file.
+        """
+        if not self.process.quiet:
+            print 'running gpg'
+
+        if signature is None:
+            signature = distfile + '.asc'
+        if isfile(signature):
+            os.remove(signature)
+
+        localuser = ''
+        if identity:
+            localuser = '--local-user "%(identity)s" ' % locals()
+
+        rc = self.process.system(
+            'gpg --detach-sign -a %(localuser)s--output "%(signature)s" "%(distfile)s"' % locals())
+        if rc == 0 and isfile(signature):
+            return signature
+        err_exit('ERROR: gpg failed')
@@ -0,0 +1,155 @@
+import os
+import time
+
+from os.path import isdir, dirname
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from index import normalize_name
+from exit import err_exit
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS releases (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    tagid TEXT NOT NULL,
+    url TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS locations (
+    release_id INTEGER NOT NULL REFERENCES releases (id),
+    location TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    release_id INTEGER NOT NULL REFERENCES releases (id),
+    phase TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS releases_name ON releases (name, version);
+CREATE INDEX IF NOT EXISTS releases_version ON releases (version);
+CREATE INDEX IF NOT EXISTS releases_tagid ON releases (name, tagid);
+CREATE INDEX IF NOT EXISTS locations_release ON locations (release_id);
+CREATE INDEX IF NOT EXISTS locations_location ON locations (location);
+CREATE INDEX IF NOT EXISTS phases_release ON phases (release_id);
+"""
+
+
+class History(object):
+    """Record of past releases in an SQLite database.
+
+    The database is created on first use. If 'filename' is empty, or
+    Python lacks sqlite3, nothing is recorded and queries return no
+    results.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = None
+
+    @property
+    def enabled(self):
+        return bool(self.filename) and sqlite3 is not None
+
+    def connect(self):
+        if self.connection is None:
+            filename = self.filename
+            try:
+                if dirname(filename) and not isdir(dirname(filename)):
+                    os.makedirs(dirname(filename))
+                self.connection = sqlite3.connect(filename)
+                self.connection.executescript(SCHEMA)
+            except (OSError, sqlite3.Error), e:
+                err_exit('ERROR: Failed to open %(filename)s: %(e)s' % locals())
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def add(self, name, version, tagid, url, filename, sha256, locations=(),
+            phases=(), started=None, duration=0.0):
+        """Record a release.
+
+        The 'phases' argument is a list of (phase, seconds) tuples.
+        Returns the id of the new record, or None if the history is
+        disabled.
+        """
+        if not self.enabled:
+            return None
+        if started is None:
+            started = time.time()
+        connection = self.connect()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    'INSERT INTO releases (name, version, tagid, url, filename, '
+                    'sha256, started, duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (normalize_name(name), version, tagid, url, filename,
+                     sha256, started, duration))
+                id = cursor.lastrowid
+                connection.executemany(
+                    'INSERT INTO locations (release_id, location) VALUES (?, ?)',
+                    [(id, location) for location in locations])
+                connection.executemany(
+                    'INSERT INTO phases (release_id, phase, duration) VALUES (?, ?, ?)',
+                    [(id, phase, seconds) for phase, seconds in phases])
+        except sqlite3.Error, e:
+            err_exit('ERROR: Failed to record release: %(e)s' % locals())
+        return id
+
+    def find(self, name=None, version=None, locations=None):
+        """Return releases as a list of dicts, oldest first.
+
+        Results may be restricted to project 'name', 'version', and
+        any of 'locations'. Every dict has a 'locations' list and a
+        'phases' list of (phase, seconds) tuples.
+        """
+        if not self.enabled:
+            return []
+        where, args = [], []
+        if name:
+            where.append('name = ?')
+            args.append(normalize_name(name))
+        if version:
+            where.append('version = ?')
+            args.append(version)
+        if locations:
+            where.append('id IN (SELECT release_id FROM locations WHERE location IN (%s))' %
+                         ', '.join('?' * len(locations)))
+            args.extend(locations)
+        sql = 'SELECT * FROM releases'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY started, id'
+
+        connection = self.connect()
+        connection.row_factory = sqlite3.Row
+        releases = []
+        for row in connection.execute(sql, args):
+            release = dict((key, row[key]) for key in row.keys())
+            release['locations'] = [x[0] for x in connection.execute(
+                'SELECT location FROM locations WHERE release_id = ? ORDER BY location',
+                (row['id'],))]
+            release['phases'] = [(x[0], x[1]) for x in connection.execute(
+                'SELECT phase, duration FROM phases WHERE release_id = ? ORDER BY rowid',
+                (row['id'],))]
+            releases.append(release)
+        return releases
+
+    def has_tag(self, name, tagid, url=''):
+        """Return True if 'tagid' was used by a release of 'name' from 'url'.
+        """
+        if not (self.enabled and tagid):
+            return False
+        row = self.connect().execute(
+            'SELECT 1 FROM releases WHERE name = ? AND tagid = ? AND url = ? LIMIT 1',
+            (normalize_name(name), tagid, url)).fetchone()
+        return row is not None
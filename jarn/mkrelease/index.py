@@ -0,0 +1,142 @@
+import re
+import shutil
+import urllib2
+
+from posixpath import basename
+from urlparse import urlsplit, urlunsplit, urljoin
+
+from exit import err_exit
+
+
+def normalize_name(name):
+    """Return the PEP 503 normalized form of project 'name'.
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+class Index(object):
+    """Access to the simple API of index servers."""
+
+    anchor_re = re.compile(r'<a\s[^>]*href=["\']([^"\']+)["\']', re.IGNORECASE)
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def normalize_name(self, name):
+        return normalize_name(name)
+
+    def get_simple_root(self, repository):
+        """Return the URL of the simple index of 'repository'.
+        """
+        scheme, host, path, qs, frag = urlsplit(repository)
+        path = path.rstrip('/')
+        for suffix in ('/pypi', '/legacy'):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+        return urlunsplit((scheme, host, path + '/simple/', '', ''))
+
+    def get_simple_url(self, repository, name):
+        """Return the URL of the simple index page of project 'name'.
+        """
+        return '%s%s/' % (self.get_simple_root(repository), self.normalize_name(name))
+
+    def parse_anchors(self, html, base=''):
+        """Return a list of (filename, url, digests) tuples.
+
+        URLs are made absolute with respect to 'base'. Digests are
+        taken from URL fragments of the form '#<hashname>=<hexdigest>'.
+        """
+        anchors = []
+        for url in self.anchor_re.findall(html):
+            url, sep, frag = url.partition('#')
+            digests = {}
+            if '=' in frag:
+                hashname, value = frag.split('=', 1)
+                digests[hashname] = value
+            anchors.append((basename(urlsplit(url)[2].rstrip('/')), urljoin(base, url), digests))
+        return anchors
+
+    def parse_links(self, html):
+        """Return a dict mapping filenames to digest dicts.
+        """
+        return dict((filename, digests)
+                    for filename, url, digests in self.parse_anchors(html))
+
+    def fetch(self, url):
+        """Return the page at 'url'.
+
+        Returns None if the page does not exist. Fails if the server
+        cannot be queried.
+        """
+        try:
+            response = urllib2.urlopen(url, timeout=self.timeout)
+            try:
+                return response.read()
+            finally:
+                response.close()
+        except urllib2.HTTPError, e:
+            if e.code == 404:
+                return None
+            err_exit('ERROR: Failed to read %(url)s: %(e)s' % locals())
+        except (urllib2.URLError, IOError, ValueError), e:
+            err_exit('ERROR: Failed to read %(url)s: %(e)s' % locals())
+
+    def list_projects(self, repository):
+        """Return the names of all projects in 'repository'.
+        """
+        url = self.get_simple_root(repository)
+        html = self.fetch(url) or ''
+        return [name for name, url, digests in self.parse_anchors(html, url)]
+
+    def list_files(self, repository, names=None):
+        """Return a dict mapping filenames to digest dicts.
+
+        The digest dicts also contain the download 'url' of each file.
+        If 'names' is None, all projects are listed.
+        """
+        if names is None:
+            names = self.list_projects(repository)
+        files = {}
+        for name in names:
+            url = self.get_simple_url(repository, name)
+            html = self.fetch(url) or ''
+            for filename, fileurl, digests in self.parse_anchors(html, url):
+                files[filename] = dict(digests, url=fileurl)
+        return files
+
+    def download(self, url, filename):
+        """Download 'url' to 'filename'.
+        """
+        try:
+            response = urllib2.urlopen(url, timeout=self.timeout)
+            try:
+                with open(filename, 'wb') as file:
+                    shutil.copyfileobj(response, file)
+            finally:
+                response.close()
+        except (urllib2.URLError, IOError, ValueError), e:
+            err_exit('ERROR: Failed to download %(url)s: %(e)s' % locals())
+
+    def get_remote_digests(self, repository, name, filename):
+        """Return digests of 'filename' as published by the index server.
+
+        Returns an empty dict if the file does not exist and None if
+        the index could not be queried.
+        """
+        url = self.get_simple_url(repository, name)
+        try:
+            response = urllib2.urlopen(url, timeout=self.timeout)
+            try:
+                html = response.read()
+            finally:
+                response.close()
+        except urllib2.HTTPError, e:
+            if e.code == 404:
+                return {}
+            return None
+        except (urllib2.URLError, IOError, ValueError):
+            return None
+        links = self.parse_links(html)
+        if filename not in links:
+            return {}
+        return links[filename]
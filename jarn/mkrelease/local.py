@@ -0,0 +1,200 @@
+import os
+import sys
+import errno
+import shutil
+
+from os.path import basename, join, isdir, isfile
+from fnmatch import fnmatch
+
+from digest import get_digests
+from simpleindex import SimpleIndex
+from exit import err_exit
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import ctypes
+    import ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    syncfs = libc.syncfs
+except (ImportError, OSError, AttributeError, TypeError):
+    syncfs = None
+
+FICLONE = 0x40049409 # Linux ioctl
+COPYSIZE = 1024 * 1024
+
+
+class Local(object):
+    """Local file system abstraction.
+
+    Files are hardlinked, reflinked, or copied in-process.
+    """
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def run_copy(self, distfiles, dirs, link=False):
+        """Copy 'distfiles' to each directory in 'dirs'.
+
+        Files are written under a temporary name and renamed into
+        place. All files are synced in one batch after the last one has
+        been written, and each directory once after the renames.
+
+        If 'link' is True, hardlinks may be used. Only pass True if
+        the distfiles are never rewritten in place.
+        """
+        if not self.quiet:
+            print 'running local_copy'
+
+        pending = []
+        try:
+            for dir in dirs:
+                if not isdir(dir):
+                    os.makedirs(dir)
+                for distfile in distfiles:
+                    name = basename(distfile)
+                    tempname = join(dir, '.%(name)s.part' % locals())
+                    method = self.copy(distfile, tempname, link)
+                    pending.append((tempname, join(dir, name)))
+                    if not self.quiet:
+                        print 'Copying dist/%(name)s to %(dir)s (%(method)s)' % locals()
+            self.sync_files([tempname for tempname, target in pending])
+            for tempname, target in pending:
+                os.rename(tempname, target)
+            for dir in dirs:
+                self.sync_dir(dir)
+        except (IOError, OSError), e:
+            for tempname, target in pending:
+                if isfile(tempname):
+                    os.remove(tempname)
+            err_exit('ERROR: copy failed: %s' % e)
+
+        if not self.quiet:
+            print 'OK'
+        return 0
+
+    def copy(self, src, dst, link=False):
+        """Copy 'src' to 'dst' using the cheapest method available.
+
+        Returns the name of the method used.
+        """
+        if isfile(dst):
+            os.remove(dst)
+        if link:
+            try:
+                os.link(src, dst)
+                return 'hardlink'
+            except OSError:
+                pass
+        with open(src, 'rb') as infile:
+            with open(dst, 'wb') as outfile:
+                if self.reflink(infile, outfile):
+                    return 'reflink'
+                if self.sendfile(infile, outfile):
+                    method = 'sendfile'
+                else:
+                    shutil.copyfileobj(infile, outfile, COPYSIZE)
+                    method = 'copy'
+                return method
+
+    def reflink(self, infile, outfile):
+        # Clone the file's extents on copy-on-write file systems
+        if fcntl is None or not sys.platform.startswith('linux'):
+            return False
+        try:
+            fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+        except (IOError, OSError):
+            return False
+        return True
+
+    def sendfile(self, infile, outfile):
+        # Copy in the kernel where os.sendfile is available
+        sendfile = getattr(os, 'sendfile', None)
+        if sendfile is None:
+            return False
+        size = os.fstat(infile.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = sendfile(outfile.fileno(), infile.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError, e:
+            if offset == 0 and e.errno in (errno.EINVAL, errno.ENOSYS):
+                return False
+            raise
+        return True
+
+    def sync_files(self, filenames):
+        # Persist the contents of files before they are renamed.
+        # On Linux one syncfs per file system covers the whole batch.
+        if syncfs is not None and sys.platform.startswith('linux'):
+            devices = set()
+            for filename in filenames:
+                with open(filename, 'rb') as file:
+                    device = os.fstat(file.fileno()).st_dev
+                    if device not in devices:
+                        devices.add(device)
+                        if syncfs(file.fileno()) != 0:
+                            e = ctypes.get_errno()
+                            raise OSError(e, os.strerror(e))
+        else:
+            for filename in filenames:
+                self.sync_file(filename)
+
+    def sync_file(self, filename):
+        # Persist the contents of a file before it is renamed
+        with open(filename, 'rb') as file:
+            os.fsync(file.fileno())
+
+    def sync_dir(self, dir):
+        # Persist the directory entries of renamed files
+        fd = os.open(dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        except OSError, e:
+            if e.errno not in (errno.EINVAL, errno.EBADF):
+                raise
+        finally:
+            os.close(fd)
+
+    def get_remote_digests(self, distfile, dir):
+        """Return digests of the copy of 'distfile' in 'dir'.
+
+        Returns an empty dict if the file does not exist.
+        """
+        target = join(dir, basename(distfile))
+        if not isfile(target):
+            return {}
+        return get_digests(target)
+
+    def list_files(self, dir, patterns, missing_ok=False):
+        """Return a dict mapping filenames in 'dir' to digest dicts.
+
+        Only files matching one of the shell 'patterns' are listed.
+        The dicts contain file sizes only; use get_digests for more.
+        A missing 'dir' fails, unless 'missing_ok' is true.
+        """
+        files = {}
+        if not isdir(dir) and not missing_ok:
+            err_exit('ERROR: No such directory: %(dir)s' % locals())
+        if isdir(dir):
+            for filename in os.listdir(dir):
+                path = join(dir, filename)
+                if isfile(path) and any(fnmatch(filename, x) for x in patterns):
+                    files[filename] = {'size': os.path.getsize(path)}
+        return files
+
+    def update_simple_index(self, dir, name, filename, sha256):
+        """Add 'filename' to the simple index in 'dir'.
+        """
+        try:
+            changed = SimpleIndex(dir).add(name, filename, sha256)
+        except (IOError, OSError), e:
+            err_exit('ERROR: Failed to update simple index: %s' % e)
+        if changed and not self.quiet:
+            print 'Updating simple index at %(dir)s' % locals()
@@ -1,33 +1,49 @@
 import locale
 locale.setlocale(locale.LC_ALL, '')
 
-import pkg_resources
-__version__ = pkg_resources.get_distribution('jarn.mkrelease').version
-
 import sys
 import os
 import getopt
 import tempfile
 import shutil
+import time
 
-from os.path import abspath, join, expanduser, exists, isfile
+from os.path import abspath, join, expanduser, exists, isdir, isfile, basename, dirname
 from itertools import chain
+from distutils.config import PyPIRCCommand
+
+from lazy import lazy
 
+# Subsystem modules are imported where they are first needed,
+# to keep 'mkrelease -l' and friends fast
 from python import Python
-from setuptools import Setuptools
-from scp import SCP
-from scm import SCMFactory
+from pool import parallel_map
+from timer import Timer
+from digest import get_digests, compare_digests, write_sidecar, CONFLICT, IDENTICAL
 from urlparser import URLParser
 from configparser import ConfigParser
+from configcache import ConfigCache
 from exit import err_exit, msg_exit, warn
 
-MAXALIASDEPTH = 23
+MEGABYTE = 1024 * 1024
+SOCKET = '~/.mkrelease.sock'
 
-VERSION = "jarn.mkrelease %s" % __version__
 USAGE = "Try 'mkrelease --help' for more information"
 
+# Options of the --stack run, not passed on to its releases
+STACK_OPTIONS = ('--stack', '--plan', '-j', '--jobs', '--socket',
+                 '--timings-report', '--trace-events', '--profile',
+                 '--profile-setup-py')
+
+# Modes that cannot be combined with --stack
+STACK_CONFLICTS = ('--sync', '--history', '--serve', '--redistribute')
+
 HELP = """\
 Usage: mkrelease [options] [scm-url [rev]|scm-sandbox]
+       mkrelease [options] --sync source dest
+       mkrelease [options] --history [name [version]]
+       mkrelease [options] --serve
+       mkrelease [options] --stack scm-sandbox [scm-sandbox ...]
 
 Python egg releaser
 
@@ -41,9 +57,47 @@ Options:
                       cannot be guessed from the argument.
 
   -d dist-location, --dist-location=dist-location
-                      An scp or sftp destination specification, an index
-                      server configured in ~/.pypirc, or an alias name for
-                      either. This option may be specified more than once.
+                      An scp or sftp destination specification, a local
+                      directory, an index server configured in ~/.pypirc,
+                      or an alias name for either. This option may be
+                      specified more than once.
+
+  --simple-index      Maintain a PEP 503 simple index in scp, sftp, and
+                      local dist-locations.
+  --stream            Read the archive once and stream it to all
+                      dist-locations concurrently (experimental).
+  --redistribute=name==version
+                      Upload a previous release from the local store
+                      instead of building it.
+  --sync              Copy all dist files missing at dest from source.
+                      Both may be any kind of dist-location.
+  -j jobs, --jobs=jobs
+                      The number of concurrent transfers in --sync mode,
+                      or of concurrent releases in --serve and --stack
+                      mode (default: 4).
+  --history           List recorded releases, optionally of project name
+                      and version. Use -d to filter by dist-location.
+
+  --timings           Print the time spent in each phase of the release.
+  --timings-report=file
+                      Write phase timings to file in JSON format.
+  --trace-commands    Print every external command run, with its
+                      duration and resource usage.
+  --trace-events=file
+                      Write phases and commands to file in Chrome trace
+                      event format.
+  --profile=file      Profile mkrelease with cProfile and write pstats
+                      data to file.
+  --profile-setup-py  Also profile setup.py runs and merge their data
+                      into the --profile file.
+
+  --serve             Run a daemon serving releases on a UNIX socket.
+  --daemon            Run the release in the daemon and stream its output.
+  --socket=file       The socket of the daemon (default: ~/.mkrelease.sock).
+
+  --stack             Release several sandboxes in the order given by their
+                      install_requires. Release options apply to every release.
+  --plan              Print the release waves of --stack and exit.
 
   -s, --sign          Sign the release with GnuPG.
   -i identity, --identity=identity
@@ -69,14 +123,143 @@ Options:
 """
 
 
+def get_version():
+    """Return the version string.
+
+    Scanning the working set is expensive, so pkg_resources is
+    imported on demand.
+    """
+    import pkg_resources
+    return "jarn.mkrelease %s" % pkg_resources.get_distribution('jarn.mkrelease').version
+
+
+def get_profile_options(args):
+    """Return the --profile file name and --profile-setup-py flag.
+
+    The options are looked for before the options are parsed, so the
+    whole run can be profiled. Arguments after '--' are ignored.
+    """
+    filename, children = '', False
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--':
+            break
+        if arg.startswith('--profile='):
+            filename = arg[len('--profile='):]
+        elif arg == '--profile' and args:
+            filename = args.pop(0)
+        elif arg == '--profile-setup-py':
+            children = True
+    return filename, children
+
+
+def get_daemon_options(args):
+    """Return the --daemon flag, the --socket file name, and the
+    remaining arguments.
+
+    The options are looked for before the options are parsed, so the
+    client does not need to import anything. Arguments after '--' are
+    passed on unchanged.
+    """
+    client, socketpath, remaining = False, SOCKET, []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--':
+            remaining.append(arg)
+            remaining.extend(args)
+            break
+        if arg == '--daemon':
+            client = True
+        elif arg.startswith('--socket='):
+            socketpath = arg[len('--socket='):]
+        elif arg == '--socket' and args:
+            socketpath = args.pop(0)
+        else:
+            remaining.append(arg)
+    return client, socketpath, remaining
+
+
+def unique(items):
+    """Return 'items' without duplicates, keeping the first occurrence.
+    """
+    seen = set()
+    res = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            res.append(item)
+    return res
+
+
+class ServerInfo(object):
+    """Settings of an index server configured in ~/.pypirc.
+
+    The password is not pickled, so it never ends up in the config
+    cache. It is read from ~/.pypirc again when first needed.
+    """
+
+    def __init__(self, parser, server):
+        self.name = server
+        self.sign = parser.getboolean(server, 'sign', None)
+        self.identity = parser.getstring(server, 'identity', None)
+        self.repository = parser.getstring(server, 'repository',
+            PyPIRCCommand.DEFAULT_REPOSITORY)
+        self.username = parser.get(server, 'username', '', raw=True)
+        self.password = parser.get(server, 'password', '', raw=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('password', None)
+        return state
+
+    def __getattr__(self, name):
+        if name != 'password':
+            raise AttributeError(name)
+        parser = ConfigParser()
+        parser.read([expanduser('~/.pypirc')])
+        self.password = parser.get(self.name, 'password', '', raw=True)
+        return self.password
+
+
+def get_home():
+    """Return the directory mkrelease keeps its own files in.
+
+    This is the home directory, unless MKRELEASE_HOME is set.
+    """
+    return os.environ.get('MKRELEASE_HOME') or expanduser('~')
+
+
 class Defaults(object):
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, cache_file=None):
         """Read config files.
+
+        The result is cached in 'cache_file' and used as long as the
+        config files do not change. Config files with warnings are not
+        cached, so the warnings are repeated on every run.
         """
+        if cache_file is None:
+            cache_file = join(get_home(), '.mkrelease.cache')
+        filenames = (expanduser('~/.pypirc'), config_file)
+        cache = ConfigCache(cache_file and expanduser(cache_file))
+        key = cache.get_key(filenames)
+
+        state = cache.load(key)
+        if state is not None:
+            self.__dict__.update(state)
+            return
+
         parser = ConfigParser(warn)
-        parser.read((expanduser('~/.pypirc'), config_file))
+        parser.read(filenames)
+        self.read(parser)
+        if not parser.warnings:
+            cache.save(key, self.__dict__)
 
+    def read(self, parser):
+        """Set defaults from the config 'parser'.
+        """
         main_section = 'mkrelease'
         if not parser.has_section(main_section) and parser.has_section('defaults'):
             main_section = 'defaults' # BBB
@@ -87,20 +270,22 @@ class Defaults(object):
         self.sign = parser.getboolean(main_section, 'sign', False)
         self.identity = parser.getstring(main_section, 'identity', '')
         self.push = parser.getboolean(main_section, 'push', False)
+        self.simpleindex = parser.getboolean(main_section, 'simple-index', False)
+        self.nativeupload = parser.getboolean(main_section, 'native-upload', False)
+        home = get_home()
+        self.store = expanduser(parser.getstring(
+            main_section, 'store', join(home, '.mkrelease-store')))
+        self.storesize = parser.getint(main_section, 'store-size', 0)
+        self.history = expanduser(parser.getstring(main_section, 'history', ''))
 
         self.aliases = {}
         if parser.has_section('aliases'):
             for key, value in parser.items('aliases'):
                 self.aliases[key] = parser.to_list(value)
 
-        class ServerInfo(object):
-            def __init__(self, server):
-                self.sign = parser.getboolean(server, 'sign', None)
-                self.identity = parser.getstring(server, 'identity', None)
-
         self.servers = {}
         for server in parser.getlist('distutils', 'index-servers', []):
-            self.servers[server] = ServerInfo(server)
+            self.servers[server] = ServerInfo(parser, server)
 
     def get_known_locations(self):
         """Return a set of known locations.
@@ -116,6 +301,7 @@ class Locations(object):
         self.aliases = defaults.aliases
         self.servers = defaults.servers
         self.locations = []
+        self.expanded = {}
         self.urlparser = URLParser()
 
     def __len__(self):
@@ -129,9 +315,9 @@ class Locations(object):
         return iter(self.locations)
 
     def extend(self, location):
-        """Extend list of locations.
+        """Extend list of locations, skipping duplicates.
         """
-        self.locations.extend(location)
+        self.locations = unique(self.locations + list(location))
 
     def is_server(self, location):
         """Return True if 'location' is an index server.
@@ -143,6 +329,21 @@ class Locations(object):
         """
         return self.urlparser.get_scheme(location) in ('scp', 'sftp')
 
+    def is_local(self, location):
+        """Return True if 'location' is a local directory.
+        """
+        if self.urlparser.get_scheme(location) == 'file':
+            ignored, user, host, path, qs, frag = self.urlparser.urlsplit(location)
+            return host in ('', 'localhost')
+        return not self.urlparser.is_url(location) and location.startswith('/')
+
+    def get_local_path(self, location):
+        """Return the directory 'location' refers to.
+        """
+        if self.urlparser.get_scheme(location) == 'file':
+            location = self.urlparser.urlsplit(location)[3]
+        return abspath(expanduser(location))
+
     def has_host(self, location):
         """Return True if 'location' contains a host part.
         """
@@ -157,28 +358,59 @@ class Locations(object):
             sep = '/'
         return distbase + sep + location
 
-    def get_location(self, location, depth=0):
+    def get_location(self, location):
         """Resolve aliases and apply distbase.
+
+        Returns a list of locations without duplicates.
         """
         if not location:
             return []
         if location in self.aliases:
-            res = []
-            if depth > MAXALIASDEPTH:
-                err_exit('Maximum alias depth exceeded: %(location)s' % locals())
-            for loc in self.aliases[location]:
-                res.extend(self.get_location(loc, depth+1))
-            return res
+            return list(self.expand_alias(location, []))
+        return [self.resolve_location(location)]
+
+    def expand_alias(self, alias, path):
+        """Return the locations of 'alias'.
+
+        Every alias is expanded once; the result is shared by all
+        aliases referring to it. The 'path' argument is the list of
+        aliases being expanded and is used to detect cycles.
+        """
+        if alias in self.expanded:
+            return self.expanded[alias]
+        if alias in path:
+            cycle = ' -> '.join(path[path.index(alias):] + [alias])
+            err_exit('Alias cycle: %(cycle)s' % locals())
+        path.append(alias)
+        res = []
+        for location in self.aliases[alias]:
+            if not location:
+                continue
+            if location in self.aliases:
+                res.extend(self.expand_alias(location, path))
+            else:
+                res.append(self.resolve_location(location))
+        path.pop()
+        self.expanded[alias] = res = unique(res)
+        return res
+
+    def resolve_location(self, location):
+        """Apply distbase to a location which is not an alias.
+        """
         if self.is_server(location):
-            return [location]
+            return location
         if location == 'pypi':
             err_exit('No configuration found for server: pypi\n'
                      'Please create a ~/.pypirc file')
         if self.urlparser.is_url(location):
-            return [location]
+            return location
+        if self.is_local(location):
+            # Absolute paths are relative to distbase, if there is one
+            if self.urlparser.get_scheme(location) == 'file' or not self.distbase:
+                return location
         if not self.has_host(location) and self.distbase:
-            return [self.join(self.distbase, location)]
-        return [location]
+            return self.join(self.distbase, location)
+        return location
 
     def get_default_location(self):
         """Return the default location.
@@ -186,7 +418,7 @@ class Locations(object):
         res = []
         for location in self.distdefault:
             res.extend(self.get_location(location))
-        return res
+        return unique(res)
 
     def check_valid_locations(self, locations=None):
         """Fail if 'locations' is empty or contains bad destinations.
@@ -198,6 +430,7 @@ class Locations(object):
         for location in locations:
             if (not self.is_server(location) and
                 not self.is_dist_url(location) and
+                not self.is_local(location) and
                 not self.has_host(location)):
                 err_exit('Unknown location: %(location)s' % locals())
 
@@ -208,6 +441,7 @@ class ReleaseMaker(object):
         """Initialize.
         """
         self.args = args
+        self.timer = Timer()
         self.set_defaults(expanduser('~/.mkrelease'))
 
     def set_defaults(self, config_file):
@@ -216,14 +450,34 @@ class ReleaseMaker(object):
         self.defaults = Defaults(config_file)
         self.locations = Locations(self.defaults)
         self.python = Python()
-        self.setuptools = Setuptools()
-        self.scp = SCP()
-        self.scms = SCMFactory()
+        lazy.invalidate(self, 'store')
+        lazy.invalidate(self, 'history')
         self.urlparser = URLParser()
         self.skipcommit = False
         self.skiptag = False
         self.skipupload = False
         self.push = self.defaults.push
+        self.simpleindex = self.defaults.simpleindex
+        self.nativeupload = self.defaults.nativeupload
+        self.stream = False
+        self.redistribute = ''
+        self.sync = False
+        self.jobs = 4
+        self.syncargs = []
+        self.listhistory = False
+        self.historyargs = []
+        self.timings = False
+        self.timingsfile = ''
+        self.tracecommands = False
+        self.eventsfile = ''
+        self.tracer = None
+        self.serve = False
+        self.socketpath = expanduser(SOCKET)
+        self.stack = False
+        self.plan = False
+        self.stackargs = []
+        self.stackoptions = []
+        self.result = None
         self.quiet = False
         self.sign = False
         self.list = False
@@ -235,17 +489,67 @@ class ReleaseMaker(object):
         self.distflags = ['--formats="zip"']
         self.directory = os.curdir
         self.scm = None
+        self.isremote = False
+
+    @lazy
+    def setuptools(self):
+        from setuptools import Setuptools
+        return Setuptools()
+
+    @lazy
+    def scp(self):
+        from scp import SCP
+        return SCP()
+
+    @lazy
+    def local(self):
+        from local import Local
+        return Local()
+
+    @lazy
+    def gpg(self):
+        from gpg import GPG
+        return GPG()
+
+    @lazy
+    def uploader(self):
+        from upload import Uploader
+        return Uploader()
+
+    @lazy
+    def index(self):
+        from index import Index
+        return Index()
+
+    @lazy
+    def store(self):
+        from store import Store
+        return Store(self.defaults.store, self.defaults.storesize * MEGABYTE)
+
+    @lazy
+    def history(self):
+        from history import History
+        return History(self.defaults.history)
+
+    @lazy
+    def scms(self):
+        from scm import SCMFactory
+        return SCMFactory()
 
     def parse_options(self, args, depth=0):
         """Parse command line options.
         """
         try:
             options, remaining_args = getopt.gnu_getopt(args,
-                'CSTbc:d:ehi:lnpqsv',
+                'CSTbc:d:ehi:j:lnpqsv',
                 ('no-commit', 'no-tag', 'no-upload', 'dry-run',
                  'sign', 'identity=', 'dist-location=', 'version', 'help',
                  'push', 'quiet', 'svn', 'hg', 'git', 'develop', 'binary',
-                 'list-locations', 'config-file='))
+                 'list-locations', 'config-file=', 'simple-index', 'stream',
+                 'redistribute=', 'sync', 'jobs=', 'history',
+                 'timings', 'timings-report=', 'trace-commands',
+                 'trace-events=', 'profile=', 'profile-setup-py',
+                 'serve', 'daemon', 'socket=', 'stack', 'plan'))
         except getopt.GetoptError, e:
             err_exit('mkrelease: %s\n%s' % (e.msg, USAGE))
 
@@ -268,12 +572,52 @@ class ReleaseMaker(object):
                 self.identity = value
             elif name in ('-d', '--dist-location'):
                 self.locations.extend(self.locations.get_location(value))
+            elif name in ('--simple-index',):
+                self.simpleindex = True
+            elif name in ('--stream',):
+                self.stream = True
+            elif name in ('--redistribute',):
+                self.redistribute = value
+            elif name in ('--sync',):
+                self.sync = True
+            elif name in ('--history',):
+                self.listhistory = True
+            elif name in ('--timings',):
+                self.timings = True
+            elif name in ('--timings-report',):
+                self.timingsfile = abspath(expanduser(value))
+            elif name in ('--trace-commands',):
+                self.tracecommands = True
+            elif name in ('--trace-events',):
+                self.eventsfile = abspath(expanduser(value))
+                from timeline import Timeline
+                self.timer.timeline = Timeline(self.timer.clock, self.timer.started)
+            elif name in ('--profile', '--profile-setup-py'):
+                pass # Handled by main
+            elif name in ('--serve',):
+                self.serve = True
+            elif name in ('--daemon',):
+                pass # Handled by main
+            elif name in ('--socket',):
+                self.socketpath = abspath(expanduser(value))
+            elif name in ('--stack',):
+                self.stack = True
+            elif name in ('--plan',):
+                self.stack = self.plan = True
+            elif name in ('-j', '--jobs'):
+                try:
+                    self.jobs = int(value)
+                except ValueError:
+                    self.jobs = 0
+                if self.jobs < 1:
+                    err_exit('mkrelease: option %s requires a positive integer\n%s' %
+                             (name, USAGE))
             elif name in ('-l', '--list-locations'):
                 self.list = True
             elif name in ('-h', '--help'):
                 msg_exit(HELP)
             elif name in ('-v', '--version'):
-                msg_exit(VERSION)
+                msg_exit(get_version())
             elif name in ('--svn', '--hg', '--git'):
                 self.scmtype = name[2:]
             elif name in ('-e', '--develop'):
@@ -288,8 +632,29 @@ class ReleaseMaker(object):
                 self.set_defaults(config_file)
                 return self.parse_options(args, depth+1)
 
+        if self.stack:
+            for name, value in options:
+                if name in STACK_CONFLICTS:
+                    err_exit('mkrelease: option %s cannot be used with --stack\n%s' %
+                             (name, USAGE))
+            self.stackoptions = self.get_stack_options(options)
         return remaining_args
 
+    def get_stack_options(self, options):
+        """Return the command line options passed on to --stack releases.
+
+        Options of the stack run itself are left out, in particular
+        those naming output files the releases would write at once.
+        """
+        args = []
+        for name, value in options:
+            if name in STACK_OPTIONS:
+                continue
+            args.append(name)
+            if value:
+                args.append(value)
+        return args
+
     def list_locations(self):
         """Print known dist-locations and exit.
         """
@@ -314,34 +679,174 @@ class ReleaseMaker(object):
         if not os.access(file, os.R_OK):
             err_exit('File cannot be read: %(file)s' % locals())
 
-    def get_uploadflags(self, location):
-        """Return uploadflags for the given server.
+    def get_signing(self, location):
+        """Return a (sign, identity) tuple for the given location.
+
+        Only index servers have per-location settings.
         """
-        uploadflags = []
-        server = self.defaults.servers[location]
+        sign = False
+        identity = ''
+        server_sign = server_identity = None
+        if location in self.defaults.servers:
+            server = self.defaults.servers[location]
+            server_sign, server_identity = server.sign, server.identity
 
         if self.sign:
-            if server.sign is None or server.sign:
-                uploadflags.append('--sign')
-        elif server.sign is not None:
-            if server.sign:
-                uploadflags.append('--sign')
+            sign = server_sign is None or server_sign
+        elif server_sign is not None:
+            sign = server_sign
         elif self.defaults.sign:
-            uploadflags.append('--sign')
+            sign = True
 
         if self.identity:
-            if '--sign' not in uploadflags:
-                uploadflags.append('--sign')
-            uploadflags.append('--identity="%s"' % self.identity)
-        elif '--sign' in uploadflags:
-            if server.identity is not None:
-                if server.identity:
-                    uploadflags.append('--identity="%s"' % server.identity)
+            sign = True
+            identity = self.identity
+        elif sign:
+            if server_identity is not None:
+                identity = server_identity
             elif self.defaults.identity:
-                uploadflags.append('--identity="%s"' % self.defaults.identity)
+                identity = self.defaults.identity
+
+        return sign, identity
+
+    def get_uploadflags(self, location):
+        """Return uploadflags for the given server.
+        """
+        uploadflags = []
+        sign, identity = self.get_signing(location)
+
+        if sign:
+            uploadflags.append('--sign')
+        if identity:
+            uploadflags.append('--identity="%s"' % identity)
 
         return uploadflags
 
+    def get_filetype(self):
+        """Return filetype and pyversion of the distfile.
+        """
+        if self.distcmd == 'sdist':
+            return 'sdist', ''
+        return 'bdist_egg', '%d.%d' % self.python.version_info[:2]
+
+    def get_remote_digests(self, distfile, name, location):
+        """Return digests of the copy of 'distfile' at 'location'.
+        """
+        if self.locations.is_server(location):
+            repository = self.defaults.servers[location].repository
+            return self.index.get_remote_digests(repository, name, basename(distfile))
+        if self.locations.is_local(location):
+            return self.local.get_remote_digests(distfile, self.locations.get_local_path(location))
+        location = self.urlparser.to_ssh_url(location)
+        return self.scp.get_remote_digests(distfile, location)
+
+    def check_locations(self, distfile, name, digests=None):
+        """Return the locations that do not yet have 'distfile'.
+
+        Fail if a location has a different file of the same name.
+        Locations are queried concurrently.
+        """
+        local = digests or get_digests(distfile)
+        remote = parallel_map(
+            lambda location: self.get_remote_digests(distfile, name, location),
+            self.locations)
+
+        locations = []
+        filename = basename(distfile)
+        for location, digests in zip(self.locations, remote):
+            status = compare_digests(local, digests)
+            if status == CONFLICT:
+                err_exit('ERROR: A different %(filename)s exists at %(location)s' % locals())
+            elif status == IDENTICAL:
+                if not self.quiet:
+                    print 'Skipping %(location)s: %(filename)s exists' % locals()
+            else:
+                locations.append(location)
+        return locations
+
+    def get_signatures(self, distfile, locations, tempdir):
+        """Sign 'distfile' once per distinct identity.
+
+        Returns a dict mapping locations to signature files. Servers
+        uploaded to by setuptools are left out, they sign on their own;
+        a warning is printed if this means signing more than once.
+        """
+        identities = {}
+        selfsigning = 0
+        for location in locations:
+            sign, identity = self.get_signing(location)
+            if not sign:
+                continue
+            if self.locations.is_server(location) and not self.nativeupload:
+                selfsigning += 1
+            else:
+                identities.setdefault(identity, []).append(location)
+
+        if selfsigning > 1 or (selfsigning and identities):
+            runs = selfsigning + len(identities)
+            warn('Signing %(runs)d times, setuptools signs for every index '
+                 'server; set native-upload = yes to sign once' % locals())
+
+        signatures = {}
+        for i, identity in enumerate(sorted(identities)):
+            # Signatures must be named like the distfile plus '.asc'
+            signature = join(tempdir, 'gpg-%d' % i, basename(distfile) + '.asc')
+            os.makedirs(dirname(signature))
+            self.gpg.run_sign(distfile, identity, signature)
+            for location in identities[identity]:
+                signatures[location] = signature
+        return signatures
+
+    def run_stream(self, distfile, locations, pkginfo, filetype, pyversion,
+                   digests, signatures):
+        """Stream 'distfile' to all 'locations' at once.
+
+        Servers uploaded to by setuptools cannot be streamed to.
+        Returns the list of locations that have been streamed to.
+        """
+        from stream import Fanout, LocalSink, SSHSink, UploadSink
+
+        sinks = []
+        streamed = []
+        for location in locations:
+            if self.locations.is_server(location):
+                if not self.nativeupload:
+                    continue
+                server = self.defaults.servers[location]
+                self.uploader.run_register(server, pkginfo, self.quiet)
+                sink = UploadSink(
+                    self.uploader, server, pkginfo, distfile, filetype, pyversion,
+                    digests, signatures.get(location), self.quiet)
+            elif self.locations.is_local(location):
+                sink = LocalSink(
+                    distfile, self.locations.get_local_path(location), self.quiet)
+            else:
+                sink = SSHSink(
+                    distfile, self.urlparser.to_ssh_url(location), self.quiet)
+            sinks.append(self.timer.wrap('upload %(location)s' % locals(), sink))
+            streamed.append(location)
+
+        if sinks:
+            if not self.quiet:
+                print 'running stream'
+            Fanout().run(distfile, sinks)
+        return streamed
+
+    def update_simple_index(self, distfile, name, digests=None):
+        """Add 'distfile' to the simple index of scp, sftp, and local locations.
+        """
+        filename = basename(distfile)
+        sha256 = (digests or get_digests(distfile))['sha256']
+        for location in self.locations:
+            if self.locations.is_server(location):
+                continue
+            if self.locations.is_local(location):
+                self.local.update_simple_index(
+                    self.locations.get_local_path(location), name, filename, sha256)
+            else:
+                self.scp.update_simple_index(
+                    self.urlparser.to_ssh_url(location), name, filename, sha256)
+
     def get_python(self):
         """Get the Python interpreter.
         """
@@ -352,7 +857,34 @@ class ReleaseMaker(object):
         """
         args = self.parse_options(self.args)
 
+        if self.serve:
+            if args:
+                err_exit('mkrelease: too many arguments\n%s' % USAGE)
+            return
+
+        if self.stack:
+            if not args:
+                err_exit('mkrelease: --stack requires one or more sandboxes\n%s' % USAGE)
+            for arg in args:
+                self.check_valid_stack_sandbox(arg)
+            self.stackargs = args
+            return
+
+        if self.sync:
+            if len(args) != 2:
+                err_exit('mkrelease: --sync requires a source and a destination\n%s' % USAGE)
+            self.syncargs = args
+            return
+
+        if self.listhistory:
+            if len(args) > 2:
+                err_exit('mkrelease: too many arguments\n%s' % USAGE)
+            self.historyargs = args
+            return
+
         if args:
+            if self.redistribute:
+                err_exit('mkrelease: too many arguments\n%s' % USAGE)
             self.directory = args[0]
 
         if self.list:
@@ -382,7 +914,8 @@ class ReleaseMaker(object):
         scmtype = self.scmtype
         develop = not self.infoflags
 
-        self.scm = self.scms.get_scm(scmtype, directory)
+        with self.timer.phase('get_scm'):
+            self.scm = self.scms.get_scm(scmtype, directory)
 
         if self.scm.is_valid_url(directory):
             directory = self.urlparser.abspath(directory)
@@ -394,18 +927,208 @@ class ReleaseMaker(object):
             self.isremote = False
 
             self.scm.check_valid_sandbox(directory)
-            self.setuptools.check_valid_package(directory)
 
-            name, version = self.setuptools.get_package_info(directory, develop)
+            with self.timer.phase('sandbox_info'):
+                self.setuptools.check_valid_package(directory)
+                name, version = self.setuptools.get_package_info(directory, develop)
             print 'Releasing', name, version
 
             if not self.skipcommit:
-                if self.scm.is_dirty_sandbox(directory):
-                    self.scm.commit_sandbox(directory, name, version, self.push)
+                with self.timer.phase('commit'):
+                    if self.scm.is_dirty_sandbox(directory):
+                        self.scm.commit_sandbox(directory, name, version, self.push)
+
+    def distribute(self, distfile, name, pkginfo, filetype, pyversion, digests,
+                   tempdir, directory=None, scmtype=''):
+        """Upload 'distfile' to all dist-locations.
+
+        The 'directory' and 'scmtype' arguments describe the build and
+        are needed for setuptools uploads only.
+        """
+        # Keep the checksum file out of the sandbox's dist directory
+        sidecar = write_sidecar(distfile, digests, tempdir)
+        with self.timer.phase('check_locations'):
+            locations = self.check_locations(distfile, name, digests)
+        with self.timer.phase('sign'):
+            signatures = self.get_signatures(distfile, locations, tempdir)
+        streamed = []
+        if self.stream:
+            with self.timer.phase('stream'):
+                streamed = self.run_stream(distfile, locations, pkginfo, filetype,
+                                           pyversion, digests, signatures)
+        sftp_locations = {}
+        local_locations = {}
+        for location in locations:
+            signature = signatures.get(location)
+            files = filter(None, [distfile, signature, sidecar])
+            if location in streamed:
+                # Only signature and checksum file are left
+                if self.locations.is_server(location):
+                    continue
+                files = files[1:]
+            if self.locations.is_server(location) and self.nativeupload:
+                server = self.defaults.servers[location]
+                with self.timer.phase('upload %(location)s' % locals()):
+                    self.uploader.run_register(server, pkginfo, self.quiet)
+                    self.uploader.run_upload(
+                        server, pkginfo, distfile, filetype, pyversion,
+                        digests=digests, signature=signature, quiet=self.quiet)
+            elif self.locations.is_server(location):
+                if directory is None:
+                    err_exit('ERROR: Cannot upload to %(location)s without building; '
+                             'enable native-upload' % locals())
+                uploadflags = self.get_uploadflags(location)
+                if '--sign' in uploadflags and isfile(distfile+'.asc'):
+                    os.remove(distfile+'.asc')
+                with self.timer.phase('upload %(location)s' % locals()):
+                    self.setuptools.run_register(
+                        directory, self.infoflags, location, scmtype, self.quiet)
+                    self.setuptools.run_upload(
+                        directory, self.infoflags, self.distcmd, self.distflags,
+                        location, uploadflags, scmtype, self.quiet)
+            elif self.locations.is_local(location):
+                local_locations.setdefault(tuple(files), []).append(
+                    self.locations.get_local_path(location))
+            elif self.locations.is_dist_url(location):
+                scheme = self.urlparser.get_scheme(location)
+                location = self.urlparser.to_ssh_url(location)
+                if scheme == 'sftp':
+                    sftp_locations.setdefault(tuple(files), []).append(location)
+                else:
+                    with self.timer.phase('upload %(location)s' % locals()):
+                        self.scp.run_scp(files[0], location, files[1:])
+            else:
+                with self.timer.phase('upload %(location)s' % locals()):
+                    self.scp.run_scp(files[0], location, files[1:])
+        for files, locations in sorted(sftp_locations.items()):
+            with self.timer.phase('upload %s' % ', '.join(locations)):
+                self.scp.run_sftp_batch(list(files), locations)
+        for files, locations in sorted(local_locations.items()):
+            # Hardlinks are safe when the build directory is thrown away
+            with self.timer.phase('upload %s' % ', '.join(locations)):
+                self.local.run_copy(list(files), locations, link=self.isremote)
+        if self.simpleindex:
+            with self.timer.phase('simple_index'):
+                self.update_simple_index(distfile, name, digests)
+
+    def redistribute_release(self):
+        """Distribute a stored release without building it.
+        """
+        name, sep, version = self.redistribute.partition('==')
+        if not (name and sep and version):
+            err_exit('mkrelease: bad release specification: %s\n'
+                     'Expected name==version' % self.redistribute)
+
+        entries = self.store.find(name, version)
+        if not entries:
+            err_exit('No %(name)s %(version)s in store' % locals())
+
+        tempdir = abspath(tempfile.mkdtemp(prefix='mkrelease-'))
+        try:
+            for i, entry in enumerate(entries):
+                distfile, pkginfo = self.store.get_files(entry, join(tempdir, str(i)))
+                print 'Redistributing', basename(distfile)
+                if pkginfo is None:
+                    err_exit('ERROR: No PKG-INFO stored for %s' % basename(distfile))
+                digests = get_digests(distfile)
+                if digests['sha256'] != entry['sha256']:
+                    err_exit('ERROR: Store is corrupt: %s' % basename(distfile))
+                self.distribute(distfile, entry['name'], pkginfo, entry['filetype'],
+                                entry['pyversion'], digests, tempdir)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def sync_locations(self):
+        """Copy dist files missing at the destination from the source.
+        """
+        source, dest = self.syncargs
+        sources = self.locations.get_location(source)
+        if len(sources) != 1:
+            err_exit('Sync source must be a single location: %(source)s' % locals())
+        dests = self.locations.get_location(dest)
+        self.locations.check_valid_locations(sources + dests)
+        from sync import Sync
+        Sync(self.locations, self.urlparser, self.jobs).run(sources[0], dests)
+
+    def serve_requests(self):
+        """Serve releases to --daemon clients until interrupted.
+        """
+        from daemon import Daemon
+        daemon = Daemon(self.socketpath, self.jobs)
+        daemon.bind()
+        daemon.warm()
+        print 'Serving on', self.socketpath
+        sys.stdout.flush()
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    def check_valid_stack_sandbox(self, dir):
+        """Check if 'dir' is a directory with a setup.py.
+        """
+        if not isdir(dir):
+            err_exit('No such directory: %(dir)s' % locals())
+        if not isfile(join(dir, 'setup.py')):
+            err_exit('No setup.py found in %(dir)s' % locals())
+
+    def release_stack(self):
+        """Release the --stack sandboxes in dependency order.
+        """
+        from scheduler import Scheduler
+        Scheduler(jobs=self.jobs).run(self.stackargs, self.stackoptions, self.plan)
+
+    def list_history(self):
+        """Print recorded releases.
+        """
+        name = version = None
+        if self.historyargs:
+            name = self.historyargs[0]
+        if len(self.historyargs) > 1:
+            version = self.historyargs[1]
+        if not self.history.enabled:
+            err_exit('No history recorded, set history in ~/.mkrelease')
+        for release in self.history.find(name, version, list(self.locations)):
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(release['started']))
+            locations = ', '.join(release['locations']) or '-'
+            print '%s  %s %s  %s' % (started, release['name'], release['version'], locations)
+
+    def check_tag_exists(self, directory, name, tagid, url):
+        """Fail if 'tagid' exists in the SCM.
+
+        Tags may be deleted or moved after a release, so the history
+        only warns about tags used before.
+        """
+        if self.history.has_tag(name, tagid, url):
+            warn('Tag %(tagid)s was used by an earlier release' % locals())
+        self.scm.check_tag_exists(directory, tagid)
+
+    def record_release(self, distfile, name, version, tagid, url, digests):
+        """Add the release to the history and keep it in 'result'.
+
+        Only distributed releases are added to the history.
+        """
+        locations = []
+        if not self.skipupload:
+            locations = list(self.locations)
+            self.history.add(name, version, tagid, url, basename(distfile),
+                             digests['sha256'], locations, self.timer.phases,
+                             self.timer.timestamp, self.timer.total())
+        self.result = {
+            'name': name,
+            'version': version,
+            'tagid': tagid,
+            'url': url,
+            'filename': basename(distfile),
+            'digests': digests,
+            'locations': locations,
+        }
 
     def make_release(self):
         """Build and distribute the egg.
         """
+        from process import Future
+
         directory = self.directory
         infoflags = self.infoflags
         distcmd = self.distcmd
@@ -418,7 +1141,8 @@ class ReleaseMaker(object):
         try:
             if self.isremote:
                 directory = join(tempdir, 'build')
-                self.scm.clone_url(self.remoteurl, directory)
+                with self.timer.phase('clone'):
+                    self.scm.clone_url(self.remoteurl, directory)
             else:
                 directory = abspath(expanduser(directory))
 
@@ -432,66 +1156,147 @@ class ReleaseMaker(object):
                     branch = self.scm.get_branch_from_sandbox(directory)
                     print 'Releasing branch', branch
 
-            self.setuptools.check_valid_package(directory)
+            with self.timer.phase('check_package'):
+                self.setuptools.check_valid_package(directory)
 
+            # Independent queries run concurrently
+            checks = Future.resolved(None)
             if not (self.skipcommit and self.skiptag):
-                self.scm.check_dirty_sandbox(directory)
-                self.scm.check_unclean_sandbox(directory)
+                checks = self.scm.start_check_sandbox(directory)
+            info = self.setuptools.start_package_info(directory, develop)
+            urlinfo = Future.resolved('')
+            if self.isremote:
+                urlinfo = Future.resolved(self.remoteurl)
+            elif self.history.enabled:
+                urlinfo = self.scm.start_get_url_from_sandbox(directory)
+
+            try:
+                if not (self.skipcommit and self.skiptag):
+                    with self.timer.phase('check_sandbox'):
+                        checks.result()
+                with self.timer.phase('package_info'):
+                    name, version = info.result()
+                url = urlinfo.result()
+            finally:
+                for future in (checks, info, urlinfo):
+                    future.wait()
 
-            name, version = self.setuptools.get_package_info(directory, develop)
             if self.isremote:
                 print 'Releasing', name, version
 
+            tagid = ''
             if not self.skiptag:
                 print 'Tagging', name, version
-                tagid = self.scm.make_tagid(directory, name, version)
-                self.scm.check_tag_exists(directory, tagid)
-                self.scm.create_tag(directory, tagid, name, version, self.push)
+                with self.timer.phase('tag'):
+                    tagid = self.scm.make_tagid(directory, name, version)
+                    self.check_tag_exists(directory, name, tagid, url)
+                    self.scm.create_tag(directory, tagid, name, version, self.push)
 
             if scmtype == 'svn' and self.scm.version_info[:2] < (1, 7):
                 scmtype = 'svn_cvs'
 
-            manifest = self.setuptools.run_egg_info(
-                directory, infoflags, scmtype, self.quiet)
-            distfile = self.setuptools.run_dist(
-                directory, infoflags, distcmd, distflags, scmtype, self.quiet)
+            with self.timer.phase('egg_info'):
+                manifest = self.setuptools.run_egg_info(
+                    directory, infoflags, scmtype, self.quiet)
+            with self.timer.phase('dist'):
+                distfile = self.setuptools.run_dist(
+                    directory, infoflags, distcmd, distflags, scmtype, self.quiet)
+
+            pkginfo = join(dirname(manifest), 'PKG-INFO')
+            filetype, pyversion = self.get_filetype()
 
+            # Hash once, reuse for store, dedupe, uploads, and index
+            with self.timer.phase('digest'):
+                digests = get_digests(distfile)
             if not self.skipupload:
-                for location in self.locations:
-                    if self.locations.is_server(location):
-                        uploadflags = self.get_uploadflags(location)
-                        if '--sign' in uploadflags and isfile(distfile+'.asc'):
-                            os.remove(distfile+'.asc')
-                        self.setuptools.run_register(
-                            directory, infoflags, location, scmtype, self.quiet)
-                        self.setuptools.run_upload(
-                            directory, infoflags, distcmd, distflags, location, uploadflags,
-                            scmtype, self.quiet)
-                    elif self.locations.is_dist_url(location):
-                        scheme = self.urlparser.get_scheme(location)
-                        location = self.urlparser.to_ssh_url(location)
-                        if scheme == 'sftp':
-                            self.scp.run_sftp(distfile, location)
-                        else:
-                            self.scp.run_scp(distfile, location)
-                    else:
-                        self.scp.run_scp(distfile, location)
+                if self.defaults.storesize > 0:
+                    with self.timer.phase('store'):
+                        self.store.add(distfile, name, version, tagid, pkginfo,
+                                       filetype, pyversion, digests)
+                with self.timer.phase('distribute'):
+                    self.distribute(distfile, name, pkginfo, filetype, pyversion,
+                                    digests, tempdir, directory, scmtype)
+
+            self.record_release(distfile, name, version, tagid, url, digests)
         finally:
             shutil.rmtree(tempdir)
 
+    def report_timings(self, status=0):
+        """Print the timings table and write the JSON report.
+        """
+        if self.tracer is not None:
+            from process import Process
+            Process.tracer = None
+        if self.tracecommands and self.tracer is not None:
+            for line in self.tracer.get_trace() + self.tracer.get_summary():
+                print line
+        if self.timings:
+            for line in self.timer.get_summary():
+                print line
+        if self.timingsfile:
+            self.timer.write_report(self.timingsfile, status)
+        if self.eventsfile:
+            self.timer.timeline.write(self.eventsfile)
+
+    def run_phases(self):
+        with self.timer.phase('get_python'):
+            self.get_python()
+        with self.timer.phase('get_options'):
+            self.get_options()
+        if self.tracecommands or self.eventsfile:
+            from process import Process
+            from tracing import CommandTracer
+            self.tracer = CommandTracer(timeline=self.timer.timeline)
+            Process.tracer = self.tracer
+        if self.sync:
+            with self.timer.phase('sync'):
+                self.sync_locations()
+        elif self.listhistory:
+            self.list_history()
+        elif self.serve:
+            self.serve_requests()
+        elif self.stack:
+            with self.timer.phase('stack'):
+                self.release_stack()
+        elif self.redistribute:
+            with self.timer.phase('redistribute'):
+                self.redistribute_release()
+        else:
+            with self.timer.phase('get_package'):
+                self.get_package()
+            with self.timer.phase('make_release'):
+                self.make_release()
+
     def run(self):
-        self.get_python()
-        self.get_options()
-        self.get_package()
-        self.make_release()
+        try:
+            self.run_phases()
+        except SystemExit, e:
+            self.report_timings(e.code)
+            raise
+        if self.listhistory or self.serve or self.plan:
+            return
+        self.report_timings()
         print 'done'
 
 
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
+    client, socketpath, args = get_daemon_options(args)
+    if client:
+        from daemon import run_client
+        try:
+            return run_client(abspath(expanduser(socketpath)), args)
+        except SystemExit, e:
+            return e.code
+    profile, children = get_profile_options(args)
     try:
-        ReleaseMaker(args).run()
+        if profile:
+            from profiling import Profiler
+            Profiler(abspath(expanduser(profile)), children).run(
+                lambda: ReleaseMaker(args).run())
+        else:
+            ReleaseMaker(args).run()
     except SystemExit, e:
         return e.code
     return 0
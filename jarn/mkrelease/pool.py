@@ -0,0 +1,45 @@
+import sys
+import threading
+
+
+def parallel_map(func, items, workers=None):
+    """Call 'func' for every item in 'items' using a pool of threads.
+
+    Returns a list of results in the order of 'items'. If calls
+    raise exceptions (including SystemExit), the one belonging to the
+    first item is re-raised after all workers have finished.
+
+    The 'workers' argument limits the number of threads; the default
+    is one thread per item.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    pending = list(reversed(range(len(items))))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                i = pending.pop()
+            try:
+                results[i] = func(items[i])
+            except BaseException:
+                with lock:
+                    errors.append((i, sys.exc_info()))
+
+    if workers is None or workers > len(items):
+        workers = len(items)
+
+    threads = [threading.Thread(target=worker) for x in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        i, exc_info = min(errors)
+        raise exc_info[0], exc_info[1], exc_info[2]
+    return results
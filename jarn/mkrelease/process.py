@@ -1,19 +1,169 @@
 import os
+import sys
 import tee
+import subprocess
+
+from tracing import ByteCounter
+
+
+class TracedCommand(tee.Command):
+    """A tee.Command recorded by a CommandTracer."""
+
+    def __init__(self, tracer, cmd, echo=True, echo2=True, env=None):
+        tee.Command.__init__(self, cmd, ByteCounter(echo), ByteCounter(echo2), env)
+        self.tracer = tracer
+        self.record = None
+
+    def start(self):
+        self.record = self.tracer.start(self.cmd)
+        tee.Command.start(self)
+
+    def finish(self):
+        tee.Command.finish(self)
+        self.record.update(rc=self.returncode, stdout=self.echo.bytes,
+                           stderr=self.echo2.bytes)
+        self.tracer.finish(self.record)
+
+
+class Future(object):
+    """The result of a command started by Process.start().
+
+    result() waits for the command and returns, or raises, what 'get'
+    does; the outcome is kept for later calls. wait() waits for the
+    command only. then() returns a Future of the result passed through
+    a function.
+    """
+
+    def __init__(self, get, wait=None):
+        self.get = get
+        self.waiter = wait
+        self.done = False
+        self.value = None
+        self.exc_info = None
+
+    @classmethod
+    def resolved(cls, value):
+        """Return a Future whose result is 'value'.
+        """
+        future = cls(None)
+        future.done = True
+        future.value = value
+        return future
+
+    def result(self):
+        if not self.done:
+            self.done = True
+            try:
+                self.value = self.get()
+            except BaseException:
+                self.exc_info = sys.exc_info()
+            self.get = self.waiter = None
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.value
+
+    def wait(self):
+        if not self.done and self.waiter is not None:
+            self.waiter()
+
+    def then(self, func):
+        return Future(lambda: func(self.result()), self.wait)
 
 
 class Process(object):
-    """Process related functions using the tee module."""
+    """Process related functions using the tee module.
+
+    If the class attribute 'tracer' is set to a CommandTracer, all
+    commands run by any Process are recorded.
+    """
+
+    tracer = None
 
-    def __init__(self, quiet=False, env=None):
+    def __init__(self, quiet=False, env=None, loop=None):
         self.quiet = quiet
         self.env = env
+        self.loop = loop
 
     def popen(self, cmd, echo=True, echo2=True):
         # env *replaces* os.environ
         if self.quiet:
             echo = echo2 = False
-        return tee.popen(cmd, echo, echo2, env=self.env)
+        if self.tracer is None:
+            return tee.popen(cmd, echo, echo2, env=self.env)
+        echo, echo2 = ByteCounter(echo), ByteCounter(echo2)
+        with self.tracer.command(cmd) as record:
+            rc, lines = tee.popen(cmd, echo, echo2, env=self.env)
+            record.update(rc=rc, stdout=echo.bytes, stderr=echo2.bytes)
+        return rc, lines
+
+    def command(self, cmd, echo=True, echo2=True):
+        """Return a tee.Command for 'cmd', to be passed to run().
+
+        The 'echo' and 'echo2' arguments are the same as for popen.
+        """
+        if self.quiet:
+            echo = echo2 = False
+        if self.tracer is None:
+            return tee.Command(cmd, echo, echo2, env=self.env)
+        return TracedCommand(self.tracer, cmd, echo, echo2, env=self.env)
+
+    def start(self, cmd, echo=True, echo2=True):
+        """Start 'cmd' and return a Future of its (rc, lines) tuple.
+
+        The command runs while the caller goes on. Commands started by
+        one thread share a tee.Loop, unless the Process has its own,
+        and are read whenever the thread waits for one of them.
+        """
+        command = self.command(cmd, echo, echo2)
+        loop = self.loop or tee.get_loop()
+        loop.start(command)
+
+        def wait():
+            loop.wait([command])
+
+        def get():
+            wait()
+            return command.returncode, command.lines
+        return Future(get, wait)
+
+    def run(self, commands, jobs=None):
+        """Run 'commands' concurrently and return a list of (rc, lines) tuples.
+
+        All commands are read by the calling thread. At most 'jobs'
+        commands run at the same time; the default is all of them.
+        """
+        tee.run(commands, jobs)
+        return [(command.returncode, command.lines) for command in commands]
+
+    def feed(self, cmd, blocks):
+        """Run 'cmd' with 'blocks' written to its stdin and return the exit code.
+
+        Writing stops early if 'cmd' closes its stdin.
+        """
+        if self.tracer is not None:
+            with self.tracer.command(cmd) as record:
+                record['rc'] = self._feed(cmd, blocks)
+            return record['rc']
+        return self._feed(cmd, blocks)
+
+    def _feed(self, cmd, blocks):
+        # env *replaces* os.environ
+        stdout = None
+        if self.quiet:
+            stdout = open(os.devnull, 'w')
+        try:
+            process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE,
+                                       stdout=stdout, stderr=stdout, env=self.env)
+            try:
+                for block in blocks:
+                    process.stdin.write(block)
+                process.stdin.close()
+            except IOError:
+                pass
+            return process.wait()
+        finally:
+            if stdout is not None:
+                stdout.close()
 
     def pipe(self, cmd):
         rc, lines = self.popen(cmd, echo=False)
@@ -27,9 +177,38 @@ class Process(object):
 
     def os_system(self, cmd):
         # env *updates* os.environ
+        if self.tracer is not None:
+            with self.tracer.command(cmd) as record:
+                record['rc'] = self._os_system(cmd)
+            return record['rc']
+        return self._os_system(cmd)
+
+    def _os_system(self, cmd):
         if self.quiet:
             cmd = cmd + ' >%s 2>&1' % os.devnull
         if self.env:
             cmd = ''.join('export %s="%s"\n' % (k, v) for k, v in self.env.items()) + cmd
         return os.system(cmd)
 
+
+
+class AsyncProcess(Process):
+    """A Process whose popen, pipe, and system return Futures.
+
+    Commands start at once and run concurrently. Pass a tee.Loop
+    with 'jobs' set to bound the number of commands running at the
+    same time.
+    """
+
+    def popen(self, cmd, echo=True, echo2=True):
+        return self.start(cmd, echo, echo2)
+
+    def pipe(self, cmd):
+        def first_line((rc, lines)):
+            if rc == 0 and lines:
+                return lines[0]
+            return ''
+        return self.start(cmd, echo=False).then(first_line)
+
+    def system(self, cmd):
+        return self.start(cmd).then(lambda (rc, lines): rc)
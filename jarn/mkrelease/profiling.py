@@ -0,0 +1,52 @@
+import os
+import shutil
+import pstats
+import cProfile
+import tempfile
+
+from os.path import join, getsize
+
+from exit import err_exit
+
+
+class Profiler(object):
+    """Profile a function call with cProfile and write pstats data.
+
+    If 'children' is True, setup.py processes are profiled as well
+    and their statistics are merged into the same file.
+    """
+
+    def __init__(self, filename, children=False):
+        self.filename = filename
+        self.children = children
+
+    def run(self, func, *args, **kw):
+        """Call 'func' under the profiler and return its result.
+
+        The statistics are written even if 'func' raises an exception.
+        """
+        from setuptools import Setuptools
+
+        profile = cProfile.Profile()
+        tempdir = tempfile.mkdtemp(prefix='mkrelease-profile-')
+        if self.children:
+            Setuptools.profiledir = tempdir
+        try:
+            return profile.runcall(func, *args, **kw)
+        finally:
+            Setuptools.profiledir = None
+            try:
+                self.write_stats(profile, tempdir)
+            finally:
+                shutil.rmtree(tempdir)
+
+    def write_stats(self, profile, dir):
+        filename = self.filename
+        try:
+            stats = pstats.Stats(profile)
+            for name in sorted(os.listdir(dir)):
+                if getsize(join(dir, name)):
+                    stats.add(join(dir, name))
+            stats.dump_stats(filename)
+        except (IOError, OSError, EOFError, ValueError), e:
+            err_exit('ERROR: Failed to write %(filename)s: %(e)s' % locals())
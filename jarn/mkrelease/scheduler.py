@@ -0,0 +1,174 @@
+import os
+import sys
+import pipes
+
+from os.path import abspath
+
+from python import Python
+from process import Process
+from setuptools import Setuptools
+from index import normalize_name
+from exit import err_exit
+
+
+def get_waves(packages):
+    """Return the release order of 'packages' as a list of waves.
+
+    'packages' maps normalized project names to the names they require.
+    Requirements not in 'packages' are ignored. Every wave is a sorted
+    list of names depending on earlier waves only.
+    """
+    requires = {}
+    for name, required in packages.items():
+        requires[name] = set(x for x in required if x in packages and x != name)
+
+    waves = []
+    done = set()
+    while len(done) < len(requires):
+        wave = sorted(x for x in requires if x not in done and requires[x] <= done)
+        if not wave:
+            cycle = get_cycle(requires, done)
+            err_exit('Dependency cycle: %s' % ' -> '.join(cycle))
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+
+def get_cycle(requires, done):
+    """Return a dependency cycle among the names not in 'done'.
+    """
+    name = min(x for x in requires if x not in done)
+    path = []
+    while name not in path:
+        path.append(name)
+        name = min(x for x in requires[name] if x not in done)
+    return path[path.index(name):] + [name]
+
+
+def get_env():
+    """Return the environment for running releases.
+
+    The releases must import this copy of mkrelease.
+    """
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(x for x in sys.path if x)
+    return env
+
+
+class Scheduler(object):
+    """Release interdependent packages in dependency order.
+
+    The install_requires of all sandboxes are read to build the
+    dependency graph, and packages are released in waves. The releases
+    in a wave run concurrently, at most 'jobs' at a time. If a release
+    fails, the packages depending on it are skipped.
+    """
+
+    def __init__(self, process=None, setuptools=None, jobs=4):
+        self.process = process or Process(env=get_env())
+        self.setuptools = setuptools or Setuptools()
+        self.jobs = jobs
+        self.python = Python()
+        self.names = {}
+        self.dirs = {}
+        self.requires = {}
+
+    def get_plan(self, dirs):
+        """Read the sandboxes in 'dirs' and return the list of waves.
+        """
+        self.names, self.dirs, self.requires = {}, {}, {}
+        results = self.setuptools.get_requirements(dirs, self.jobs)
+        for dir, (name, required) in zip(dirs, results):
+            key = normalize_name(name)
+            if key in self.names:
+                err_exit('Duplicate package: %s in %s and %s' % (name, self.dirs[key], dir))
+            self.names[key] = name
+            self.dirs[key] = abspath(dir)
+            self.requires[key] = [normalize_name(x) for x in required]
+        return get_waves(self.requires)
+
+    def print_plan(self, waves):
+        """Print the waves.
+        """
+        for i, wave in enumerate(waves):
+            print 'Wave %d: %s' % (i+1, ', '.join(self.names[x] for x in wave))
+
+    def get_command(self, key, options):
+        """Return the command releasing package 'key' with 'options'.
+        """
+        args = [str(self.python), '-m', 'jarn.mkrelease.mkrelease']
+        args.extend(options)
+        args.extend(['--', self.dirs[key]])
+        return ' '.join(pipes.quote(x) for x in args) + ' 2>&1'
+
+    def get_blocker(self, key, failed, skipped):
+        """Return the failed or skipped requirement of 'key', if any.
+        """
+        for required in sorted(self.requires[key]):
+            if required in failed or required in skipped:
+                return required
+        return None
+
+    def release(self, waves, options):
+        """Release the waves and return a (released, failed, skipped) tuple.
+
+        'skipped' maps skipped packages to the requirement that failed
+        or was skipped.
+        """
+        released, failed, skipped = [], [], {}
+        process = self.process
+
+        for i, wave in enumerate(waves):
+            keys = []
+            for key in wave:
+                blocker = self.get_blocker(key, failed, skipped)
+                if blocker is None:
+                    keys.append(key)
+                else:
+                    skipped[key] = blocker
+            if not keys:
+                continue
+
+            print 'Releasing wave %d: %s' % (i+1, ', '.join(self.names[x] for x in keys))
+            sys.stdout.flush()
+            commands = [process.command(self.get_command(x, options), echo=False)
+                        for x in keys]
+            for key, (rc, lines) in zip(keys, process.run(commands, self.jobs)):
+                name = self.names[key]
+                print '--- %s ---' % name
+                for line in lines:
+                    print line
+                if rc == 0:
+                    released.append(key)
+                else:
+                    print 'ERROR: Release of %(name)s failed' % locals()
+                    failed.append(key)
+            sys.stdout.flush()
+
+        return released, failed, skipped
+
+    def print_summary(self, released, failed, skipped):
+        """Print the outcome of all releases.
+        """
+        names = self.names
+        if released:
+            print 'Released:', ', '.join(names[x] for x in released)
+        if failed:
+            print 'Failed:', ', '.join(names[x] for x in failed)
+        for key in sorted(skipped):
+            print 'Skipped: %s (requires %s)' % (names[key], names[skipped[key]])
+
+    def run(self, dirs, options, plan=False):
+        """Release the packages in 'dirs', passing 'options' to each release.
+
+        If 'plan' is true, print the waves and do not release anything.
+        """
+        waves = self.get_plan(dirs)
+        self.print_plan(waves)
+        if plan:
+            return
+        released, failed, skipped = self.release(waves, options)
+        self.print_summary(released, failed, skipped)
+        if failed or skipped:
+            err_exit('ERROR: %d of %d packages not released' %
+                     (len(failed) + len(skipped), len(self.names)))
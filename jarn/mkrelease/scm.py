@@ -1,4 +1,3 @@
-import os
 import re
 import tee
 
@@ -7,7 +6,8 @@ from operator import itemgetter
 from os.path import abspath, join, expanduser, dirname
 from os.path import exists, isdir, isfile
 
-from process import Process
+from process import Process, Future
+from env import get_scm_env
 from urlparser import URLParser
 from chdir import ChdirStack, chdir
 from exit import err_exit, warn
@@ -20,6 +20,9 @@ class SCM(object):
     name = ''
     version_re = re.compile(r'version ([0-9.]+)', re.IGNORECASE)
 
+    # Set to a dict to share version probes between instances
+    version_cache = None
+
     def __init__(self, process=None, urlparser=None):
         self.process = process or Process(env=self.get_env())
         self.urlparser = urlparser or URLParser()
@@ -27,6 +30,15 @@ class SCM(object):
 
     @lazy
     def version_info(self):
+        cache = self.version_cache
+        if cache is not None:
+            key = (self.name, (self.process.env or {}).get('PATH'))
+            if key not in cache:
+                cache[key] = self.get_version_info()
+            return cache[key]
+        return self.get_version_info()
+
+    def get_version_info(self):
         version = self.get_version()
         info = []
         if version:
@@ -41,11 +53,7 @@ class SCM(object):
         raise NotImplementedError
 
     def get_env(self):
-        if 'PYTHONPATH' not in os.environ:
-            return os.environ
-        env = os.environ.copy()
-        del env['PYTHONPATH']
-        return env
+        return get_scm_env()
 
     def is_valid_url(self, url):
         raise NotImplementedError
@@ -111,6 +119,18 @@ class SCM(object):
         if self.tag_exists(dir, tagid):
             err_exit('Tag exists: %(tagid)s' % locals())
 
+    # Async variants return a Future and let the caller go on while
+    # the SCM is queried. Subclasses without one query on result().
+
+    def start_check_sandbox(self, dir):
+        def check():
+            self.check_dirty_sandbox(dir)
+            self.check_unclean_sandbox(dir)
+        return Future(check)
+
+    def start_get_url_from_sandbox(self, dir):
+        return Future(lambda: self.get_url_from_sandbox(dir))
+
 
 class Subversion(SCM):
 
@@ -344,6 +364,18 @@ class Mercurial(SCM):
             return bool(lines)
         err_exit('Failed to get status from %(dir)s' % locals())
 
+    @chdir
+    def start_check_sandbox(self, dir):
+        def check((rc, lines)):
+            if rc != 0:
+                err_exit('Failed to get status from %s' % dir)
+            if [x for x in lines if x[0:1] in ('M', 'A', 'R')]:
+                err_exit('Uncommitted changes in %s' % dir)
+            if lines:
+                err_exit('Unclean sandbox: %s' % dir)
+        return self.process.start(
+            'hg status -mard .', echo=False).then(check)
+
     @chdir
     def is_remote_sandbox(self, dir):
         return bool(self.get_url_from_sandbox(dir))
@@ -376,6 +408,24 @@ class Mercurial(SCM):
             err_exit('Failed to get URL from %(dir)s' % locals())
         return ''
 
+    @chdir
+    def start_get_url_from_sandbox(self, dir):
+        branch = self.process.start('hg branch', echo=False)
+        paths = self.process.start('hg show paths.default', echo=False)
+
+        def get_url():
+            rc, lines = branch.result()
+            paths.wait()
+            if rc != 0 or not lines:
+                err_exit('Failed to get branch from %s' % dir)
+            rc, lines = paths.result()
+            if rc != 0:
+                err_exit('Failed to get URL from %s' % dir)
+            if lines:
+                return lines[0]
+            return ''
+        return Future(get_url, lambda: (branch.wait(), paths.wait()))
+
     @chdir
     def commit_sandbox(self, dir, name, version, push):
         rc = self.process.system(
@@ -500,6 +550,19 @@ class Git(SCM):
     def is_unclean_sandbox(self, dir):
         return self.is_dirty_sandbox(dir)
 
+    @chdir
+    def start_check_sandbox(self, dir):
+        if self.version_info[:2] < (1, 7):
+            return SCM.start_check_sandbox(self, dir)
+
+        def check((rc, lines)):
+            if rc != 0:
+                err_exit('Failed to get status from %s' % dir)
+            if lines:
+                err_exit('Uncommitted changes in %s' % dir)
+        return self.process.start(
+            'git status --porcelain --untracked-files=no .', echo=False).then(check)
+
     @chdir
     def is_remote_sandbox(self, dir):
         return bool(self.get_remote_from_sandbox(dir))
@@ -565,6 +628,37 @@ class Git(SCM):
                 err_exit('Failed to get URL from %(dir)s' % locals())
         return ''
 
+    @chdir
+    def start_get_url_from_sandbox(self, dir):
+        branches = self.process.start('git branch', echo=False)
+        config = self.process.start('git config -l', echo=False)
+
+        def get_value(lines, key):
+            for line in reversed(lines):
+                if line.startswith(key):
+                    return line[len(key):]
+            return ''
+
+        def get_url():
+            rc, lines = branches.result()
+            config.wait()
+            branch = None
+            if rc == 0:
+                for line in lines:
+                    if line.startswith('*'):
+                        branch = line[2:]
+                        break
+            if branch is None:
+                err_exit('Failed to get branch from %s' % dir)
+            rc, lines = config.result()
+            if rc != 0 or not lines:
+                err_exit('Failed to get remote from %(branch)s' % locals())
+            remote = get_value(lines, 'branch.%(branch)s.remote=' % locals())
+            if remote:
+                return get_value(lines, 'remote.%(remote)s.url=' % locals())
+            return ''
+        return Future(get_url, lambda: (branches.wait(), config.wait()))
+
     @chdir
     def commit_sandbox(self, dir, name, version, push):
         rc = self.process.system(
@@ -1,11 +1,19 @@
-import tempfile
+import os
+import sys
 import time
-import random
+import shutil
+import tempfile
+import posixpath
 
-from os.path import basename
+from os.path import basename, getsize, join, dirname, isdir
 
 from process import Process
+from urlparser import URLParser
+from simpleindex import SimpleIndex
 from exit import err_exit
+from tee import Not, StartsWith
+
+SFTP_PROMPT = 'sftp> '
 
 
 class SCP(object):
@@ -14,20 +22,28 @@ class SCP(object):
     def __init__(self, process=None):
         self.process = process or Process()
 
-    def delay(self):
-        # Reduce output jerkiness
-        time.sleep(random.choice([0.3, 0.4]))
+    def flush(self):
+        # Make sure our messages appear before the subprocess output
+        sys.stdout.flush()
 
-    def run_scp(self, distfile, location):
+    def run_scp(self, distfile, location, extras=()):
+        """Upload 'distfile' to 'location'.
+
+        The 'extras' argument is a list of additional files, like
+        signatures and checksums, to upload in the same call.
+        """
+        distfiles = [distfile] + list(extras)
         if not self.process.quiet:
             print 'running scp_upload'
-            self.delay()
-            name = basename(distfile)
-            print 'Uploading dist/%(name)s to %(location)s' % locals()
+            for filename in distfiles:
+                name = basename(filename)
+                print 'Uploading dist/%(name)s to %(location)s' % locals()
+            self.flush()
 
+        files = ' '.join('"%s"' % x for x in distfiles)
         try:
             rc, lines = self.process.popen(
-                'scp "%(distfile)s" "%(location)s"' % locals(),
+                'scp %(files)s "%(location)s"' % locals(),
                 echo=False)
             if rc == 0:
                 if not self.process.quiet:
@@ -38,27 +54,277 @@ class SCP(object):
         err_exit('ERROR: scp failed')
 
     def run_sftp(self, distfile, location):
-        if not self.process.quiet:
+        return self.run_sftp_batch([distfile], [location])
+
+    def run_sftp_batch(self, distfiles, locations):
+        """Upload 'distfiles' to 'locations' using one sftp session per host.
+
+        Missing directories are created, and files are uploaded under
+        a temporary name and renamed into place.
+        """
+        hosts = []
+        transfers = {}
+        for location in locations:
+            host, path = self.split_location(location)
+            if host not in transfers:
+                hosts.append(host)
+                transfers[host] = []
+            for distfile in distfiles:
+                transfer = (distfile, posixpath.join(path, basename(distfile)))
+                if transfer not in transfers[host]:
+                    transfers[host].append(transfer)
+
+        return self.run_sftp_puts([(host, transfers[host]) for host in hosts])
+
+    def split_location(self, location):
+        """Split an ssh-style 'location' into host and path.
+        """
+        match = URLParser.ssh_re.match(location)
+        if match is not None:
+            return match.group(1), match.group(2)
+        err_exit('Bad sftp location: %(location)s' % locals())
+
+    def run_sftp_put(self, host, transfers, report=True):
+        """Upload files to 'host' in a single sftp session.
+
+        The 'transfers' argument is a list of (localfile, remotepath)
+        tuples. If 'report' is False, progress messages are suppressed.
+        """
+        return self.run_sftp_puts([(host, transfers)], report)
+
+    def run_sftp_puts(self, sessions, report=True):
+        """Upload files to several hosts, one sftp session per host.
+
+        The 'sessions' argument is a list of (host, transfers) tuples
+        as accepted by run_sftp_put. Several sessions run concurrently
+        in ssh batch mode, so no host can prompt for passwords,
+        passphrases, or host keys on the shared terminal.
+        """
+        report = report and not self.process.quiet
+        if report:
             print 'running sftp_upload'
-            self.delay()
-            name = basename(distfile)
-            print 'Uploading dist/%(name)s to %(location)s' % locals()
+            for host, transfers in sessions:
+                for distfile, target in transfers:
+                    name = basename(distfile)
+                    location = '%s:%s' % (host, posixpath.dirname(target))
+                    print 'Uploading dist/%(name)s to %(location)s' % locals()
+            self.flush()
 
-        with tempfile.NamedTemporaryFile() as file:
-            file.write('put "%(distfile)s"\n' % locals())
-            file.write('bye\n')
-            file.flush()
-            cmdfile = file.name
+        options = ''
+        if len(sessions) > 1:
+            options = '-o BatchMode=yes '
 
+        files = []
+        try:
+            commands = []
+            for host, transfers in sessions:
+                file = tempfile.NamedTemporaryFile()
+                files.append(file)
+                puts = self._write_batch(file, host, transfers)
+                cmdfile = file.name
+                timer = TransferTimer()
+                echo2 = Not(StartsWith("Couldn't create directory"))
+                command = self.process.command(
+                    'sftp %(options)s-b "%(cmdfile)s" "%(host)s"' % locals(),
+                    echo=timer, echo2=echo2)
+                commands.append((command, timer, puts))
             try:
-                rc, lines = self.process.popen(
-                    'sftp -b "%(cmdfile)s" "%(location)s"' % locals(),
-                    echo=False)
-                if rc == 0:
-                    if not self.process.quiet:
-                        print 'OK'
-                    return rc
+                results = self.process.run([x[0] for x in commands])
             except KeyboardInterrupt:
-                pass
+                err_exit('ERROR: sftp failed')
+        finally:
+            for file in files:
+                file.close()
+
+        failed = False
+        for (command, timer, puts), (rc, lines) in zip(commands, results):
+            if rc != 0:
+                failed = True
+            elif report:
+                for put, distfile, location in puts:
+                    name = basename(distfile)
+                    rate = format_rate(getsize(distfile), timer.get_duration(put))
+                    print 'Uploaded dist/%(name)s to %(location)s (%(rate)s)' % locals()
+        if failed:
             err_exit('ERROR: sftp failed')
+        if report:
+            print 'OK'
+        return 0
+
+    def _write_batch(self, file, host, transfers):
+        """Write the sftp batch file uploading 'transfers' to 'host'.
+
+        Returns a list of (put, localfile, location) tuples.
+        """
+        puts = []
+        dirs = set()
+        for distfile, target in transfers:
+            for dir in self._get_parents(posixpath.dirname(target)):
+                if dir not in dirs:
+                    file.write('-mkdir "%(dir)s"\n' % locals())
+                    dirs.add(dir)
+            dir, name = posixpath.split(target)
+            tempname = posixpath.join(dir, '.%(name)s.part' % locals())
+            put = 'put "%(distfile)s" "%(tempname)s"' % locals()
+            file.write(put + '\n')
+            file.write('rename "%(tempname)s" "%(target)s"\n' % locals())
+            puts.append((put, distfile, '%(host)s:%(dir)s' % locals()))
+        file.write('bye\n')
+        file.flush()
+        return puts
+
+    def get_remote_digests(self, distfile, location):
+        """Return size and sha256 digest of the copy of 'distfile' at 'location'.
+
+        The digest is only computed if the sizes match. Returns an
+        empty dict if the file does not exist and None if the remote
+        host could not be queried.
+        """
+        host, path = self.split_location(location)
+        target = posixpath.join(path, basename(distfile))
+        size = getsize(distfile)
+        script = ('if test -f "%(target)s"; then '
+                  's=`wc -c < "%(target)s"`; echo $s; '
+                  'if test $s -eq %(size)d; then '
+                  '(sha256sum "%(target)s" || shasum -a 256 "%(target)s") 2>/dev/null; '
+                  'fi; fi' % locals())
+        rc, lines = self.process.popen(
+            "ssh -o BatchMode=yes \"%(host)s\" '%(script)s'" % locals(),
+            echo=False, echo2=False)
+        if rc != 0:
+            return None
+        digests = {}
+        if lines:
+            try:
+                digests['size'] = int(lines[0].strip())
+            except ValueError:
+                return None
+        if len(lines) > 1 and lines[1].split():
+            digests['sha256'] = lines[1].split()[0]
+        return digests
+
+    def list_files(self, location, patterns, missing_ok=False):
+        """Return a dict mapping filenames at 'location' to digest dicts.
+
+        Only files matching one of the shell 'patterns' are listed.
+        Fails if the remote host cannot be queried. A missing directory
+        fails too, unless 'missing_ok' is true.
+        """
+        host, path = self.split_location(location)
+        globs = ' '.join(patterns)
+        missing = missing_ok and 'exit 0' or 'exit 1'
+        script = ('cd "%(path)s" 2>/dev/null || %(missing)s; '
+                  'for f in %(globs)s; do test -f "$f" || continue; '
+                  's=`wc -c < "$f"`; '
+                  'd=`(sha256sum "$f" || shasum -a 256 "$f") 2>/dev/null`; '
+                  'echo $s $d; done' % locals())
+        rc, lines = self.process.popen(
+            "ssh -o BatchMode=yes \"%(host)s\" '%(script)s'" % locals(),
+            echo=False, echo2=False)
+        if rc != 0:
+            err_exit('ERROR: Failed to list %(location)s' % locals())
+        files = {}
+        for line in lines:
+            parts = line.split(None, 2)
+            if len(parts) == 3:
+                size, sha256, filename = parts
+                files[filename] = {'size': int(size), 'sha256': sha256}
+        return files
+
+    def run_fetch(self, location, filename, dir):
+        """Download 'filename' from 'location' into 'dir'.
+
+        Returns the name of the local copy.
+        """
+        host, path = self.split_location(location)
+        remotefile = posixpath.join(path, filename)
+        localfile = join(dir, filename)
+        rc, lines = self.process.popen(
+            'scp "%(host)s:%(remotefile)s" "%(localfile)s"' % locals(),
+            echo=False)
+        if rc != 0:
+            err_exit('ERROR: scp failed: %(host)s:%(remotefile)s' % locals())
+        return localfile
+
+    def update_simple_index(self, location, name, filename, sha256):
+        """Add 'filename' to the simple index at 'location'.
+
+        Only the affected project page and the root page are fetched,
+        updated, and uploaded again.
+        """
+        host, path = self.split_location(location)
+        tempdir = tempfile.mkdtemp(prefix='mkrelease-index-')
+        try:
+            index = SimpleIndex(tempdir)
+            for page in (index.get_project_path(name), index.get_root_path()):
+                self._fetch_page(host, posixpath.join(path, page), join(tempdir, page))
+            changed = index.add(name, filename, sha256)
+            if changed:
+                if not self.process.quiet:
+                    print 'Updating simple index at %(location)s' % locals()
+                transfers = [(join(tempdir, page), posixpath.join(path, page))
+                             for page in changed]
+                self.run_sftp_put(host, transfers, report=False)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def _fetch_page(self, host, remotepath, localpath):
+        rc, lines = self.process.popen(
+            "ssh -o BatchMode=yes \"%(host)s\" "
+            "'if test -f \"%(remotepath)s\"; then cat \"%(remotepath)s\"; fi'" % locals(),
+            echo=False)
+        if rc != 0:
+            err_exit('ERROR: Failed to read %(host)s:%(remotepath)s' % locals())
+        if lines:
+            if not isdir(dirname(localpath)):
+                os.makedirs(dirname(localpath))
+            with open(localpath, 'wt') as file:
+                file.write('\n'.join(lines) + '\n')
+
+    def _get_parents(self, path):
+        # Return path and its parents, outermost first
+        parents = []
+        path = path.rstrip('/')
+        while path and path not in ('.', '~'):
+            parents.insert(0, path)
+            path = posixpath.dirname(path)
+            if path == '/':
+                break
+        return parents
+
+
+class TransferTimer(object):
+    """A tee filter recording when sftp commands are echoed.
+
+    The duration of a command is the time until the next command is
+    echoed. Lines are never printed.
+    """
+
+    def __init__(self):
+        self.times = []
+
+    def __call__(self, line):
+        if line.startswith(SFTP_PROMPT):
+            self.times.append((line[len(SFTP_PROMPT):], time.time()))
+        return False
+
+    def get_duration(self, command):
+        for i, (cmd, started) in enumerate(self.times[:-1]):
+            if cmd == command:
+                return self.times[i+1][1] - started
+        return 0
+
 
+def format_rate(size, seconds):
+    """Return a human readable transfer rate.
+    """
+    if seconds <= 0:
+        return 'n/a'
+    rate = size / seconds
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if rate < 1024:
+            break
+        rate /= 1024.0
+    else:
+        unit = 'GB/s'
+    return '%.1f %s' % (rate, unit)
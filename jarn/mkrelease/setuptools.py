@@ -1,4 +1,5 @@
 import os
+import tempfile
 import distutils.command
 import pkg_resources
 
@@ -6,6 +7,7 @@ from os.path import abspath, join, isfile
 
 from python import Python
 from process import Process
+from env import get_setuptools_env
 from configparser import ConfigParser
 from chdir import chdir
 from exit import err_exit, warn
@@ -15,27 +17,20 @@ OK_RESPONSE = 'Server response (200): OK'
 
 
 class Setuptools(object):
-    """Interface to setuptools."""
+    """Interface to setuptools.
+
+    If the class attribute 'profiledir' is set, setup.py runs are
+    profiled and their pstats files written to that directory.
+    """
+
+    profiledir = None
 
     def __init__(self, process=None):
         self.process = process or Process(env=self.get_env())
         self.python = Python()
 
     def get_env(self):
-        # Make sure setuptools and its extensions are found if mkrelease
-        # has been installed with zc.buildout
-        path = []
-        for name in ('setuptools', 'setuptools-hg', 'setuptools-git',
-                     'setuptools-subversion'):
-            try:
-                dist = pkg_resources.get_distribution(name)
-            except pkg_resources.DistributionNotFound:
-                continue
-            path.append(dist.location)
-        env = os.environ.copy()
-        env['PYTHONPATH'] = ':'.join(path)
-        env['HG_SETUPTOOLS_FORCE_CMD'] = '1'
-        return env
+        return get_setuptools_env()
 
     def is_valid_package(self, dir):
         return isfile(join(dir, 'setup.py'))
@@ -44,19 +39,57 @@ class Setuptools(object):
         if not self.is_valid_package(dir):
             err_exit('No setup.py found in %(dir)s' % locals())
 
-    @chdir
     def get_package_info(self, dir, develop=False):
+        return self.start_package_info(dir, develop).result()
+
+    @chdir
+    def start_package_info(self, dir, develop=False):
+        """Start reading name and version of the package in 'dir'.
+
+        Returns a Future of the (name, version) tuple.
+        """
         python = self.python
-        rc, lines = self.process.popen(
-            '"%(python)s" setup.py --name --version' % locals(), echo=False)
-        if rc == 0 and len(lines) == 2:
-            name, version = lines
-            if develop:
-                parser = ConfigParser(warn)
-                parser.read('setup.cfg')
-                version += parser.get('egg_info', 'tag_build', '').strip()
-            return name, pkg_resources.safe_version(version)
-        err_exit('Bad setup.py')
+        setupcfg = abspath('setup.cfg')
+
+        def get_info((rc, lines)):
+            if rc == 0 and len(lines) == 2:
+                name, version = lines
+                if develop:
+                    parser = ConfigParser(warn)
+                    parser.read(setupcfg)
+                    version += parser.get('egg_info', 'tag_build', '').strip()
+                return name, pkg_resources.safe_version(version)
+            err_exit('Bad setup.py')
+        return self.process.start(
+            '"%(python)s" setup.py --name --version' % locals(), echo=False).then(get_info)
+
+    def get_requirements(self, dirs, jobs=None):
+        """Return the names and install_requires of the packages in 'dirs'.
+
+        setup.py is run in all directories concurrently. Returns a list
+        of (name, requirements) tuples, where requirements is a list of
+        project names.
+        """
+        python = self.python
+        script = GET_REQUIREMENTS
+        commands = []
+        for dir in dirs:
+            dir = abspath(dir)
+            commands.append(self.process.command(
+                'cd "%(dir)s" && "%(python)s" -c"%(script)s"' % locals(), echo=False))
+
+        results = []
+        for dir, (rc, lines) in zip(dirs, self.process.run(commands, jobs)):
+            name, requirements = '', []
+            for line in lines:
+                if line.startswith('name: '):
+                    name = line[6:]
+                elif line.startswith('requires: '):
+                    requirements.append(line[10:])
+            if rc != 0 or not name:
+                err_exit('Bad setup.py in %(dir)s' % locals())
+            results.append((name, requirements))
+        return results
 
     @chdir
     def run_egg_info(self, dir, infoflags, ff='', quiet=False):
@@ -166,9 +199,19 @@ class Setuptools(object):
         """
         python = self.python
 
+        profile = ''
+        if self.profiledir:
+            fd, profile = tempfile.mkstemp(dir=self.profiledir, suffix='.prof')
+            os.close(fd)
+
         if ff:
-            patch = WALK_REVCTRL % locals()
+            if profile:
+                patch = (WALK_REVCTRL + PROFILE_SETUP) % locals()
+            else:
+                patch = (WALK_REVCTRL + IMPORT_SETUP) % locals()
             setup_py = '-c"%(patch)s"' % locals()
+        elif profile:
+            setup_py = '-m cProfile -o "%s" setup.py %s' % (profile, ' '.join(args))
         else:
             setup_py = 'setup.py %s' % ' '.join(args)
 
@@ -253,6 +296,32 @@ import setuptools.command.egg_info
 setuptools.command.egg_info.walk_revctrl = walk_revctrl
 
 sys.argv = ['setup.py'] + %(args)r
+"""
+
+IMPORT_SETUP = """\
 import setup
 """
 
+GET_REQUIREMENTS = """\
+import sys
+import pkg_resources
+import setuptools
+import distutils.core
+
+def setup(**kw):
+    print 'name:', kw.get('name', '')
+    for req in pkg_resources.parse_requirements(kw.get('install_requires') or []):
+        print 'requires:', req.project_name
+    sys.exit(0)
+
+setuptools.setup = distutils.core.setup = setup
+sys.argv = ['setup.py']
+sys.dont_write_bytecode = True
+import setup
+"""
+
+PROFILE_SETUP = """\
+import cProfile
+cProfile.run('import setup', %(profile)r)
+"""
+
@@ -0,0 +1,116 @@
+import os
+import re
+import cgi
+import tempfile
+
+from os.path import join, isdir, isfile
+
+from index import normalize_name
+
+PROJECT_PAGE = """\
+<!DOCTYPE html>
+<html>
+  <head>
+    <title>Links for %(name)s</title>
+  </head>
+  <body>
+    <h1>Links for %(name)s</h1>
+%(links)s
+  </body>
+</html>
+"""
+
+ROOT_PAGE = """\
+<!DOCTYPE html>
+<html>
+  <head>
+    <title>Simple index</title>
+  </head>
+  <body>
+%(links)s
+  </body>
+</html>
+"""
+
+LINK = '    <a href="%s">%s</a><br/>'
+
+
+class SimpleIndex(object):
+    """Maintain a PEP 503 simple index below a distribution directory.
+
+    The index lives in the 'simple' subdirectory of 'dir' and links
+    to distribution files in 'dir' itself. Pages are updated
+    incrementally and written atomically.
+    """
+
+    link_re = re.compile(r'<a href="([^"]*)">([^<]*)</a>')
+
+    def __init__(self, dir):
+        self.dir = dir
+
+    def get_root_path(self):
+        return join('simple', 'index.html')
+
+    def get_project_path(self, name):
+        return join('simple', normalize_name(name), 'index.html')
+
+    def add(self, name, filename, sha256):
+        """Add 'filename' to the page of project 'name'.
+
+        Returns the list of pages (relative to 'dir') that have been
+        written.
+        """
+        changed = []
+
+        path = self.get_project_path(name)
+        links = self.read_links(path)
+        href = '../../%s#sha256=%s' % (filename, sha256)
+        if links.get(filename) != href:
+            links[filename] = href
+            self.write_page(path, PROJECT_PAGE, name, links)
+            changed.append(path)
+
+        path = self.get_root_path()
+        links = self.read_links(path)
+        href = '%s/' % normalize_name(name)
+        if href not in links.values():
+            links[name] = href
+            self.write_page(path, ROOT_PAGE, '', links)
+            changed.append(path)
+
+        return changed
+
+    def read_links(self, path):
+        """Return a dict mapping link texts to hrefs.
+        """
+        links = {}
+        filename = join(self.dir, path)
+        if isfile(filename):
+            with open(filename, 'rt') as file:
+                for href, text in self.link_re.findall(file.read()):
+                    links[unescape(text)] = unescape(href)
+        return links
+
+    def write_page(self, path, template, name, links):
+        lines = [LINK % (cgi.escape(links[text], True), cgi.escape(text))
+                 for text in sorted(links, key=str.lower)]
+        body = template % {'name': cgi.escape(name), 'links': '\n'.join(lines)}
+
+        filename = join(self.dir, path)
+        dirname = os.path.dirname(filename)
+        if not isdir(dirname):
+            os.makedirs(dirname)
+        fd, tempname = tempfile.mkstemp(dir=dirname, prefix='.index.')
+        try:
+            with os.fdopen(fd, 'wt') as file:
+                file.write(body)
+            os.chmod(tempname, 0644)
+            os.rename(tempname, filename)
+        except:
+            if isfile(tempname):
+                os.remove(tempname)
+            raise
+
+
+def unescape(s):
+    return s.replace('&quot;', '"').replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import errno
+import fcntl
+import tempfile
+
+from os.path import join, isdir, isfile, basename, dirname
+from contextlib import contextmanager
+
+from local import Local
+from digest import get_digests
+from index import normalize_name
+from exit import err_exit
+
+MEGABYTE = 1024 * 1024
+
+
+class Store(object):
+    """Content-addressed store of built distfiles.
+
+    Files are kept under their sha256 digest and indexed by project,
+    version, tag, and filename. When the store grows beyond 'maxsize'
+    bytes, the least recently used files are evicted.
+
+    Changes to the index are serialized by a lock file, so several
+    mkrelease processes may share the store.
+    """
+
+    def __init__(self, root, maxsize=1024*MEGABYTE, local=None):
+        self.root = root
+        self.maxsize = maxsize
+        self.local = local or Local(quiet=True)
+
+    def get_object_path(self, sha256):
+        return join(self.root, 'objects', sha256[:2], sha256)
+
+    def get_index_path(self):
+        return join(self.root, 'index.json')
+
+    def get_lock_path(self):
+        return join(self.root, 'index.lock')
+
+    @contextmanager
+    def lock(self):
+        """Hold an exclusive lock on the store.
+        """
+        if not isdir(self.root):
+            os.makedirs(self.root)
+        with open(self.get_lock_path(), 'a') as file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def read_index(self):
+        """Return the list of index entries.
+        """
+        filename = self.get_index_path()
+        if not isfile(filename):
+            return []
+        try:
+            with open(filename, 'rt') as file:
+                return json.load(file)
+        except (IOError, ValueError), e:
+            err_exit('ERROR: Failed to read %(filename)s: %(e)s' % locals())
+
+    def write_index(self, entries):
+        filename = self.get_index_path()
+        fd, tempname = tempfile.mkstemp(dir=self.root, prefix='.index.')
+        with os.fdopen(fd, 'wt') as file:
+            json.dump(entries, file, indent=1, sort_keys=True)
+        os.rename(tempname, filename)
+
+    def put_object(self, filename, sha256):
+        """Copy 'filename' into the store unless it is already there.
+        """
+        path = self.get_object_path(sha256)
+        if not isfile(path):
+            if not isdir(dirname(path)):
+                os.makedirs(dirname(path))
+            tempname = path + '.part'
+            self.local.copy(filename, tempname)
+            self.local.sync_file(tempname)
+            os.rename(tempname, path)
+        return path
+
+    def add(self, distfile, name, version, tag='', pkginfo=None,
+            filetype='sdist', pyversion='', digests=None):
+        """Add 'distfile' to the store.
+
+        The 'pkginfo' argument is the name of the package's PKG-INFO
+        file, which is needed to upload to index servers. Returns
+        the new index entry.
+        """
+        if digests is None:
+            digests = get_digests(distfile)
+        try:
+            with self.lock():
+                entry = self.add_entry(distfile, name, version, tag, pkginfo,
+                                       filetype, pyversion, digests)
+        except (IOError, OSError), e:
+            err_exit('ERROR: Failed to store %s: %s' % (basename(distfile), e))
+        return entry
+
+    def add_entry(self, distfile, name, version, tag, pkginfo, filetype,
+                  pyversion, digests):
+        """Add 'distfile' to the store. The caller must hold the lock.
+        """
+        self.put_object(distfile, digests['sha256'])
+        entry = {
+            'name': normalize_name(name),
+            'version': version,
+            'tag': tag,
+            'filename': basename(distfile),
+            'filetype': filetype,
+            'pyversion': pyversion,
+            'size': digests['size'],
+            'sha256': digests['sha256'],
+            'pkginfo': None,
+            'used': time.time(),
+        }
+        if pkginfo is not None:
+            entry['pkginfo'] = get_digests(pkginfo)['sha256']
+            self.put_object(pkginfo, entry['pkginfo'])
+
+        entries = [x for x in self.read_index()
+                   if (x['name'], x['version'], x['filename']) !=
+                      (entry['name'], entry['version'], entry['filename'])]
+        entries.append(entry)
+        self.write_index(self.evict(entries, keep=entry))
+        return entry
+
+    def find(self, name, version):
+        """Return index entries of project 'name' at 'version'.
+        """
+        name = normalize_name(name)
+        return [x for x in self.read_index()
+                if x['name'] == name and x['version'] == version]
+
+    def get_files(self, entry, dir):
+        """Link the distfile and PKG-INFO of 'entry' into 'dir'.
+
+        Returns a (distfile, pkginfo) tuple; pkginfo is None if the
+        entry has none.
+        """
+        if not isdir(dir):
+            os.makedirs(dir)
+        distfile = join(dir, entry['filename'])
+        self.local.copy(self.get_object_path(entry['sha256']), distfile, link=True)
+        pkginfo = None
+        if entry['pkginfo']:
+            pkginfo = join(dir, 'PKG-INFO')
+            self.local.copy(self.get_object_path(entry['pkginfo']), pkginfo, link=True)
+        self.touch(entry)
+        return distfile, pkginfo
+
+    def touch(self, entry):
+        with self.lock():
+            entries = self.read_index()
+            for x in entries:
+                if x['sha256'] == entry['sha256']:
+                    x['used'] = time.time()
+            self.write_index(entries)
+
+    def evict(self, entries, keep=None):
+        """Remove least recently used entries until the store fits.
+
+        Returns the remaining entries. The 'keep' entry is never
+        evicted.
+        """
+        def total(entries):
+            return sum(x['size'] for x in dict((x['sha256'], x) for x in entries).values())
+
+        entries = sorted(entries, key=lambda x: x['used'])
+        while entries and total(entries) > self.maxsize:
+            victims = [x for x in entries if x is not keep]
+            if not victims:
+                break
+            victim = victims[0]
+            entries.remove(victim)
+            referenced = set()
+            for x in entries:
+                referenced.update((x['sha256'], x['pkginfo']))
+            for sha256 in (victim['sha256'], victim['pkginfo']):
+                if sha256 and sha256 not in referenced:
+                    try:
+                        os.remove(self.get_object_path(sha256))
+                    except OSError, e:
+                        if e.errno != errno.ENOENT:
+                            raise
+        return entries
@@ -0,0 +1,164 @@
+import os
+import sys
+import errno
+import Queue
+import threading
+import posixpath
+
+from os.path import basename, join, isdir, isfile
+
+from process import Process
+from scp import SCP
+from upload import Uploader
+from urlparser import URLParser
+from exit import err_exit
+
+BLOCKSIZE = 1024 * 1024
+MAXBLOCKS = 8
+
+
+class Fanout(object):
+    """Read a file once and feed its blocks to several sinks.
+
+    Every sink runs in its own thread and receives an iterator over
+    the file's blocks. Each sink has a queue of at most 'maxblocks'
+    blocks; when it is full, reading stops until the sink catches up.
+    """
+
+    def __init__(self, blocksize=BLOCKSIZE, maxblocks=MAXBLOCKS):
+        self.blocksize = blocksize
+        self.maxblocks = maxblocks
+
+    def run(self, filename, sinks):
+        """Stream 'filename' to all 'sinks'.
+
+        A sink is a callable taking an iterator of blocks. If sinks
+        raise exceptions (including SystemExit), the one belonging to
+        the first sink is re-raised after all sinks have finished.
+        """
+        queues = [Queue.Queue(self.maxblocks) for sink in sinks]
+        errors = []
+        lock = threading.Lock()
+
+        def worker(i, sink, queue):
+            blocks = iter(queue.get, None)
+            try:
+                sink(blocks)
+            except BaseException:
+                with lock:
+                    errors.append((i, sys.exc_info()))
+            # Keep draining so the reader never blocks on a dead sink
+            for block in blocks:
+                pass
+
+        threads = [threading.Thread(target=worker, args=(i, sink, queue))
+                   for i, (sink, queue) in enumerate(zip(sinks, queues))]
+        for thread in threads:
+            thread.start()
+        try:
+            with open(filename, 'rb') as file:
+                while True:
+                    block = file.read(self.blocksize)
+                    if not block:
+                        break
+                    for queue in queues:
+                        queue.put(block)
+        finally:
+            for queue in queues:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            i, exc_info = min(errors)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return 0
+
+
+class LocalSink(object):
+    """Write the stream to a local directory."""
+
+    def __init__(self, distfile, dir, quiet=False):
+        self.distfile = distfile
+        self.dir = dir
+        self.quiet = quiet
+
+    def __call__(self, blocks):
+        name = basename(self.distfile)
+        dir = self.dir
+        tempname = join(dir, '.%(name)s.part' % locals())
+        try:
+            if not isdir(dir):
+                try:
+                    os.makedirs(dir)
+                except OSError, e:
+                    if e.errno != errno.EEXIST:
+                        raise
+            with open(tempname, 'wb') as file:
+                for block in blocks:
+                    file.write(block)
+                file.flush()
+                os.fsync(file.fileno())
+            os.rename(tempname, join(dir, name))
+        except (IOError, OSError), e:
+            if isfile(tempname):
+                os.remove(tempname)
+            err_exit('ERROR: copy failed: %s' % e)
+        if not self.quiet:
+            print 'Streamed dist/%(name)s to %(dir)s' % locals()
+
+
+class SSHSink(object):
+    """Pipe the stream into 'cat' on a remote host.
+
+    Hosts without a shell, like chrooted sftp-only accounts, cannot
+    run 'cat'. If the command fails, the file is uploaded with sftp.
+    """
+
+    def __init__(self, distfile, location, quiet=False, process=None):
+        self.distfile = distfile
+        self.location = location
+        self.quiet = quiet
+        self.process = process or Process(quiet=quiet)
+
+    def get_command(self):
+        match = URLParser.ssh_re.match(self.location)
+        if match is None:
+            location = self.location
+            err_exit('Bad ssh location: %(location)s' % locals())
+        host, dir = match.group(1), match.group(2)
+        name = basename(self.distfile)
+        tempname = posixpath.join(dir, '.%(name)s.part' % locals())
+        target = posixpath.join(dir, name)
+        script = ('mkdir -p "%(dir)s" && cat > "%(tempname)s" && '
+                  'mv -f "%(tempname)s" "%(target)s"' % locals())
+        return "ssh -o BatchMode=yes \"%(host)s\" '%(script)s'" % locals()
+
+    def __call__(self, blocks):
+        name = basename(self.distfile)
+        location = self.location
+        if self.process.feed(self.get_command(), blocks) != 0:
+            # Do not hold up the other sinks while sftp runs
+            for block in blocks:
+                pass
+            if not self.quiet:
+                print 'Streaming to %(location)s failed, uploading with sftp' % locals()
+            SCP(self.process).run_sftp(self.distfile, location)
+        elif not self.quiet:
+            print 'Streamed dist/%(name)s to %(location)s' % locals()
+
+
+class UploadSink(object):
+    """Send the stream as the body of an index server upload.
+
+    Sinks run concurrently, so each gets its own connection pool.
+    """
+
+    def __init__(self, uploader, server, pkginfo, distfile, filetype, pyversion,
+                 digests=None, signature=None, quiet=False):
+        self.uploader = Uploader(quiet=uploader.quiet)
+        self.args = (server, pkginfo, distfile, filetype, pyversion)
+        self.kw = dict(digests=digests, signature=signature, quiet=quiet)
+
+    def __call__(self, blocks):
+        self.uploader.run_upload(*self.args, stream=blocks, **self.kw)
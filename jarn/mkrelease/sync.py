@@ -0,0 +1,189 @@
+import os
+import re
+import shutil
+import tarfile
+import zipfile
+import tempfile
+
+from os.path import join
+
+from scp import SCP
+from local import Local
+from index import Index
+from upload import Uploader
+from process import Process
+from pool import parallel_map
+from digest import get_digests, compare_digests, CONFLICT
+from exit import err_exit, warn
+
+DIST_PATTERNS = ('*.zip', '*.tar.gz', '*.tgz', '*.tar.bz2', '*.egg', '*.whl')
+
+
+def get_filetype(filename):
+    """Return filetype and pyversion of a dist file, based on its name.
+    """
+    if filename.endswith('.egg'):
+        match = re.search(r'-py(\d+\.\d+)', filename)
+        return 'bdist_egg', match and match.group(1) or ''
+    if filename.endswith('.whl'):
+        return 'bdist_wheel', filename[:-4].split('-')[-3]
+    return 'sdist', ''
+
+
+def extract_pkg_info(filename, dir):
+    """Extract the PKG-INFO file of the dist file 'filename' into 'dir'.
+
+    Returns the name of the extracted file, or None if the archive
+    has no PKG-INFO.
+    """
+    if zipfile.is_zipfile(filename):
+        archive = zipfile.ZipFile(filename)
+        names = archive.namelist()
+        read = archive.read
+    elif tarfile.is_tarfile(filename):
+        archive = tarfile.open(filename)
+        names = archive.getnames()
+        read = lambda name: archive.extractfile(name).read()
+    else:
+        return None
+
+    try:
+        # Prefer the top-most PKG-INFO (sdists have another in egg-info)
+        candidates = [x for x in names
+                      if x.endswith('PKG-INFO') or x.endswith('.dist-info/METADATA')]
+        if not candidates:
+            return None
+        candidates.sort(key=lambda x: x.count('/'))
+        pkginfo = join(dir, 'PKG-INFO')
+        with open(pkginfo, 'wb') as file:
+            file.write(read(candidates[0]))
+        return pkginfo
+    finally:
+        archive.close()
+
+
+class Sync(object):
+    """Mirror dist files from one dist-location to others.
+
+    Files missing at the destination are transferred by a pool of
+    'workers' threads and verified by digest on the way.
+    """
+
+    def __init__(self, locations, urlparser, workers=4):
+        self.locations = locations
+        self.urlparser = urlparser
+        self.workers = workers
+        self.scp = SCP(Process(quiet=True))
+        self.local = Local(quiet=True)
+        self.index = Index()
+
+    def list_files(self, location, missing_ok=False):
+        """Return a dict mapping filenames at 'location' to digest dicts.
+
+        A missing directory is empty if 'missing_ok' is true, and an
+        error otherwise.
+        """
+        if self.locations.is_server(location):
+            repository = self.locations.servers[location].repository
+            return self.index.list_files(repository)
+        if self.locations.is_local(location):
+            return self.local.list_files(
+                self.locations.get_local_path(location), DIST_PATTERNS, missing_ok)
+        return self.scp.list_files(
+            self.urlparser.to_ssh_url(location), DIST_PATTERNS, missing_ok)
+
+    def get_missing(self, source, dest, sourcefiles, destfiles):
+        """Return the sorted filenames missing at 'dest'.
+
+        Files present in both places are compared by digest; different
+        files are reported and left alone.
+        """
+        missing = []
+        for filename in sorted(sourcefiles):
+            if filename not in destfiles:
+                missing.append(filename)
+                continue
+            remote = destfiles[filename]
+            if self.locations.is_local(dest):
+                remote = get_digests(join(self.locations.get_local_path(dest), filename))
+            local = sourcefiles[filename]
+            if self.locations.is_local(source):
+                local = get_digests(join(self.locations.get_local_path(source), filename))
+            local = dict((k, v) for k, v in local.items() if k != 'url')
+            if compare_digests(local, remote) == CONFLICT:
+                warn('%(filename)s differs between %(source)s and %(dest)s' % locals())
+        return missing
+
+    def fetch(self, location, filename, info, dir):
+        """Make 'filename' from 'location' available in 'dir'.
+
+        Returns the name of the local file.
+        """
+        if self.locations.is_local(location):
+            return join(self.locations.get_local_path(location), filename)
+        path = join(dir, filename)
+        if self.locations.is_server(location):
+            self.index.download(info['url'], path)
+            return path
+        return self.scp.run_fetch(self.urlparser.to_ssh_url(location), filename, dir)
+
+    def put(self, location, distfile, dir):
+        """Upload 'distfile' to 'location'.
+        """
+        if self.locations.is_server(location):
+            pkginfo = extract_pkg_info(distfile, dir)
+            if pkginfo is None:
+                err_exit('ERROR: No PKG-INFO in %s' % os.path.basename(distfile))
+            filetype, pyversion = get_filetype(os.path.basename(distfile))
+            server = self.locations.servers[location]
+            # Connections are not shared between threads
+            uploader = Uploader(quiet=True)
+            uploader.run_register(server, pkginfo, True)
+            uploader.run_upload(server, pkginfo, distfile, filetype, pyversion, quiet=True)
+        elif self.locations.is_local(location):
+            self.local.run_copy([distfile], [self.locations.get_local_path(location)])
+        elif self.urlparser.get_scheme(location) == 'sftp':
+            self.scp.run_sftp(distfile, self.urlparser.to_ssh_url(location))
+        else:
+            self.scp.run_scp(distfile, self.urlparser.to_ssh_url(location))
+
+    def transfer(self, source, dest, filename, info, tempdir):
+        """Copy one file from 'source' to 'dest' and verify its digests.
+        """
+        dir = tempfile.mkdtemp(dir=tempdir)
+        try:
+            distfile = self.fetch(source, filename, info, dir)
+            digests = get_digests(distfile)
+            expected = dict((k, v) for k, v in info.items() if k != 'url')
+            if compare_digests(digests, expected) == CONFLICT:
+                err_exit('ERROR: Digest mismatch: %(filename)s from %(source)s' % locals())
+            self.put(dest, distfile, dir)
+            print 'Synced %(filename)s to %(dest)s' % locals()
+        finally:
+            shutil.rmtree(dir)
+
+    def run(self, source, dests):
+        """Copy all dist files missing at 'dests' from 'source'.
+
+        Returns the number of files transferred.
+        """
+        # Destinations are created as needed, the source must exist
+        sourcefiles = self.list_files(source)
+        listings = parallel_map(
+            lambda dest: self.list_files(dest, missing_ok=True), dests, self.workers)
+
+        jobs = []
+        for dest, destfiles in zip(dests, listings):
+            missing = self.get_missing(source, dest, sourcefiles, destfiles)
+            print '%d of %d files missing at %s' % (len(missing), len(sourcefiles), dest)
+            jobs.extend((dest, filename) for filename in missing)
+
+        tempdir = tempfile.mkdtemp(prefix='mkrelease-sync-')
+        try:
+            parallel_map(
+                lambda (dest, filename): self.transfer(
+                    source, dest, filename, sourcefiles[filename], tempdir),
+                jobs, self.workers)
+        finally:
+            shutil.rmtree(tempdir)
+        return len(jobs)
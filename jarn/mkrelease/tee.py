@@ -1,68 +1,174 @@
+import os
 import sys
+import errno
+import select
 import threading
 
 from subprocess import Popen, PIPE
 
+BUFSIZE = 65536
+
 __all__ = ['popen', 'On', 'Off', 'NotEmpty', 'Equals',
            'StartsWith', 'EndsWith', 'Before', 'NotAfter',
            'After', 'NotBefore', 'Not', 'And', 'Or']
 
 
-def tee(process, filter):
-    """Read lines from process.stdout and echo them to sys.stdout.
-
-    Returns a list of lines read. Lines are not newline terminated.
+class Command(object):
+    """A command read by run().
 
-    The 'filter' is a callable which is invoked for every line,
-    receiving the line as argument. If the filter returns True, the
-    line is echoed to sys.stdout.
+    The 'echo' and 'echo2' arguments are tee filters or booleans as
+    accepted by popen. Once the command has finished, 'returncode'
+    holds its exit code and 'lines' the lines read from stdout. Lines
+    are not newline terminated.
     """
-    # We simply use readline here, more fancy IPC is not warranted
-    # in the context of this package.
-    lines = []
-    while True:
-        line = process.stdout.readline()
-        if line:
-            stripped_line = line.rstrip()
-            if filter(stripped_line):
+
+    def __init__(self, cmd, echo=True, echo2=True, env=None):
+        if not callable(echo):
+            echo = On() if echo else Off()
+
+        if not callable(echo2):
+            echo2 = On() if echo2 else Off()
+
+        self.cmd = cmd
+        self.echo = echo
+        self.echo2 = echo2
+        self.env = env
+        # Queued commands must not depend on the cwd at start time
+        self.cwd = os.getcwd()
+        self.process = None
+        self.returncode = None
+        self.lines = []
+        self.buffers = {}
+
+    def start(self):
+        """Start the command.
+        """
+        self.process = Popen(
+            self.cmd,
+            shell=True,
+            stdout=PIPE,
+            stderr=PIPE,
+            cwd=self.cwd,
+            env=self.env
+        )
+        self.buffers = {
+            self.process.stdout.fileno(): '',
+            self.process.stderr.fileno(): '',
+        }
+
+    def read(self, fd):
+        """Read from pipe 'fd' and echo complete lines.
+
+        Returns False when the pipe has been closed.
+        """
+        data = os.read(fd, BUFSIZE)
+        if data:
+            lines = (self.buffers[fd] + data).split('\n')
+            self.buffers[fd] = lines.pop()
+            for line in lines:
+                self.tee(fd, line + '\n')
+            return True
+        if self.buffers[fd]:
+            self.tee(fd, self.buffers[fd])
+        del self.buffers[fd]
+        return False
+
+    def tee(self, fd, line):
+        """Pass 'line' through the filter of pipe 'fd'.
+        """
+        stripped_line = line.rstrip()
+        if fd == self.process.stdout.fileno():
+            if self.echo(stripped_line):
                 sys.stdout.write(line)
-            lines.append(stripped_line)
-        elif process.poll() is not None:
-            break
-    return lines
+            self.lines.append(stripped_line)
+        elif self.echo2(stripped_line):
+            sys.stderr.write(line)
 
+    def finish(self):
+        """Wait for the command to exit once its pipes are closed.
+        """
+        self.returncode = self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
 
-def tee2(process, filter):
-    """Read lines from process.stderr and echo them to sys.stderr.
 
-    The 'filter' is a callable which is invoked for every line,
-    receiving the line as argument. If the filter returns True, the
-    line is echoed to sys.stderr.
-    """
-    while True:
-        line = process.stderr.readline()
-        if line:
-            stripped_line = line.rstrip()
-            if filter(stripped_line):
-                sys.stderr.write(line)
-        elif process.poll() is not None:
-            break
+class Loop(object):
+    """Read the output of running commands with select.
 
+    Commands are started with start() and read by wait(), which reads
+    all running commands until the ones asked for have finished. The
+    'jobs' argument limits the number of commands running at the same
+    time; further commands are queued.
+    """
 
-class background_thread(object):
-    """Context manager to start and stop a background thread."""
+    def __init__(self, jobs=None):
+        self.jobs = jobs
+        self.pending = []
+        self.running = set()
+        self.fds = {}
+
+    def start(self, command):
+        """Start 'command', or queue it if 'jobs' commands are running.
+        """
+        self.pending.append(command)
+        self.fill()
+
+    def fill(self):
+        while self.pending and (self.jobs is None or len(self.running) < self.jobs):
+            command = self.pending.pop(0)
+            command.start()
+            self.running.add(command)
+            for fd in command.buffers:
+                self.fds[fd] = command
+
+    def wait(self, commands):
+        """Read running commands until all of 'commands' have finished.
+        """
+        while [x for x in commands if x.returncode is None]:
+            self.step()
+
+    def step(self):
+        """Read from all commands that have output, and start queued ones.
+        """
+        try:
+            ready = select.select(list(self.fds), [], [])[0]
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+        for fd in ready:
+            command = self.fds[fd]
+            if not command.read(fd):
+                del self.fds[fd]
+                if not command.buffers:
+                    command.finish()
+                    self.running.remove(command)
+        self.fill()
+
+
+_local = threading.local()
+
+
+def get_loop():
+    """Return the Loop of the calling thread.
+    """
+    loop = getattr(_local, 'loop', None)
+    if loop is None:
+        loop = _local.loop = Loop()
+    return loop
 
-    def __init__(self, target, args):
-        self.target = target
-        self.args = args
 
-    def __enter__(self):
-        self._t = threading.Thread(target=self.target, args=self.args)
-        self._t.start()
-        return self._t
+def run(commands, jobs=None):
+    """Run 'commands' and wait until all have finished.
 
-    def __exit__(self, *ignored):
-        self._t.join()
+    All commands are read by the calling thread, using select. The
+    'jobs' argument limits the number of commands running at the
+    same time; the default is to start all at once.
+    """
+    loop = Loop(jobs)
+    for command in commands:
+        loop.start(command)
+    loop.wait(commands)
 
 
 def popen(cmd, echo=True, echo2=True, env=None):
@@ -76,24 +182,9 @@ def popen(cmd, echo=True, echo2=True, env=None):
 
     The 'env' argument allows to pass a dict replacing os.environ.
     """
-    if not callable(echo):
-        echo = On() if echo else Off()
-
-    if not callable(echo2):
-        echo2 = On() if echo2 else Off()
-
-    process = Popen(
-        cmd,
-        shell=True,
-        stdout=PIPE,
-        stderr=PIPE,
-        env=env
-    )
-
-    with background_thread(tee2, (process, echo2)):
-        lines = tee(process, echo)
-
-    return process.returncode, lines
+    command = Command(cmd, echo, echo2, env)
+    run([command])
+    return command.returncode, command.lines
 
 
 class On(object):
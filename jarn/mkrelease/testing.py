@@ -1,30 +1,44 @@
 import sys
 import os
+import cgi
+import time
+import hashlib
 import unittest
 import tempfile
+import threading
 import shutil
 import zipfile
 import StringIO
 
 from os.path import realpath, join, dirname, isdir
 from lazy import lazy
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
 
-from jarn.mkrelease.process import Process
+from jarn.mkrelease.process import Process, Future
 from jarn.mkrelease.chdir import ChdirStack, chdir
 from jarn.mkrelease.scm import SCMFactory
+from jarn.mkrelease.index import normalize_name
 
 
 class JailSetup(unittest.TestCase):
-    """Manage a temporary working directory."""
+    """Manage a temporary working directory.
+
+    MKRELEASE_HOME points to the directory too, so the config cache,
+    store, and history stay in the jail.
+    """
 
     dirstack = None
     tempdir = None
+    environ = None
 
     def setUp(self):
         self.dirstack = ChdirStack()
+        self.environ = {}
         try:
             self.tempdir = realpath(self.mkdtemp())
             self.dirstack.push(self.tempdir)
+            self.setenv('MKRELEASE_HOME', self.tempdir)
         except:
             self.cleanUp()
             raise
@@ -33,6 +47,12 @@ class JailSetup(unittest.TestCase):
         self.cleanUp()
 
     def cleanUp(self):
+        if self.environ is not None:
+            for name, value in self.environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
         if self.dirstack is not None:
             while self.dirstack:
                 self.dirstack.pop()
@@ -43,6 +63,21 @@ class JailSetup(unittest.TestCase):
     def mkdtemp(self):
         return tempfile.mkdtemp()
 
+    def setenv(self, name, value):
+        # Restored by cleanUp
+        if name not in self.environ:
+            self.environ[name] = os.environ.get(name)
+        os.environ[name] = value
+
+    def jail_home(self):
+        """Point HOME at the jail, to read .pypirc and .mkrelease from there.
+
+        The jail gets a .gitconfig and .hgrc with a committer identity.
+        """
+        self.mkfile('.gitconfig', '[user]\nname = Jarn Tester\nemail = tester@jarn.com\n')
+        self.mkfile('.hgrc', '[ui]\nusername = Jarn Tester <tester@jarn.com>\n')
+        self.setenv('HOME', self.tempdir)
+
     def mkfile(self, name, body=''):
         with open(name, 'wt') as file:
             file.write(body)
@@ -293,6 +328,16 @@ class MockProcess(Process):
                 raise MockProcessError('Unhandled command: %s' % cmd)
         return self.rc, self.lines
 
+    def run(self, commands, jobs=None):
+        return [self.popen(command.cmd) for command in commands]
+
+    def start(self, cmd, echo=True, echo2=True):
+        return Future.resolved(self.popen(cmd, echo, echo2))
+
+    def feed(self, cmd, blocks):
+        self.fed = ''.join(blocks)
+        return self.os_system(cmd)
+
     def os_system(self, cmd):
         if self.func is not None:
             rc_lines = self.func(cmd)
@@ -303,6 +348,141 @@ class MockProcess(Process):
         return self.rc
 
 
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    """Handle register, upload, and simple API requests."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server.index
+        length = int(self.headers.get('Content-Length', 0))
+        body = server.receive(self.rfile, length)
+        form = cgi.FieldStorage(fp=StringIO.StringIO(body), headers=self.headers,
+            environ={'REQUEST_METHOD': 'POST'})
+        server.requests.append((self.client_address, self.headers, form))
+        status = server.get_status()
+        if status:
+            if status == 200:
+                server.store(form)
+            self.respond(status)
+        else:
+            self.close_connection = 1
+
+    def do_GET(self):
+        server = self.server.index
+        parts = self.path.strip('/').split('/')
+        status = server.get_status()
+        if not status:
+            self.close_connection = 1
+        elif status != 200:
+            self.respond(status)
+        elif parts == ['simple']:
+            links = ['<a href="%s/">%s</a><br/>' % (name, name)
+                     for name in sorted(server.files)]
+            self.respond(200, '<html><body>\n%s\n</body></html>\n' % '\n'.join(links))
+        elif len(parts) == 2 and parts[0] == 'simple' and parts[1] in server.files:
+            links = ['<a href="../../packages/%s#sha256=%s">%s</a><br/>' %
+                     (filename, hashlib.sha256(content).hexdigest(), filename)
+                     for filename, content in sorted(server.files[parts[1]].items())]
+            self.respond(200, '<html><body>\n%s\n</body></html>\n' % '\n'.join(links))
+        elif len(parts) == 2 and parts[0] == 'packages':
+            for files in server.files.values():
+                if parts[1] in files:
+                    self.respond(200, files[parts[1]])
+                    break
+            else:
+                self.respond(404)
+        else:
+            self.respond(404)
+
+    def respond(self, status, body=''):
+        time.sleep(self.server.index.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """Serve each connection in a thread, like a real index server."""
+
+    daemon_threads = True
+
+
+class IndexServer(object):
+    """A PyPI stand-in running in a background thread.
+
+    Supports register, upload, and the simple API. The 'latency'
+    argument delays every response by as many seconds, 'bandwidth'
+    limits the rate at which request bodies are read (in bytes per
+    second), and 'failures' is a list of status codes returned for
+    the first requests; a status of 0 drops the connection.
+    """
+
+    def __init__(self, latency=0, bandwidth=0, failures=()):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failures = list(failures)
+        self.requests = []
+        self.files = {}
+        self.received = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), IndexRequestHandler)
+        self.httpd.index = self
+        self.url = 'http://127.0.0.1:%d/pypi' % self.httpd.server_port
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_status(self):
+        with self.lock:
+            if self.failures:
+                return self.failures.pop(0)
+        return 200
+
+    def receive(self, rfile, length):
+        # Read the request body, honoring the bandwidth limit
+        blocksize = 64 * 1024
+        data = []
+        received = 0
+        started = time.time()
+        while received < length:
+            block = rfile.read(min(blocksize, length - received))
+            if not block:
+                break
+            data.append(block)
+            received += len(block)
+            if self.bandwidth:
+                delay = started + float(received) / self.bandwidth - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        with self.lock:
+            self.received += received
+        return ''.join(data)
+
+    def store(self, form):
+        if form.getvalue(':action') == 'file_upload':
+            name = normalize_name(form.getvalue('name'))
+            content = form['content']
+            with self.lock:
+                self.files.setdefault(name, {})[content.filename] = content.value
+
+    def get_pypirc(self, name, username='fred', password='secret'):
+        """Return a ~/.pypirc section for this server.
+        """
+        url = self.url
+        return ('[%(name)s]\nrepository = %(url)s\n'
+                'username = %(username)s\npassword = %(password)s\n' % locals())
+
+
 def quiet(func):
     """Decorator swallowing stdout and stderr output.
     """
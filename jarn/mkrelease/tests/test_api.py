@@ -0,0 +1,136 @@
+import unittest
+import os
+import sys
+import StringIO
+import threading
+
+from jarn.mkrelease.api import release, ReleaseResult
+from jarn.mkrelease.api import ReleaseError, UsageError, SCMError, BuildError
+from jarn.mkrelease.exit import ErrorExit, err_exit, warn, silent
+from jarn.mkrelease.testing import GitSetup
+from jarn.mkrelease.testing import quiet
+
+OPTIONS = ['-CTqe', '--git']
+
+
+class ErrorExitTests(unittest.TestCase):
+
+    @quiet
+    def testErrorExit(self):
+        try:
+            err_exit('Failed', 2)
+        except ErrorExit, e:
+            self.assertEqual(e.msg, 'Failed')
+            self.assertEqual(e.code, 2)
+        else:
+            self.fail('ErrorExit not raised')
+
+    def testSilent(self):
+        saved = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            with silent():
+                self.assertRaises(ErrorExit, err_exit, 'Failed')
+            self.assertEqual(sys.stderr.getvalue(), '')
+        finally:
+            sys.stderr = saved
+
+    def testSilentWorkerThread(self):
+        def worker():
+            warn('Careful')
+            try:
+                err_exit('Failed')
+            except ErrorExit:
+                pass
+        saved = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            with silent():
+                thread = threading.Thread(target=worker)
+                thread.start()
+                thread.join()
+            self.assertEqual(sys.stderr.getvalue(), '')
+        finally:
+            sys.stderr = saved
+
+    def testReleaseError(self):
+        self.failUnless(issubclass(SCMError, ReleaseError))
+        self.failUnless(issubclass(ReleaseError, Exception))
+        self.failIf(issubclass(ReleaseError, SystemExit))
+
+
+class ReleaseTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.jail_home()
+        self.mkfile('.pypirc', '[distutils]\nindex-servers =\n')
+        self.mirror = os.path.join(self.tempdir, 'mirror')
+        os.mkdir(self.mirror)
+
+    @quiet
+    def testRelease(self):
+        result = release(self.packagedir, [self.mirror], OPTIONS)
+        self.failUnless(isinstance(result, ReleaseResult))
+        self.assertEqual(result.name, 'testpackage')
+        self.assertEqual(result.version, '2.6')
+        self.assertEqual(result.filename, 'testpackage-2.6.zip')
+        self.assertEqual(result.locations, [self.mirror])
+        self.failUnless('sha256' in result.digests)
+        self.failUnless('dist' in [name for name, seconds in result.phases])
+        self.failUnless(os.path.isfile(os.path.join(self.mirror, 'testpackage-2.6.zip')))
+
+    @quiet
+    def testPhasesOnce(self):
+        result = release(self.packagedir, [self.mirror], OPTIONS)
+        names = [name for name, seconds in result.phases]
+        self.assertEqual(sorted(names), sorted(set(names)))
+
+    def testErrorNotPrinted(self):
+        saved = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            self.assertRaises(UsageError, release, self.packagedir, ['nowhere'], OPTIONS)
+            self.assertEqual(sys.stderr.getvalue(), '')
+        finally:
+            sys.stderr = saved
+
+    @quiet
+    def testDryRun(self):
+        result = release(self.packagedir, [], OPTIONS + ['-n'])
+        self.assertEqual(result.filename, 'testpackage-2.6.zip')
+        self.assertEqual(result.locations, [])
+
+    @quiet
+    def testUnknownLocation(self):
+        try:
+            release(self.packagedir, ['nowhere'], OPTIONS)
+        except UsageError, e:
+            self.assertEqual(e.msg, 'Unknown location: nowhere')
+            self.assertEqual(e.code, 1)
+            self.assertEqual(e.phase, 'get_options')
+        else:
+            self.fail('UsageError not raised')
+
+    @quiet
+    def testNotASandbox(self):
+        os.mkdir('foo')
+        self.assertRaises(SCMError, release, 'foo', [self.mirror], OPTIONS)
+
+    @quiet
+    def testBuildFails(self):
+        self.mkfile(os.path.join(self.packagedir, 'setup.py'), 'raise SystemExit(1)\n')
+        try:
+            release(self.packagedir, [self.mirror], OPTIONS)
+        except BuildError, e:
+            self.assertEqual(e.phase, 'sandbox_info')
+        else:
+            self.fail('BuildError not raised')
+
+    @quiet
+    def testHelp(self):
+        self.assertRaises(UsageError, release, self.packagedir, [], ['--help'])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,122 @@
+import unittest
+import os
+
+from jarn.mkrelease import mkrelease
+from jarn.mkrelease.mkrelease import Defaults
+from jarn.mkrelease.configcache import ConfigCache
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import quiet
+
+
+class ConfigCacheTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('config', '[mkrelease]\n')
+        self.cache = ConfigCache('cache')
+
+    def testLoadSave(self):
+        key = self.cache.get_key(['config', 'missing'])
+        self.assertEqual(self.cache.load(key), None)
+        self.cache.save(key, {'distbase': 'foo'})
+        self.assertEqual(self.cache.load(key), {'distbase': 'foo'})
+
+    def testStale(self):
+        key = self.cache.get_key(['config'])
+        self.cache.save(key, {'distbase': 'foo'})
+        self.mkfile('config', '[mkrelease]\ndistbase = bar\n')
+        self.assertNotEqual(self.cache.get_key(['config']), key)
+        self.assertEqual(self.cache.load(self.cache.get_key(['config'])), None)
+
+    def testReplace(self):
+        self.cache.save(self.cache.get_key(['config']), {'distbase': 'foo'})
+        self.mkfile('config', '[mkrelease]\ndistbase = bar\n')
+        self.cache.save(self.cache.get_key(['config']), {'distbase': 'bar'})
+        self.assertEqual(len(self.cache.read()), 1)
+
+    def testMaxEntries(self):
+        self.cache.maxentries = 2
+        for name in ('a', 'b', 'c'):
+            self.cache.save(self.cache.get_key([name]), {'distbase': name})
+        self.assertEqual([x[1]['distbase'] for x in self.cache.read()], ['c', 'b'])
+
+    def testMemory(self):
+        key = self.cache.get_key(['config'])
+        self.cache.save(key, {'distbase': 'foo'})
+        os.rename('cache', 'saved')
+        self.mkfile('cache', 'garbage')
+        self.assertEqual(self.cache.load(key), None)
+        os.rename('saved', 'cache')
+        self.assertEqual(self.cache.load(key), {'distbase': 'foo'})
+
+    def testCorrupt(self):
+        self.mkfile('cache', 'garbage')
+        self.assertEqual(self.cache.load(self.cache.get_key(['config'])), None)
+
+    def testDisabled(self):
+        cache = ConfigCache('')
+        cache.save(cache.get_key(['config']), {})
+        self.assertEqual(cache.load(cache.get_key(['config'])), None)
+
+
+class FailingConfigParser(object):
+
+    def __init__(self, *args):
+        raise AssertionError('ConfigParser instantiated')
+
+
+class DefaultsCacheTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('.mkrelease', '[mkrelease]\ndistbase = jarn.com:/var/dist\n'
+                    '[aliases]\npublic = jarn.com:/var/dist/public\n')
+        self.mkfile('.pypirc', '[distutils]\nindex-servers = one\n'
+                    '[one]\nrepository = http://localhost/\nusername = fred\n'
+                    'password = secret\n')
+        self.config = os.path.join(self.tempdir, '.mkrelease')
+        self.cachefile = os.path.join(self.tempdir, 'cache')
+        self.jail_home()
+        self.saved = mkrelease.ConfigParser
+
+    def tearDown(self):
+        mkrelease.ConfigParser = self.saved
+        JailSetup.tearDown(self)
+
+    def testCached(self):
+        Defaults(self.config, self.cachefile)
+        mkrelease.ConfigParser = FailingConfigParser
+        defaults = Defaults(self.config, self.cachefile)
+        self.assertEqual(defaults.distbase, 'jarn.com:/var/dist')
+        self.assertEqual(defaults.aliases, {'public': ['jarn.com:/var/dist/public']})
+        self.assertEqual(defaults.servers['one'].repository, 'http://localhost/')
+        self.assertEqual(defaults.servers['one'].username, 'fred')
+
+    def testPasswordNotCached(self):
+        defaults = Defaults(self.config, self.cachefile)
+        self.assertEqual(defaults.servers['one'].password, 'secret')
+        with open(self.cachefile, 'rb') as file:
+            self.failIf('secret' in file.read())
+
+    def testPasswordReadWhenNeeded(self):
+        Defaults(self.config, self.cachefile)
+        defaults = Defaults(self.config, self.cachefile)
+        self.failIf('password' in defaults.servers['one'].__dict__)
+        self.assertEqual(defaults.servers['one'].password, 'secret')
+
+    def testChanged(self):
+        Defaults(self.config, self.cachefile)
+        self.mkfile('.mkrelease', '[mkrelease]\ndistbase = jarn.com:/var/dist/other\n')
+        self.assertEqual(Defaults(self.config, self.cachefile).distbase,
+                         'jarn.com:/var/dist/other')
+
+    @quiet
+    def testWarningsNotCached(self):
+        self.mkfile('.mkrelease', '[mkrelease]\nsign = maybe\n')
+        Defaults(self.config, self.cachefile)
+        self.failIf(os.path.exists(self.cachefile))
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
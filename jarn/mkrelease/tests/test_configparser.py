@@ -21,6 +21,15 @@ s_val = fred
         self.assertEqual(parser.getint('section', 's_val'), None)
         self.assertEqual(parser.getfloat('section', 's_val'), None)
 
+    def test_raw(self):
+        self.mkfile('my.cfg', """
+[section]
+s_val = fred%barney
+""")
+        parser = ConfigParser()
+        parser.read('my.cfg')
+        self.assertEqual(parser.get('section', 's_val', raw=True), 'fred%barney')
+
     def test_bad_format(self):
         self.mkfile('my.cfg', """
 this = wrong
@@ -0,0 +1,220 @@
+import unittest
+import os
+import sys
+import socket
+import time
+import threading
+import subprocess
+import StringIO
+
+from os.path import join, exists
+
+from jarn.mkrelease.daemon import send_frame, read_frame
+from jarn.mkrelease.daemon import send_request, read_request
+from jarn.mkrelease.daemon import get_exit_code, run_client, Daemon
+from jarn.mkrelease.mkrelease import get_daemon_options, SOCKET
+from jarn.mkrelease import mkrelease
+from jarn.mkrelease.scm import SCM
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import quiet
+
+
+class FrameTests(unittest.TestCase):
+
+    def setUp(self):
+        self.left, self.right = socket.socketpair()
+        self.file = self.right.makefile('rb', 0)
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def testFrame(self):
+        send_frame(self.left, 'o', 'foo\nbar\n')
+        send_frame(self.left, 'x')
+        self.assertEqual(read_frame(self.file), ('o', 'foo\nbar\n'))
+        self.assertEqual(read_frame(self.file), ('x', ''))
+
+    def testClosed(self):
+        self.left.sendall('o0000')
+        self.left.close()
+        self.assertEqual(read_frame(self.file), (None, None))
+
+    def testTruncated(self):
+        self.left.sendall('o00000010foo')
+        self.left.close()
+        self.assertEqual(read_frame(self.file), (None, None))
+
+    def testRequest(self):
+        send_request(self.left, ['-d', 'a=b', ''], '/tmp', {'HOME': '/home/a=b'})
+        self.assertEqual(read_request(self.file),
+                         (['-d', 'a=b', ''], '/tmp', {'HOME': '/home/a=b'}))
+
+    def testIncompleteRequest(self):
+        send_frame(self.left, 'a', '-n')
+        self.left.close()
+        self.assertEqual(read_request(self.file), None)
+
+
+class OptionsTests(unittest.TestCase):
+
+    def testNoDaemon(self):
+        self.assertEqual(get_daemon_options(['-n', 'foo']), (False, SOCKET, ['-n', 'foo']))
+
+    def testDaemon(self):
+        self.assertEqual(get_daemon_options(['--daemon', '-n']), (True, SOCKET, ['-n']))
+
+    def testSocket(self):
+        self.assertEqual(get_daemon_options(['--daemon', '--socket=foo', '-n']),
+                         (True, 'foo', ['-n']))
+        self.assertEqual(get_daemon_options(['--socket', 'foo', '--daemon']),
+                         (True, 'foo', []))
+
+    def testDoubleDash(self):
+        self.assertEqual(get_daemon_options(['-n', '--', '--daemon']),
+                         (False, SOCKET, ['-n', '--', '--daemon']))
+
+    def testExitCode(self):
+        self.assertEqual(get_exit_code(None), 0)
+        self.assertEqual(get_exit_code(2), 2)
+
+    @quiet
+    def testExitMessage(self):
+        self.assertEqual(get_exit_code('Failed'), 1)
+
+
+def is_running(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as file:
+            return file.read().split(') ')[-1][0] != 'Z'
+    except IOError:
+        return False
+
+
+def spawn_main(args):
+    # Stands in for a release running a long command
+    process = subprocess.Popen(['sleep', '30'])
+    print 'pid', process.pid
+    for i in range(200):
+        print '.'
+        sys.stdout.flush()
+        time.sleep(0.05)
+    return 0
+
+
+class DaemonTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.saved = os.environ.copy()
+        os.environ['HOME'] = self.tempdir
+        self.mkfile('.pypirc', '[distutils]\nindex-servers = pypi\n\n[pypi]\nusername = fred\n')
+        self.mkfile('.mkrelease', '[aliases]\nfoo = bar\n')
+        self.socketpath = join(self.tempdir, 'mkrelease.sock')
+        self.daemon = Daemon(self.socketpath, jobs=2)
+        self.daemon.bind()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        os.environ.clear()
+        os.environ.update(self.saved)
+        JailSetup.tearDown(self)
+
+    def run_client(self, args):
+        saved = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO.StringIO(), StringIO.StringIO()
+        try:
+            rc = run_client(self.socketpath, args)
+            return rc, sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = saved
+
+    def testListLocations(self):
+        rc, out, err = self.run_client(['-l'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(out, 'foo\npypi\n')
+        self.assertEqual(err, '')
+
+    def testBadOption(self):
+        rc, out, err = self.run_client(['--bogus'])
+        self.assertEqual(rc, 1)
+        self.failUnless(err.startswith('mkrelease: option --bogus not recognized'), err)
+
+    def testWorkingDirectory(self):
+        os.mkdir('foo')
+        rc, out, err = self.run_client(['-n', 'foo/bar'])
+        self.assertEqual(rc, 1)
+        self.assertEqual(err, 'No such file or directory: %s\n' % join(self.tempdir, 'foo', 'bar'))
+
+    def testEnvironment(self):
+        os.environ['HOME'] = join(self.tempdir, 'foo')
+        os.mkdir('foo')
+        rc, out, err = self.run_client(['-l'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(out, '')
+
+    def testDisconnectKillsCommands(self):
+        if not os.path.isdir('/proc'):
+            return
+        saved = mkrelease.main
+        mkrelease.main = spawn_main
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socketpath)
+            send_request(sock, [], self.tempdir, os.environ)
+            file = sock.makefile('rb', 0)
+            output = ''
+            while 'pid' not in output or '\n' not in output.split('pid')[1]:
+                channel, data = read_frame(file)
+                output += data
+        finally:
+            mkrelease.main = saved
+        pid = int(output.split('pid')[1].split()[0])
+        self.failUnless(is_running(pid))
+        file.close()
+        sock.close()
+        for i in range(100):
+            if not is_running(pid):
+                break
+            time.sleep(0.05)
+        self.failIf(is_running(pid))
+
+    def testSocketMode(self):
+        self.assertEqual(os.stat(self.socketpath).st_mode & 0777, 0700)
+
+    @quiet
+    def testAlreadyRunning(self):
+        self.assertRaises(SystemExit, Daemon(self.socketpath).bind)
+
+    def testStaleSocket(self):
+        stalepath = join(self.tempdir, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stalepath)
+        sock.close()
+        daemon = Daemon(stalepath)
+        daemon.bind()
+        daemon.close()
+        self.failIf(exists(stalepath))
+
+    @quiet
+    def testNoDaemon(self):
+        self.assertRaises(SystemExit, run_client, join(self.tempdir, 'missing.sock'), ['-l'])
+
+
+class WarmTests(unittest.TestCase):
+
+    def tearDown(self):
+        SCM.version_cache = None
+
+    def testVersionCache(self):
+        Daemon('').warm()
+        self.failUnless(isinstance(SCM.version_cache, dict))
+        self.failUnless(SCM.version_cache)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
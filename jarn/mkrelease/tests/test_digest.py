@@ -0,0 +1,89 @@
+import unittest
+import os
+
+from jarn.mkrelease import digest
+from jarn.mkrelease.digest import get_digests, compare_digests, write_sidecar
+from jarn.mkrelease.digest import MISSING, IDENTICAL, CONFLICT, UNKNOWN
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class GetDigestsTests(JailSetup):
+
+    def testDigests(self):
+        self.mkfile('foo.zip', 'foo')
+        digests = get_digests('foo.zip')
+        digests.pop('blake2_256', None)
+        self.assertEqual(digests, {
+            'size': 3,
+            'md5': 'acbd18db4cc2f85cedef654fccc4a4d8',
+            'sha256': '2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae',
+        })
+
+    def testMmap(self):
+        self.mkfile('foo.zip', 'foo' * 1000)
+        saved = digest.MMAPSIZE, digest.BLOCKSIZE
+        digest.MMAPSIZE, digest.BLOCKSIZE = 1, 7
+        try:
+            mapped = get_digests('foo.zip')
+        finally:
+            digest.MMAPSIZE, digest.BLOCKSIZE = saved
+        self.assertEqual(mapped, get_digests('foo.zip'))
+
+    def testSinglePass(self):
+        self.mkfile('foo.zip', 'foo')
+        opened = []
+        def counting_open(*args):
+            opened.append(args[0])
+            return open(*args)
+        digest.open = counting_open
+        try:
+            get_digests('foo.zip')
+        finally:
+            del digest.open
+        self.assertEqual(opened, ['foo.zip'])
+
+    def testSidecar(self):
+        self.mkfile('foo.zip', 'foo')
+        self.assertEqual(write_sidecar('foo.zip', get_digests('foo.zip')), 'foo.zip.sha256')
+        with open('foo.zip.sha256') as file:
+            self.assertEqual(file.read(),
+                '2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae  foo.zip\n')
+
+    def testSidecarDir(self):
+        self.mkfile('foo.zip', 'foo')
+        os.mkdir('tmp')
+        self.assertEqual(write_sidecar('foo.zip', get_digests('foo.zip'), 'tmp'),
+                         os.path.join('tmp', 'foo.zip.sha256'))
+        self.failIf(os.path.exists('foo.zip.sha256'))
+
+
+class CompareDigestsTests(unittest.TestCase):
+
+    local = {'size': 3, 'md5': 'aaa', 'sha256': 'bbb'}
+
+    def testMissing(self):
+        self.assertEqual(compare_digests(self.local, {}), MISSING)
+
+    def testUnknown(self):
+        self.assertEqual(compare_digests(self.local, None), UNKNOWN)
+
+    def testIdentical(self):
+        self.assertEqual(compare_digests(self.local, {'size': 3, 'sha256': 'bbb'}), IDENTICAL)
+        self.assertEqual(compare_digests(self.local, {'md5': 'aaa'}), IDENTICAL)
+
+    def testSizeDiffers(self):
+        self.assertEqual(compare_digests(self.local, {'size': 4}), CONFLICT)
+
+    def testDigestDiffers(self):
+        self.assertEqual(compare_digests(self.local, {'size': 3, 'sha256': 'ccc'}), CONFLICT)
+
+    def testSizeOnly(self):
+        self.assertEqual(compare_digests(self.local, {'size': 3}), UNKNOWN)
+
+    def testUnsupportedDigest(self):
+        self.assertEqual(compare_digests(self.local, {'sha1': 'ddd'}), UNKNOWN)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,58 @@
+import unittest
+import os
+
+from jarn.mkrelease.env import get_setuptools_env, get_setuptools_path
+from jarn.mkrelease.env import get_scm_env, invalidate
+from jarn.mkrelease.setuptools import Setuptools
+from jarn.mkrelease.scm import Git, Mercurial
+
+
+class EnvTests(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = os.environ.copy()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved)
+        invalidate()
+
+    def testSetuptoolsEnv(self):
+        env = get_setuptools_env()
+        self.failUnless('PYTHONPATH' in env)
+        self.assertEqual(env['HG_SETUPTOOLS_FORCE_CMD'], '1')
+
+    def testScmEnv(self):
+        os.environ['PYTHONPATH'] = '/tmp'
+        env = get_scm_env()
+        self.failIf('PYTHONPATH' in env)
+        self.assertEqual(env['PATH'], os.environ['PATH'])
+
+    def testCached(self):
+        self.failUnless(get_setuptools_env() is get_setuptools_env())
+        self.failUnless(get_scm_env() is get_scm_env())
+
+    def testEnvironChanged(self):
+        env = get_setuptools_env()
+        os.environ['MKRELEASE_TEST'] = 'yes'
+        self.failIf(get_setuptools_env() is env)
+        self.assertEqual(get_setuptools_env()['MKRELEASE_TEST'], 'yes')
+
+    def testPathSurvivesEnvironChange(self):
+        path = get_setuptools_path()
+        os.environ['MKRELEASE_TEST'] = 'yes'
+        self.failUnless(get_setuptools_path() is path)
+        self.assertEqual(get_setuptools_env()['PYTHONPATH'], path)
+
+    def testInvalidate(self):
+        env = get_scm_env()
+        invalidate()
+        self.failIf(get_scm_env() is env)
+
+    def testShared(self):
+        self.failUnless(Setuptools().process.env is Setuptools().process.env)
+        self.failUnless(Git().process.env is Mercurial().process.env)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
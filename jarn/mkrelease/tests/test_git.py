@@ -315,6 +315,46 @@ class DirtySandboxTests(GitSetup):
         self.assertRaises(SystemExit, scm.check_dirty_sandbox, self.packagedir)
 
 
+class StartCheckSandboxTests(GitSetup):
+
+    def testCleanSandbox(self):
+        scm = Git()
+        self.assertEqual(scm.start_check_sandbox(self.packagedir).result(), None)
+
+    @quiet
+    def testModifiedFile(self):
+        scm = Git()
+        self.modify(self.packagedir)
+        future = scm.start_check_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+    @quiet
+    def testBadProcess(self):
+        scm = Git(MockProcess(rc=128))
+        scm.version_info = (1, 7)
+        future = scm.start_check_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+
+class StartUrlFromSandboxTests(GitSetup):
+
+    def testGetLocalUrl(self):
+        scm = Git()
+        self.assertEqual(scm.start_get_url_from_sandbox(self.packagedir).result(), '')
+
+    def testGetRemoteUrl(self):
+        scm = Git()
+        self.clone()
+        future = scm.start_get_url_from_sandbox(self.clonedir)
+        self.assertEqual(future.result(), self.packagedir)
+
+    @quiet
+    def testBadProcess(self):
+        scm = Git(MockProcess(rc=1))
+        future = scm.start_get_url_from_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+
 class UncleanSandboxTests(GitSetup):
 
     def testCleanSandbox(self):
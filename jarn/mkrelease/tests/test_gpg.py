@@ -0,0 +1,63 @@
+import unittest
+import os
+
+from os.path import isfile
+
+from jarn.mkrelease.gpg import GPG
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+
+class GPGSigner(object):
+    """Record gpg calls and create the signature file."""
+
+    def __init__(self, jail):
+        self.jail = jail
+        self.commands = []
+
+    def __call__(self, cmd):
+        self.commands.append(cmd)
+        signature = cmd.split('--output "')[1].split('"')[0]
+        self.jail.mkfile(signature, 'signature')
+        return 0, []
+
+
+class RunSignTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'foo')
+
+    def testSign(self):
+        signer = GPGSigner(self)
+        gpg = GPG(MockProcess(func=signer))
+        self.assertEqual(gpg.run_sign('foo.zip'), 'foo.zip.asc')
+        self.assertEqual(signer.commands,
+            ['gpg --detach-sign -a --output "foo.zip.asc" "foo.zip"'])
+
+    def testIdentity(self):
+        os.mkdir('sig')
+        signer = GPGSigner(self)
+        gpg = GPG(MockProcess(func=signer))
+        self.assertEqual(gpg.run_sign('foo.zip', 'fred@bedrock.com', 'sig/foo.zip.asc'),
+                         'sig/foo.zip.asc')
+        self.assertEqual(signer.commands,
+            ['gpg --detach-sign -a --local-user "fred@bedrock.com" '
+             '--output "sig/foo.zip.asc" "foo.zip"'])
+
+    def testRemoveOld(self):
+        self.mkfile('foo.zip.asc', 'old')
+        gpg = GPG(MockProcess())
+        self.assertRaises(SystemExit, quiet(gpg.run_sign), 'foo.zip')
+        self.failIf(isfile('foo.zip.asc'))
+
+    @quiet
+    def testFails(self):
+        gpg = GPG(MockProcess(rc=1))
+        self.assertRaises(SystemExit, gpg.run_sign, 'foo.zip')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
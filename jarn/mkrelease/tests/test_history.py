@@ -0,0 +1,121 @@
+import unittest
+import os
+import json
+
+from jarn.mkrelease.history import History
+from jarn.mkrelease.timer import Timer, monotonic
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class HistoryTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.history = History(os.path.join(self.tempdir, 'db', 'history.sqlite'))
+
+    def tearDown(self):
+        self.history.close()
+        JailSetup.tearDown(self)
+
+    def add(self, name, version, locations=(), started=None):
+        return self.history.add(name, version, version, 'git@example.com:foo',
+                                '%s-%s.zip' % (name, version), 'abc', locations,
+                                [('dist', 1.5), ('distribute', 0.5)], started)
+
+    def testAdd(self):
+        self.add('Foo', '1.0', ['one', 'two'])
+        releases = self.history.find()
+        self.assertEqual(len(releases), 1)
+        self.assertEqual(releases[0]['name'], 'foo')
+        self.assertEqual(releases[0]['tagid'], '1.0')
+        self.assertEqual(releases[0]['locations'], ['one', 'two'])
+        self.assertEqual(releases[0]['phases'], [('dist', 1.5), ('distribute', 0.5)])
+
+    def testFind(self):
+        self.add('foo', '1.0', ['one'], 1)
+        self.add('foo', '1.1', ['two'], 2)
+        self.add('bar', '1.0', ['one'], 3)
+        self.assertEqual([x['version'] for x in self.history.find('Foo')], ['1.0', '1.1'])
+        self.assertEqual([x['name'] for x in self.history.find(version='1.0')], ['foo', 'bar'])
+        self.assertEqual([x['version'] for x in self.history.find('foo', locations=['two'])], ['1.1'])
+        self.assertEqual(len(self.history.find(locations=['one', 'two'])), 3)
+        self.assertEqual(self.history.find('baz'), [])
+
+    def testHasTag(self):
+        self.add('foo', '1.0')
+        self.failUnless(self.history.has_tag('foo', '1.0', 'git@example.com:foo'))
+        self.failIf(self.history.has_tag('foo', '1.1', 'git@example.com:foo'))
+        self.failIf(self.history.has_tag('bar', '1.0', 'git@example.com:foo'))
+        self.failIf(self.history.has_tag('foo', '', 'git@example.com:foo'))
+
+    def testDisabled(self):
+        history = History('')
+        self.assertEqual(history.add('foo', '1.0', '', '', 'foo-1.0.zip', 'abc'), None)
+        self.assertEqual(history.find(), [])
+        self.failIf(history.has_tag('foo', '1.0'))
+
+
+class TimerTests(unittest.TestCase):
+
+    def testPhases(self):
+        ticks = iter([0, 1, 3, 4, 7, 10])
+        timer = Timer(lambda: ticks.next())
+        with timer.phase('dist'):
+            pass
+        try:
+            with timer.phase('upload'):
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(timer.phases, [('dist', 2), ('upload', 3)])
+        self.assertEqual(timer.total(), 10)
+
+    def testFailed(self):
+        timer = Timer()
+        with timer.phase('dist'):
+            pass
+        self.assertEqual(timer.failed, None)
+        try:
+            with timer.phase('distribute'):
+                with timer.phase('upload pypi'):
+                    raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(timer.failed, 'upload pypi')
+
+    def testSummary(self):
+        ticks = iter([0, 0, 1, 1, 3, 4])
+        timer = Timer(lambda: ticks.next())
+        with timer.phase('egg_info'):
+            pass
+        with timer.phase('upload pypi'):
+            pass
+        self.assertEqual(timer.get_summary(), [
+            'phase          seconds',
+            'upload pypi      2.000',
+            'egg_info         1.000',
+            'total            4.000',
+        ])
+
+    def testMonotonic(self):
+        self.failUnless(monotonic() <= monotonic())
+
+
+class ReportTests(JailSetup):
+
+    def testWriteReport(self):
+        ticks = iter([0, 1, 2, 3])
+        timer = Timer(lambda: ticks.next())
+        with timer.phase('dist'):
+            pass
+        timer.write_report('timings.json', 1)
+        with open('timings.json') as file:
+            report = json.load(file)
+        self.assertEqual(report['status'], 1)
+        self.assertEqual(report['total'], 3)
+        self.assertEqual(report['phases'], [{'name': 'dist', 'seconds': 1}])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,51 @@
+import unittest
+
+from jarn.mkrelease.index import Index
+
+PAGE = """\
+<html><body>
+<a href="../../packages/source/f/foo/foo-1.0.zip#md5=aaa">foo-1.0.zip</a><br/>
+<a href='foo-1.1.zip#sha256=bbb'>foo-1.1.zip</a><br/>
+<a href="http://example.com/foo-1.2.zip">foo-1.2.zip</a><br/>
+</body></html>
+"""
+
+
+class SimpleUrlTests(unittest.TestCase):
+
+    def testPyPI(self):
+        index = Index()
+        self.assertEqual(index.get_simple_url('http://pypi.python.org/pypi', 'jarn.mkrelease'),
+                         'http://pypi.python.org/simple/jarn-mkrelease/')
+
+    def testLegacy(self):
+        index = Index()
+        self.assertEqual(index.get_simple_url('https://upload.example.com/legacy/', 'Foo_Bar'),
+                         'https://upload.example.com/simple/foo-bar/')
+
+    def testRoot(self):
+        index = Index()
+        self.assertEqual(index.get_simple_url('http://localhost:8080', 'foo'),
+                         'http://localhost:8080/simple/foo/')
+
+
+class ParseLinksTests(unittest.TestCase):
+
+    def testLinks(self):
+        index = Index()
+        self.assertEqual(index.parse_links(PAGE), {
+            'foo-1.0.zip': {'md5': 'aaa'},
+            'foo-1.1.zip': {'sha256': 'bbb'},
+            'foo-1.2.zip': {},
+        })
+
+
+class RemoteDigestsTests(unittest.TestCase):
+
+    def testNoServer(self):
+        index = Index(timeout=5)
+        self.assertEqual(index.get_remote_digests('http://127.0.0.1:1', 'foo', 'foo-1.0.zip'), None)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,97 @@
+import unittest
+import os
+
+from os.path import join, isfile
+
+from jarn.mkrelease.local import Local
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import quiet
+
+
+class RunCopyTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'foo')
+        self.mkfile('foo.zip.asc', 'sig')
+
+    def testCopy(self):
+        local = Local(quiet=True)
+        self.assertEqual(local.run_copy(['foo.zip', 'foo.zip.asc'], ['public']), 0)
+        self.assertEqual(open(join('public', 'foo.zip')).read(), 'foo')
+        self.assertEqual(open(join('public', 'foo.zip.asc')).read(), 'sig')
+        self.assertEqual(sorted(os.listdir('public')), ['foo.zip', 'foo.zip.asc'])
+        self.failIf(isfile(join('public', '.foo.zip.part')))
+
+    def testCreatesDirs(self):
+        local = Local(quiet=True)
+        local.run_copy(['foo.zip'], [join('dist', 'public'), join('dist', 'customerA')])
+        self.failUnless(isfile(join('dist', 'public', 'foo.zip')))
+        self.failUnless(isfile(join('dist', 'customerA', 'foo.zip')))
+
+    def testReplaces(self):
+        os.mkdir('public')
+        self.mkfile(join('public', 'foo.zip'), 'old')
+        local = Local(quiet=True)
+        local.run_copy(['foo.zip'], ['public'])
+        self.assertEqual(open(join('public', 'foo.zip')).read(), 'foo')
+
+    def testCopyIsIndependent(self):
+        local = Local(quiet=True)
+        local.run_copy(['foo.zip'], ['public'])
+        self.mkfile('foo.zip', 'bar')
+        self.assertEqual(open(join('public', 'foo.zip')).read(), 'foo')
+
+    def testSyncOncePerBatch(self):
+        synced = []
+        local = Local(quiet=True)
+        local.sync_files = synced.append
+        local.sync_dir = synced.append
+        local.run_copy(['foo.zip', 'foo.zip.asc'], ['public', 'customerA'])
+        self.assertEqual(synced, [[join('public', '.foo.zip.part'),
+                                   join('public', '.foo.zip.asc.part'),
+                                   join('customerA', '.foo.zip.part'),
+                                   join('customerA', '.foo.zip.asc.part')],
+                                  'public', 'customerA'])
+        self.assertEqual(sorted(os.listdir('public')), ['foo.zip', 'foo.zip.asc'])
+
+    def testSyncFiles(self):
+        self.mkfile('bar.zip', 'bar')
+        Local(quiet=True).sync_files(['foo.zip', 'bar.zip'])
+
+    def testLink(self):
+        local = Local(quiet=True)
+        self.assertEqual(local.copy('foo.zip', 'bar.zip', link=True), 'hardlink')
+        self.assertEqual(os.stat('foo.zip').st_ino, os.stat('bar.zip').st_ino)
+
+    def testNoLink(self):
+        local = Local(quiet=True)
+        self.failIfEqual(local.copy('foo.zip', 'bar.zip'), 'hardlink')
+        self.failIfEqual(os.stat('foo.zip').st_ino, os.stat('bar.zip').st_ino)
+
+    @quiet
+    def testBadDir(self):
+        self.mkfile('public')
+        local = Local(quiet=True)
+        self.assertRaises(SystemExit, local.run_copy, ['foo.zip'], [join('public', 'dist')])
+
+
+class RemoteDigestsTests(JailSetup):
+
+    def testMissing(self):
+        self.mkfile('foo.zip', 'foo')
+        local = Local()
+        self.assertEqual(local.get_remote_digests('foo.zip', self.tempdir + '/public'), {})
+
+    def testExists(self):
+        self.mkfile('foo.zip', 'foo')
+        local = Local(quiet=True)
+        local.run_copy(['foo.zip'], ['public'])
+        digests = local.get_remote_digests('foo.zip', 'public')
+        self.assertEqual(digests['size'], 3)
+        self.assertEqual(digests['md5'], 'acbd18db4cc2f85cedef654fccc4a4d8')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
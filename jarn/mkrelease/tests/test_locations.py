@@ -1,4 +1,7 @@
 import unittest
+import sys
+
+from StringIO import StringIO
 
 from jarn.mkrelease.mkrelease import Locations
 
@@ -47,6 +50,123 @@ class JoinTests(unittest.TestCase):
         self.assertEqual(locations.join('foo:/bar', 'baz'), 'foo:/bar/baz')
 
 
+class IsLocalTests(unittest.TestCase):
+
+    def test_abspath(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('/var/dist'), True)
+
+    def test_file_url(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('file:///var/dist'), True)
+
+    def test_localhost_file_url(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('file://localhost/var/dist'), True)
+
+    def test_remote_file_url(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('file://jarn.com/var/dist'), False)
+
+    def test_ssh(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('jarn.com:/var/dist'), False)
+
+    def test_relpath(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.is_local('var/dist'), False)
+
+    def test_get_local_path(self):
+        locations = Locations(defaults)
+        self.assertEqual(locations.get_local_path('file:///var/dist'), '/var/dist')
+        self.assertEqual(locations.get_local_path('/var/dist/'), '/var/dist')
+
+
+class GetLocationTests(unittest.TestCase):
+
+    class defaults(defaults):
+        distbase = 'jarn.com:/var/dist'
+
+    def test_distbase(self):
+        locations = Locations(self.defaults)
+        self.assertEqual(locations.get_location('public'), ['jarn.com:/var/dist/public'])
+
+    def test_file_url_ignores_distbase(self):
+        locations = Locations(self.defaults)
+        self.assertEqual(locations.get_location('file:///srv/dist'), ['file:///srv/dist'])
+
+    def test_absolute_path_gets_distbase(self):
+        locations = Locations(self.defaults)
+        locations.distbase = 'jarn.com:'
+        self.assertEqual(locations.get_location('/var/dist/x'), ['jarn.com:/var/dist/x'])
+
+    def test_absolute_path_without_distbase(self):
+        locations = Locations(self.defaults)
+        locations.distbase = ''
+        self.assertEqual(locations.get_location('/srv/dist'), ['/srv/dist'])
+
+    def test_valid_local(self):
+        locations = Locations(self.defaults)
+        locations.check_valid_locations(['/srv/dist', 'file:///srv/dist'])
+
+
+class AliasTests(unittest.TestCase):
+
+    class defaults(defaults):
+        distbase = 'jarn.com:/var/dist'
+        aliases = {
+            'world': ['regionA', 'regionB'],
+            'regionA': ['common', 'a'],
+            'regionB': ['common', 'b', 'jarn.com:/var/dist/a'],
+            'common': ['public', 'file:///srv/dist'],
+            'loop': ['public', 'ring1'],
+            'ring1': ['ring2'],
+            'ring2': ['ring1'],
+        }
+
+    def test_nested(self):
+        locations = Locations(self.defaults)
+        self.assertEqual(locations.get_location('common'),
+                         ['jarn.com:/var/dist/public', 'file:///srv/dist'])
+
+    def test_diamond(self):
+        locations = Locations(self.defaults)
+        self.assertEqual(locations.get_location('world'),
+                         ['jarn.com:/var/dist/public', 'file:///srv/dist',
+                          'jarn.com:/var/dist/a', 'jarn.com:/var/dist/b'])
+
+    def test_memoized(self):
+        locations = Locations(self.defaults)
+        locations.get_location('world')
+        self.assertEqual(sorted(locations.expanded), ['common', 'regionA', 'regionB', 'world'])
+        common = locations.expanded['common']
+        locations.get_location('regionB')
+        self.failUnless(locations.expanded['common'] is common)
+
+    def test_result_is_copy(self):
+        locations = Locations(self.defaults)
+        locations.get_location('common').append('foo')
+        self.assertEqual(len(locations.get_location('common')), 2)
+
+    def test_cycle(self):
+        locations = Locations(self.defaults)
+        saved = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertRaises(SystemExit, locations.get_location, 'loop')
+            self.assertEqual(sys.stderr.getvalue(), 'Alias cycle: ring1 -> ring2 -> ring1\n')
+        finally:
+            sys.stderr = saved
+
+    def test_extend_unique(self):
+        locations = Locations(self.defaults)
+        locations.extend(locations.get_location('regionA'))
+        locations.extend(locations.get_location('regionB'))
+        self.assertEqual(list(locations),
+                         ['jarn.com:/var/dist/public', 'file:///srv/dist',
+                          'jarn.com:/var/dist/a', 'jarn.com:/var/dist/b'])
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
 
@@ -225,6 +225,52 @@ class DirtySandboxTests(MercurialSetup):
         self.assertRaises(SystemExit, scm.check_dirty_sandbox, self.packagedir)
 
 
+class StartCheckSandboxTests(MercurialSetup):
+
+    def testCleanSandbox(self):
+        scm = Mercurial()
+        self.assertEqual(scm.start_check_sandbox(self.packagedir).result(), None)
+
+    @quiet
+    def testModifiedFile(self):
+        scm = Mercurial()
+        self.modify(self.packagedir)
+        future = scm.start_check_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+    @quiet
+    def testDeletedButTrackedFile(self):
+        scm = Mercurial()
+        self.delete(self.packagedir)
+        future = scm.start_check_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+    @quiet
+    def testBadProcess(self):
+        scm = Mercurial(MockProcess(rc=1))
+        future = scm.start_check_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+
+class StartUrlFromSandboxTests(MercurialSetup):
+
+    def testGetLocalUrl(self):
+        scm = Mercurial()
+        self.assertEqual(scm.start_get_url_from_sandbox(self.packagedir).result(), '')
+
+    def testGetRemoteUrl(self):
+        scm = Mercurial()
+        self.clone()
+        future = scm.start_get_url_from_sandbox(self.clonedir)
+        self.assertEqual(future.result(), self.packagedir)
+
+    @quiet
+    def testBadProcess(self):
+        scm = Mercurial(MockProcess(rc=1))
+        future = scm.start_get_url_from_sandbox(self.packagedir)
+        self.assertRaises(SystemExit, future.result)
+
+
 class UncleanSandboxTests(MercurialSetup):
 
     def testCleanSandbox(self):
@@ -1,8 +1,22 @@
 # THIS SHOULD BE DOCTESTS
 import unittest
+import os
+import sys
+import json
+import pstats
+import shutil
+import StringIO
 
 from jarn.mkrelease.mkrelease import main
+from jarn.mkrelease.mkrelease import ReleaseMaker
+from jarn.mkrelease.digest import get_digests
+from jarn.mkrelease.history import History
+from jarn.mkrelease.process import Process
 from jarn.mkrelease.testing import SubversionSetup
+from jarn.mkrelease.testing import GitSetup
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import IndexServer
+from jarn.mkrelease.testing import quiet
 
 
 class Tests(SubversionSetup):
@@ -15,6 +29,386 @@ class Tests(SubversionSetup):
         pass
 
 
+class ServerInfo(object):
+    sign = None
+    identity = None
+    repository = 'http://localhost/pypi'
+
+
+class MockTransport(object):
+
+    def __init__(self, digests):
+        self.digests = digests
+
+    def get_remote_digests(self, *args):
+        return self.digests.get(args[-1])
+
+
+class CheckLocationsTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo-1.0.zip', 'foo')
+        self.digests = get_digests('foo-1.0.zip')
+        self.rm = ReleaseMaker([])
+        self.rm.defaults.servers['pypi'] = ServerInfo()
+        self.rm.locations.extend(['pypi', 'jarn.com:public', 'sftp://jarn.com/customerA'])
+
+    def testAllMissing(self):
+        self.rm.scp = MockTransport({'jarn.com:public': {}, 'jarn.com:/customerA': {}})
+        self.rm.index = MockTransport({'foo-1.0.zip': {}})
+        self.assertEqual(self.rm.check_locations('foo-1.0.zip', 'foo'),
+                         ['pypi', 'jarn.com:public', 'sftp://jarn.com/customerA'])
+
+    @quiet
+    def testSkipIdentical(self):
+        self.rm.scp = MockTransport({'jarn.com:public': {'size': 3, 'sha256': self.digests['sha256']},
+                                     'jarn.com:/customerA': None})
+        self.rm.index = MockTransport({'foo-1.0.zip': {'md5': self.digests['md5']}})
+        self.assertEqual(self.rm.check_locations('foo-1.0.zip', 'foo'),
+                         ['sftp://jarn.com/customerA'])
+
+    def testSkipQuietly(self):
+        self.rm.quiet = True
+        self.rm.scp = MockTransport({'jarn.com:public': {'size': 3, 'sha256': self.digests['sha256']},
+                                     'jarn.com:/customerA': None})
+        self.rm.index = MockTransport({'foo-1.0.zip': {'md5': self.digests['md5']}})
+        saved = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            self.rm.check_locations('foo-1.0.zip', 'foo')
+            self.assertEqual(sys.stdout.getvalue(), '')
+        finally:
+            sys.stdout = saved
+
+    @quiet
+    def testConflict(self):
+        self.rm.scp = MockTransport({'jarn.com:public': {}, 'jarn.com:/customerA': {'size': 4}})
+        self.rm.index = MockTransport({'foo-1.0.zip': {}})
+        self.assertRaises(SystemExit, self.rm.check_locations, 'foo-1.0.zip', 'foo')
+
+
+class MockGPG(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def run_sign(self, distfile, identity='', signature=None):
+        self.calls.append((identity, signature))
+        return signature
+
+
+class GetSignaturesTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.rm = ReleaseMaker([])
+        self.rm.gpg = MockGPG()
+        self.rm.nativeupload = True
+        for name in ('pypi', 'other'):
+            self.rm.defaults.servers[name] = ServerInfo()
+
+    def get_signatures(self, locations):
+        return self.rm.get_signatures('dist/foo-1.0.zip', locations, self.tempdir)
+
+    def testNoSign(self):
+        self.rm.sign = False
+        self.assertEqual(self.get_signatures(['pypi', 'jarn.com:public']), {})
+        self.assertEqual(self.rm.gpg.calls, [])
+
+    def testSignOnce(self):
+        self.rm.sign = True
+        signatures = self.get_signatures(['pypi', 'other', 'jarn.com:public'])
+        signature = os.path.join(self.tempdir, 'gpg-0', 'foo-1.0.zip.asc')
+        self.assertEqual(signatures, {'pypi': signature, 'other': signature,
+                                      'jarn.com:public': signature})
+        self.assertEqual(self.rm.gpg.calls, [('', signature)])
+
+    def testSignPerIdentity(self):
+        self.rm.sign = True
+        self.rm.defaults.servers['other'].identity = 'fred@bedrock.com'
+        signatures = self.get_signatures(['pypi', 'other', 'jarn.com:public'])
+        self.assertEqual(len(self.rm.gpg.calls), 2)
+        self.assertEqual(signatures['pypi'], signatures['jarn.com:public'])
+        self.assertNotEqual(signatures['pypi'], signatures['other'])
+        self.assertEqual(os.path.basename(signatures['other']), 'foo-1.0.zip.asc')
+
+    def testServerOptOut(self):
+        self.rm.sign = True
+        self.rm.defaults.servers['other'].sign = False
+        signatures = self.get_signatures(['pypi', 'other'])
+        self.assertEqual(sorted(signatures), ['pypi'])
+
+    def testSetuptoolsSignsItself(self):
+        self.rm.sign = True
+        self.rm.nativeupload = False
+        signatures = self.get_signatures(['pypi', 'jarn.com:public'])
+        self.assertEqual(sorted(signatures), ['jarn.com:public'])
+
+    def testWarnRepeatedSigning(self):
+        self.rm.sign = True
+        self.rm.nativeupload = False
+        saved = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            self.get_signatures(['pypi', 'other'])
+            self.assertEqual(sys.stderr.getvalue(),
+                'WARNING: Signing 2 times, setuptools signs for every index server; '
+                'set native-upload = yes to sign once\n')
+        finally:
+            sys.stderr = saved
+
+    def testNoWarningWhenSigningOnce(self):
+        self.rm.sign = True
+        self.rm.nativeupload = False
+        saved = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            self.get_signatures(['pypi'])
+            self.assertEqual(sys.stderr.getvalue(), '')
+        finally:
+            sys.stderr = saved
+
+
+class MockSCM(object):
+
+    def __init__(self):
+        self.checked = []
+
+    def check_tag_exists(self, dir, tagid):
+        self.checked.append(tagid)
+
+
+class CheckTagExistsTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.rm = ReleaseMaker([])
+        self.rm.history = History(os.path.join(self.tempdir, 'history.sqlite'))
+        self.rm.history.add('foo', '1.0', '1.0', 'git@example.com:foo', 'foo-1.0.zip', 'abc')
+        self.rm.scm = MockSCM()
+
+    def tearDown(self):
+        self.rm.history.close()
+        JailSetup.tearDown(self)
+
+    @quiet
+    def testKnownTag(self):
+        # The tag may have been deleted since; the SCM decides
+        self.rm.check_tag_exists(self.tempdir, 'foo', '1.0', 'git@example.com:foo')
+        self.assertEqual(self.rm.scm.checked, ['1.0'])
+
+    def testUnknownTag(self):
+        self.rm.check_tag_exists(self.tempdir, 'foo', '1.1', 'git@example.com:foo')
+        self.assertEqual(self.rm.scm.checked, ['1.1'])
+
+    def testOtherRepository(self):
+        self.rm.check_tag_exists(self.tempdir, 'foo', '1.0', 'git@example.com:fork')
+        self.assertEqual(self.rm.scm.checked, ['1.0'])
+
+
+class RecordReleaseTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.rm = ReleaseMaker([])
+        self.rm.history = History(os.path.join(self.tempdir, 'history.sqlite'))
+        self.rm.locations.extend(['public'])
+        self.mkfile('foo-1.0.zip', 'foo')
+
+    def tearDown(self):
+        self.rm.history.close()
+        JailSetup.tearDown(self)
+
+    def record(self):
+        self.rm.record_release('foo-1.0.zip', 'foo', '1.0', '1.0', '',
+                               {'sha256': 'abc', 'size': 3})
+
+    def testRecord(self):
+        self.record()
+        releases = self.rm.history.find('foo', '1.0')
+        self.assertEqual(len(releases), 1)
+        self.assertEqual(releases[0]['locations'], ['public'])
+        self.assertEqual(self.rm.result['locations'], ['public'])
+
+    def testDryRun(self):
+        self.rm.skipupload = True
+        self.record()
+        self.assertEqual(self.rm.history.find('foo', '1.0'), [])
+        self.assertEqual(self.rm.result['locations'], [])
+
+
+class UploadTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.servers = [IndexServer(), IndexServer()]
+        self.mkfile('.pypirc', '[distutils]\nindex-servers =\n    one\n    two\n' +
+                    self.servers[0].get_pypirc('one') + self.servers[1].get_pypirc('two'))
+        self.mkfile('.mkrelease', '[mkrelease]\nnative-upload = yes\n')
+        self.jail_home()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        GitSetup.tearDown(self)
+
+    def release(self, *args):
+        args = ['-CTqe', '--git', '-d', 'one', '-d', 'two'] + list(args) + [self.packagedir]
+        return ReleaseMaker(args).run()
+
+    def uploads(self):
+        return [sorted(server.files.get('testpackage', {})) for server in self.servers]
+
+    @quiet
+    def testNative(self):
+        self.release()
+        self.assertEqual(self.uploads(), [['testpackage-2.6.zip'], ['testpackage-2.6.zip']])
+        self.assertEqual([len(server.requests) for server in self.servers], [2, 2])
+
+    @quiet
+    def testSetuptools(self):
+        self.mkfile('.mkrelease', '[mkrelease]\nnative-upload = no\n')
+        self.release()
+        self.assertEqual(self.uploads(), [['testpackage-2.6.zip'], ['testpackage-2.6.zip']])
+
+    @quiet
+    def testSidecar(self):
+        mirror = os.path.join(self.tempdir, 'mirror')
+        self.release('-d', mirror)
+        self.assertEqual(sorted(os.listdir(mirror)),
+                         ['testpackage-2.6.zip', 'testpackage-2.6.zip.sha256'])
+        self.assertEqual(self.uploads(), [['testpackage-2.6.zip'], ['testpackage-2.6.zip']])
+        # The sandbox stays clean
+        self.failIf(os.path.exists(os.path.join(
+            self.packagedir, 'dist', 'testpackage-2.6.zip.sha256')))
+
+    @quiet
+    def testStream(self):
+        mirror = os.path.join(self.tempdir, 'mirror')
+        self.release('--stream', '-d', mirror)
+        self.assertEqual(sorted(os.listdir(mirror)),
+                         ['testpackage-2.6.zip', 'testpackage-2.6.zip.sha256'])
+        self.assertEqual(self.uploads(), [['testpackage-2.6.zip'], ['testpackage-2.6.zip']])
+        with open(os.path.join(mirror, 'testpackage-2.6.zip'), 'rb') as file:
+            self.assertEqual(self.servers[0].files['testpackage']['testpackage-2.6.zip'],
+                             file.read())
+
+    @quiet
+    def testRedistribute(self):
+        mirror = os.path.join(self.tempdir, 'mirror')
+        self.mkfile('.mkrelease', '[mkrelease]\nnative-upload = yes\nstore-size = 100\n')
+        ReleaseMaker(['-CTqe', '--git', '-d', 'one', self.packagedir]).run()
+        # No sandbox, no build
+        shutil.rmtree(self.packagedir)
+        ReleaseMaker(['--redistribute', 'testpackage==2.6', '-d', 'two', '-d', mirror]).run()
+        content = self.servers[0].files['testpackage']['testpackage-2.6.zip']
+        self.assertEqual(self.servers[1].files['testpackage']['testpackage-2.6.zip'], content)
+        with open(os.path.join(mirror, 'testpackage-2.6.zip'), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    @quiet
+    def testRedistributeUnknown(self):
+        self.assertRaises(SystemExit, ReleaseMaker(
+            ['--redistribute', 'testpackage==3.0', '-d', 'two']).run)
+
+    @quiet
+    def testConflict(self):
+        self.servers[1].files['testpackage'] = {'testpackage-2.6.zip': 'other'}
+        self.assertRaises(SystemExit, self.release)
+        self.assertEqual([len(server.requests) for server in self.servers], [0, 0])
+
+    @quiet
+    def testHistory(self):
+        self.mkfile('.mkrelease', '[mkrelease]\nnative-upload = yes\n'
+                    'history = %s\n' % os.path.join(self.tempdir, '.mkrelease-history.sqlite'))
+        self.release()
+        history = History(os.path.join(self.tempdir, '.mkrelease-history.sqlite'))
+        releases = history.find('testpackage', '2.6', ['two'])
+        self.assertEqual(len(releases), 1)
+        self.assertEqual(releases[0]['locations'], ['one', 'two'])
+        self.assertEqual(releases[0]['filename'], 'testpackage-2.6.zip')
+        phases = [phase for phase, seconds in releases[0]['phases']]
+        for phase in ('egg_info', 'dist', 'upload one', 'upload two'):
+            self.failUnless(phase in phases, phase)
+        history.close()
+        ReleaseMaker(['--history', 'testpackage', '-d', 'one']).run()
+
+    @quiet
+    def testHistoryOff(self):
+        self.release()
+        self.failIf(os.path.exists(os.path.join(self.tempdir, '.mkrelease-history.sqlite')))
+        self.assertRaises(SystemExit, ReleaseMaker(['--history']).run)
+
+    @quiet
+    def testTimings(self):
+        report = os.path.join(self.tempdir, 'timings.json')
+        self.release('--timings', '--timings-report', report)
+        with open(report) as file:
+            timings = json.load(file)
+        self.assertEqual(timings['status'], 0)
+        phases = [phase['name'] for phase in timings['phases']]
+        for phase in ('get_python', 'get_options', 'get_scm', 'get_package',
+                      'egg_info', 'dist', 'upload one', 'upload two', 'make_release'):
+            self.failUnless(phase in phases, phase)
+        self.failUnless(timings['total'] >= max(x['seconds'] for x in timings['phases']))
+
+    @quiet
+    def testTraceCommands(self):
+        rm = ReleaseMaker(['-CTqe', '--git', '-d', 'one', '--trace-commands', self.packagedir])
+        rm.run()
+        self.failIf(Process.tracer is not None)
+        commands = [x['cmd'] for x in rm.tracer.records]
+        self.failUnless([x for x in commands if x.startswith('git ')])
+        self.failUnless([x for x in commands if 'setup.py' in x])
+
+    @quiet
+    def testTraceCommandsBadOption(self):
+        rm = ReleaseMaker(['--trace-commands', '-d', 'nosuchalias', self.packagedir])
+        self.assertRaises(SystemExit, rm.run)
+        self.assertEqual(rm.tracer, None)
+
+    @quiet
+    def testTraceEvents(self):
+        trace = os.path.join(self.tempdir, 'trace.json')
+        mirror = os.path.join(self.tempdir, 'mirror')
+        self.release('--stream', '-d', mirror, '--trace-events', trace)
+        with open(trace) as file:
+            events = json.load(file)['traceEvents']
+        spans = dict((x['name'], x) for x in events if x['ph'] == 'X')
+        for name in ('get_options', 'make_release', 'dist', 'git rev-parse',
+                     'upload one', 'upload two', 'upload %s' % mirror):
+            self.failUnless(name in spans, name)
+        # Streamed uploads run on their own lanes
+        self.assertNotEqual(spans['upload one']['tid'], spans['make_release']['tid'])
+        self.assertNotEqual(spans['upload one']['tid'], spans['upload two']['tid'])
+
+    @quiet
+    def testProfile(self):
+        profile = os.path.join(self.tempdir, 'mkrelease.prof')
+        rc = main(['--profile', profile, '--profile-setup-py', '-CTqe', '--git',
+                   '-d', 'one', self.packagedir])
+        self.assertEqual(rc, 0)
+        files = set(x[0] for x in pstats.Stats(profile).stats)
+        self.failUnless([x for x in files if x.endswith('mkrelease.py')])
+        self.failUnless([x for x in files if x.endswith('setup.py')])
+
+    @quiet
+    def testTimingsFailure(self):
+        report = os.path.join(self.tempdir, 'timings.json')
+        self.servers[1].failures = [500, 500]
+        self.assertRaises(SystemExit, self.release, '--timings-report', report)
+        with open(report) as file:
+            self.assertEqual(json.load(file)['status'], 1)
+
+    @quiet
+    def testServerFails(self):
+        # The index query is allowed to fail, the register is not
+        self.servers[1].failures = [500, 500]
+        self.assertRaises(SystemExit, self.release)
+        self.assertEqual(self.uploads(), [['testpackage-2.6.zip'], []])
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
 
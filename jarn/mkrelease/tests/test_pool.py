@@ -0,0 +1,42 @@
+import unittest
+import threading
+
+from jarn.mkrelease.pool import parallel_map
+
+
+class ParallelMapTests(unittest.TestCase):
+
+    def testResultsInOrder(self):
+        self.assertEqual(parallel_map(lambda x: x * 2, [1, 2, 3]), [2, 4, 6])
+
+    def testEmpty(self):
+        self.assertEqual(parallel_map(lambda x: x, []), [])
+
+    def testWorkers(self):
+        seen = set()
+        def func(x):
+            seen.add(threading.current_thread().name)
+            return x
+        self.assertEqual(parallel_map(func, range(10), workers=2), range(10))
+        self.failUnless(len(seen) <= 2)
+
+    def testReraises(self):
+        def func(x):
+            if x > 1:
+                raise ValueError(x)
+            return x
+        try:
+            parallel_map(func, [1, 2, 3])
+        except ValueError, e:
+            self.assertEqual(e.args, (2,))
+        else:
+            self.fail('ValueError not raised')
+
+    def testReraisesSystemExit(self):
+        def func(x):
+            raise SystemExit(1)
+        self.assertRaises(SystemExit, parallel_map, func, [1])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
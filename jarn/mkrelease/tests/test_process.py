@@ -1,7 +1,11 @@
 import unittest
 import os
+import time
 
 from jarn.mkrelease.process import Process
+from jarn.mkrelease.process import AsyncProcess
+from jarn.mkrelease.tee import Loop
+from jarn.mkrelease.tee import Before
 
 from jarn.mkrelease.testing import JailSetup
 from jarn.mkrelease.testing import quiet
@@ -50,6 +54,42 @@ class PopenTests(unittest.TestCase):
         self.assertEqual(lines, [])
 
 
+class RunTests(unittest.TestCase):
+
+    def test_simple(self):
+        process = Process(quiet=True)
+        results = process.run([process.command('echo foo'),
+                               process.command('echo bar; exit 3'),
+                               process.command('printf "a\\nb"')])
+        self.assertEqual(results, [(0, ['foo']), (3, ['bar']), (0, ['a', 'b'])])
+
+    def test_concurrent(self):
+        process = Process(quiet=True)
+        started = time.time()
+        process.run([process.command('sleep 0.3') for x in range(3)])
+        self.failUnless(time.time() - started < 0.8)
+
+    def test_jobs(self):
+        process = Process(quiet=True)
+        started = time.time()
+        process.run([process.command('sleep 0.2') for x in range(3)], jobs=1)
+        self.failUnless(time.time() - started >= 0.6)
+
+    def test_filters(self):
+        process = Process()
+        echo = [Before('b'), Before('b')]
+        results = process.run([process.command('printf "a\\nb\\nc\\n"', echo=echo[0]),
+                               process.command('printf "b\\nc\\n"', echo=echo[1])])
+        self.assertEqual(results, [(0, ['a', 'b', 'c']), (0, ['b', 'c'])])
+        self.assertEqual([x.echo for x in echo], [False, False])
+
+    def test_large_output(self):
+        process = Process(quiet=True)
+        results = process.run([process.command('seq 100000'), process.command('seq 3')])
+        self.assertEqual(len(results[0][1]), 100000)
+        self.assertEqual(results[1], (0, ['1', '2', '3']))
+
+
 class PipeTests(unittest.TestCase):
 
     def test_simple(self):
@@ -129,6 +169,99 @@ class OsSystemTests(JailSetup):
         self.assertNotEqual(rc, 0)
 
 
+class FeedTests(JailSetup):
+
+    def test_simple(self):
+        process = Process()
+        rc = process.feed('cat > output', iter(['Hello ', 'world']))
+        self.assertEqual(rc, 0)
+        self.assertEqual(process.pipe('cat output'), 'Hello world')
+
+    def test_quiet(self):
+        process = Process(quiet=True)
+        rc = process.feed('cat', iter(['Hello world']))
+        self.assertEqual(rc, 0)
+
+    def test_env(self):
+        env = {'HELLO': 'Hello world'}
+        process = Process(env=env)
+        rc = process.feed('cat > /dev/null; echo ${HELLO} > output', iter(['x']))
+        self.assertEqual(rc, 0)
+        self.assertEqual(process.pipe('cat output'), 'Hello world')
+
+    def test_closed_stdin(self):
+        process = Process(quiet=True)
+        rc = process.feed('exit 3', iter(['x' * 1024 * 1024] * 4))
+        self.assertEqual(rc, 3)
+
+
+class AsyncProcessTests(JailSetup):
+
+    def test_popen(self):
+        process = AsyncProcess(quiet=True)
+        future = process.popen('echo foo; exit 3')
+        self.assertEqual(future.result(), (3, ['foo']))
+
+    def test_pipe(self):
+        process = AsyncProcess()
+        self.assertEqual(process.pipe('echo "Hello world"').result(), 'Hello world')
+        self.assertEqual(process.pipe('exit 1').result(), '')
+
+    def test_system(self):
+        process = AsyncProcess(quiet=True)
+        self.assertEqual(process.system('exit 3').result(), 3)
+
+    def test_concurrent(self):
+        process = AsyncProcess(quiet=True)
+        started = time.time()
+        futures = [process.popen('sleep 0.3') for x in range(3)]
+        self.assertEqual([x.result() for x in futures], [(0, [])] * 3)
+        self.failUnless(time.time() - started < 0.8)
+
+    def test_jobs(self):
+        process = AsyncProcess(quiet=True, loop=Loop(jobs=1))
+        started = time.time()
+        futures = [process.popen('sleep 0.2') for x in range(3)]
+        futures[-1].result()
+        self.failUnless(time.time() - started >= 0.6)
+
+    def test_cwd(self):
+        os.mkdir('foo')
+        process = AsyncProcess(loop=Loop(jobs=1))
+        first = process.popen('sleep 0.1', echo=False)
+        os.chdir('foo')
+        second = process.pipe('pwd')
+        os.chdir(self.tempdir)
+        # Queued commands run where they were started
+        self.assertEqual(second.result(), os.path.join(self.tempdir, 'foo'))
+        first.result()
+
+    def test_large_output(self):
+        process = AsyncProcess(quiet=True)
+        futures = [process.popen('seq 100000'), process.popen('seq 3')]
+        self.assertEqual(futures[1].result(), (0, ['1', '2', '3']))
+        self.assertEqual(len(futures[0].result()[1]), 100000)
+
+    @quiet
+    def test_result_raises_once(self):
+        process = Process()
+        calls = []
+
+        def check((rc, lines)):
+            calls.append(rc)
+            raise SystemExit(rc)
+        future = process.start('exit 2').then(check)
+        self.assertRaises(SystemExit, future.result)
+        self.assertRaises(SystemExit, future.result)
+        self.assertEqual(calls, [2])
+
+    def test_wait(self):
+        process = Process(quiet=True)
+        future = process.start('echo foo > output').then(lambda x: 1/0)
+        future.wait()
+        self.assertEqual(process.pipe('cat output'), 'foo')
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
 
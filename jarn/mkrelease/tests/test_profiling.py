@@ -0,0 +1,83 @@
+import unittest
+import os
+import shutil
+import pstats
+
+from jarn.mkrelease.profiling import Profiler
+from jarn.mkrelease.mkrelease import get_profile_options
+from jarn.mkrelease.setuptools import Setuptools
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+
+
+def work():
+    return sum(range(100))
+
+
+class GetProfileOptionsTests(unittest.TestCase):
+
+    def testNone(self):
+        self.assertEqual(get_profile_options(['-n', '.']), ('', False))
+
+    def testEquals(self):
+        self.assertEqual(get_profile_options(['--profile=out.prof', '.']), ('out.prof', False))
+
+    def testSeparate(self):
+        self.assertEqual(get_profile_options(['--profile', 'out.prof', '--profile-setup-py']),
+                         ('out.prof', True))
+
+    def testDashDash(self):
+        self.assertEqual(get_profile_options(['--', '--profile=out.prof']), ('', False))
+
+
+class ProfilerTests(JailSetup):
+
+    def get_functions(self, filename):
+        return [x[2] for x in pstats.Stats(filename).stats]
+
+    def testRun(self):
+        self.assertEqual(Profiler('out.prof').run(work), 4950)
+        self.failUnless('work' in self.get_functions('out.prof'))
+
+    def testRunExit(self):
+        def exit():
+            work()
+            raise SystemExit(1)
+        self.assertRaises(SystemExit, Profiler('out.prof').run, exit)
+        self.failUnless('work' in self.get_functions('out.prof'))
+
+    def testChildren(self):
+        Profiler('child.prof').run(work)
+        dirs = []
+        def child():
+            dirs.append(Setuptools.profiledir)
+            shutil.copy('child.prof', Setuptools.profiledir)
+            # Empty files from failed children are skipped
+            open(os.path.join(Setuptools.profiledir, 'failed.prof'), 'w').close()
+        Profiler('out.prof', children=True).run(child)
+        self.assertEqual(Setuptools.profiledir, None)
+        self.failIf(os.path.exists(dirs[0]))
+        functions = self.get_functions('out.prof')
+        self.failUnless('work' in functions)
+        self.failUnless('child' in functions)
+
+    def testSetupPyCommand(self):
+        commands = []
+        def func(cmd):
+            commands.append(cmd)
+            return 0, []
+        setuptools = Setuptools(MockProcess(func=func))
+        Setuptools.profiledir = self.tempdir
+        try:
+            setuptools._run_setup_py(['egg_info'])
+            setuptools._run_setup_py(['egg_info'], ff='git')
+        finally:
+            Setuptools.profiledir = None
+        self.failUnless(' -m cProfile -o "%s/' % self.tempdir in commands[0])
+        self.failUnless(commands[0].endswith('.prof" setup.py egg_info'))
+        self.failUnless("cProfile.run('import setup', '%s/" % self.tempdir in commands[1])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
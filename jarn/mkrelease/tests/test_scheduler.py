@@ -0,0 +1,204 @@
+import unittest
+import os
+
+from os.path import join
+
+from jarn.mkrelease.scheduler import get_waves, Scheduler
+from jarn.mkrelease.setuptools import Setuptools
+from jarn.mkrelease.mkrelease import ReleaseMaker
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+SETUP_PY = """\
+from setuptools import setup
+setup(name=%r, version='1.0', install_requires=%r)
+"""
+
+
+class MockSetuptools(object):
+
+    def __init__(self, packages):
+        self.packages = packages
+
+    def get_requirements(self, dirs, jobs=None):
+        return [self.packages[os.path.basename(x)] for x in dirs]
+
+
+class WavesTests(unittest.TestCase):
+
+    def testEmpty(self):
+        self.assertEqual(get_waves({}), [])
+
+    def testIndependent(self):
+        self.assertEqual(get_waves({'b': [], 'a': [], 'c': []}), [['a', 'b', 'c']])
+
+    def testChain(self):
+        self.assertEqual(get_waves({'a': ['b'], 'b': ['c'], 'c': []}),
+                         [['c'], ['b'], ['a']])
+
+    def testDiamond(self):
+        self.assertEqual(get_waves({'a': ['b', 'c'], 'b': ['d'], 'c': ['d'], 'd': []}),
+                         [['d'], ['b', 'c'], ['a']])
+
+    def testExternal(self):
+        self.assertEqual(get_waves({'a': ['b', 'six'], 'b': ['setuptools']}),
+                         [['b'], ['a']])
+
+    def testSelf(self):
+        self.assertEqual(get_waves({'a': ['a']}), [['a']])
+
+    @quiet
+    def testCycle(self):
+        self.assertRaises(SystemExit, get_waves, {'a': ['b'], 'b': ['c'], 'c': ['a'], 'd': []})
+
+    @quiet
+    def testCycleMessage(self):
+        try:
+            get_waves({'x': ['a'], 'a': ['b'], 'b': ['a']})
+        except SystemExit, e:
+            self.assertEqual(e.msg, 'Dependency cycle: a -> b -> a')
+        else:
+            self.fail('SystemExit not raised')
+
+
+class RequirementsTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        for dir, name, requires in (('a', 'my.a', ['My_B>=1.0', 'six']),
+                                    ('b', 'my.b', [])):
+            os.mkdir(dir)
+            self.mkfile(join(dir, 'setup.py'), SETUP_PY % (name, requires))
+
+    def testGetRequirements(self):
+        st = Setuptools()
+        self.assertEqual(st.get_requirements(['a', 'b']),
+                         [('my.a', ['My-B', 'six']), ('my.b', [])])
+
+    @quiet
+    def testBadSetup(self):
+        os.mkdir('c')
+        self.mkfile(join('c', 'setup.py'), 'raise SystemExit(1)\n')
+        st = Setuptools()
+        self.assertRaises(SystemExit, st.get_requirements, ['a', 'c'])
+
+    @quiet
+    def testPlan(self):
+        scheduler = Scheduler()
+        self.assertEqual(scheduler.get_plan(['a', 'b']), [['my-b'], ['my-a']])
+        self.assertEqual(scheduler.dirs['my-a'], join(self.tempdir, 'a'))
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.commands = []
+        self.failing = []
+        self.setuptools = MockSetuptools({
+            'base': ('my.base', []),
+            'other': ('my.other', []),
+            'mid': ('my.mid', ['my.base']),
+            'app': ('my.app', ['my.mid', 'six']),
+            'tool': ('my.tool', ['my.other']),
+        })
+
+    def func(self, cmd):
+        self.commands.append(cmd)
+        for dir in self.failing:
+            if cmd.endswith('/%s 2>&1' % dir):
+                return 1, ['Failed']
+        return 0, ['done']
+
+    def get_scheduler(self):
+        return Scheduler(MockProcess(func=self.func), self.setuptools)
+
+    def get_released(self):
+        return [x.split()[-2].split('/')[-1] for x in self.commands]
+
+    @quiet
+    def testRelease(self):
+        scheduler = self.get_scheduler()
+        scheduler.run(['/app', '/mid', '/base', '/other', '/tool'], ['-n'])
+        self.assertEqual(self.get_released(), ['base', 'other', 'mid', 'tool', 'app'])
+        self.failUnless(' -m jarn.mkrelease.mkrelease -n -- /base 2>&1' in self.commands[0])
+
+    @quiet
+    def testFailure(self):
+        self.failing = ['base']
+        scheduler = self.get_scheduler()
+        self.assertRaises(SystemExit, scheduler.run,
+                          ['/app', '/mid', '/base', '/other', '/tool'], [])
+        self.assertEqual(self.get_released(), ['base', 'other', 'tool'])
+
+    @quiet
+    def testSkipped(self):
+        self.failing = ['mid']
+        scheduler = self.get_scheduler()
+        waves = scheduler.get_plan(['/app', '/mid', '/base'])
+        released, failed, skipped = scheduler.release(waves, [])
+        self.assertEqual(released, ['my-base'])
+        self.assertEqual(failed, ['my-mid'])
+        self.assertEqual(skipped, {'my-app': 'my-mid'})
+
+    @quiet
+    def testPlan(self):
+        scheduler = self.get_scheduler()
+        scheduler.run(['/app', '/mid', '/base'], ['-n'], plan=True)
+        self.assertEqual(self.commands, [])
+
+    @quiet
+    def testDuplicate(self):
+        self.setuptools.packages['copy'] = ('My_Base', [])
+        scheduler = self.get_scheduler()
+        self.assertRaises(SystemExit, scheduler.get_plan, ['/base', '/copy'])
+
+
+class OptionsTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        os.mkdir('a')
+        self.mkfile(join('a', 'setup.py'))
+
+    def testStackOptions(self):
+        rm = ReleaseMaker(['--stack', '-n', '-j', '2', '-d', 'foo', '--git', 'a'])
+        rm.get_options()
+        self.assertEqual(rm.stackargs, ['a'])
+        self.assertEqual(rm.stackoptions, ['-n', '-d', 'foo', '--git'])
+        self.assertEqual(rm.jobs, 2)
+
+    def testStripOutputFiles(self):
+        rm = ReleaseMaker(['--stack', '-n', '--timings', '--timings-report=t.json',
+                           '--trace-events', 'e.json', '--profile=p.prof',
+                           '--profile-setup-py', 'a'])
+        rm.get_options()
+        self.assertEqual(rm.stackoptions, ['-n', '--timings'])
+
+    @quiet
+    def testConflicts(self):
+        for option in ('--sync', '--history', '--serve', '--redistribute=a==1.0'):
+            rm = ReleaseMaker(['--stack', option, 'a'])
+            self.assertRaises(SystemExit, rm.get_options)
+
+    def testPlanImpliesStack(self):
+        rm = ReleaseMaker(['--plan', 'a'])
+        rm.get_options()
+        self.assertEqual(rm.stack, True)
+        self.assertEqual(rm.plan, True)
+
+    @quiet
+    def testNoSandboxes(self):
+        rm = ReleaseMaker(['--stack'])
+        self.assertRaises(SystemExit, rm.get_options)
+
+    @quiet
+    def testNoSetupPy(self):
+        os.mkdir('b')
+        rm = ReleaseMaker(['--stack', 'a', 'b'])
+        self.assertRaises(SystemExit, rm.get_options)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,281 @@
+import unittest
+import time
+import re
+
+from jarn.mkrelease.scp import SCP
+from jarn.mkrelease.scp import TransferTimer
+from jarn.mkrelease.scp import format_rate
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+
+class NoSleep(object):
+    """Replace time.sleep for the duration of a test."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __enter__(self):
+        self.saved = time.sleep
+        time.sleep = self.calls.append
+        return self
+
+    def __exit__(self, *ignored):
+        time.sleep = self.saved
+
+
+class RunScpTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'foo')
+
+    def testScp(self):
+        process = MockProcess()
+        scp = SCP(process)
+        self.assertEqual(scp.run_scp('foo.zip', 'jarn.com:/var/dist'), 0)
+
+    def testScpExtras(self):
+        commands = []
+        process = MockProcess(func=lambda cmd: commands.append(cmd) or (0, []))
+        scp = SCP(process)
+        self.assertEqual(scp.run_scp('foo.zip', 'jarn.com:/var/dist',
+                                     ['foo.zip.asc', 'foo.zip.sha256']), 0)
+        self.assertEqual(commands,
+            ['scp "foo.zip" "foo.zip.asc" "foo.zip.sha256" "jarn.com:/var/dist"'])
+
+    @quiet
+    def testScpFails(self):
+        process = MockProcess(rc=1)
+        scp = SCP(process)
+        self.assertRaises(SystemExit, scp.run_scp, 'foo.zip', 'jarn.com:/var/dist')
+
+    def testNoSleepQuiet(self):
+        process = MockProcess()
+        scp = SCP(process)
+        with NoSleep() as sleep:
+            scp.run_scp('foo.zip', 'jarn.com:/var/dist')
+            scp.run_sftp('foo.zip', 'jarn.com:/var/dist')
+        self.assertEqual(sleep.calls, [])
+
+    @quiet
+    def testNoSleep(self):
+        process = MockProcess()
+        process.quiet = False
+        scp = SCP(process)
+        with NoSleep() as sleep:
+            scp.run_scp('foo.zip', 'jarn.com:/var/dist')
+            scp.run_sftp('foo.zip', 'jarn.com:/var/dist')
+        self.assertEqual(sleep.calls, [])
+
+
+class SftpRecorder(object):
+    """Record sftp sessions and their batch files."""
+
+    def __init__(self, rc=0):
+        self.rc = rc
+        self.sessions = []
+        self.batchmode = []
+
+    def __call__(self, cmd):
+        match = re.match(r'sftp (-o BatchMode=yes )?-b "(.*)" "(.*)"', cmd)
+        if match is not None:
+            with open(match.group(2), 'rt') as file:
+                batch = file.read().strip().split('\n')
+            self.sessions.append((match.group(3), batch))
+            self.batchmode.append(bool(match.group(1)))
+            return self.rc, []
+
+
+class RunSftpBatchTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'foo')
+        self.mkfile('foo.zip.asc', 'sig')
+
+    def testSingleFile(self):
+        recorder = SftpRecorder()
+        scp = SCP(MockProcess(func=recorder))
+        scp.run_sftp('foo.zip', 'jarn.com:/var/dist')
+        self.assertEqual(recorder.sessions, [
+            ('jarn.com', [
+                '-mkdir "/var"',
+                '-mkdir "/var/dist"',
+                'put "foo.zip" "/var/dist/.foo.zip.part"',
+                'rename "/var/dist/.foo.zip.part" "/var/dist/foo.zip"',
+                'bye',
+            ])])
+        # A single session may prompt
+        self.assertEqual(recorder.batchmode, [False])
+
+    def testOneSessionPerHost(self):
+        recorder = SftpRecorder()
+        scp = SCP(MockProcess(func=recorder))
+        scp.run_sftp_batch(['foo.zip', 'foo.zip.asc'], [
+            'jarn.com:public', 'fred@jarn.com:public', 'jarn.com:customerA'])
+        self.assertEqual(recorder.sessions, [
+            ('jarn.com', [
+                '-mkdir "public"',
+                'put "foo.zip" "public/.foo.zip.part"',
+                'rename "public/.foo.zip.part" "public/foo.zip"',
+                'put "foo.zip.asc" "public/.foo.zip.asc.part"',
+                'rename "public/.foo.zip.asc.part" "public/foo.zip.asc"',
+                '-mkdir "customerA"',
+                'put "foo.zip" "customerA/.foo.zip.part"',
+                'rename "customerA/.foo.zip.part" "customerA/foo.zip"',
+                'put "foo.zip.asc" "customerA/.foo.zip.asc.part"',
+                'rename "customerA/.foo.zip.asc.part" "customerA/foo.zip.asc"',
+                'bye',
+            ]),
+            ('fred@jarn.com', [
+                '-mkdir "public"',
+                'put "foo.zip" "public/.foo.zip.part"',
+                'rename "public/.foo.zip.part" "public/foo.zip"',
+                'put "foo.zip.asc" "public/.foo.zip.asc.part"',
+                'rename "public/.foo.zip.asc.part" "public/foo.zip.asc"',
+                'bye',
+            ])])
+        # Concurrent sessions must not prompt
+        self.assertEqual(recorder.batchmode, [True, True])
+
+    def testDuplicateLocation(self):
+        recorder = SftpRecorder()
+        scp = SCP(MockProcess(func=recorder))
+        scp.run_sftp_batch(['foo.zip'], ['jarn.com:', 'jarn.com:'])
+        self.assertEqual(recorder.sessions, [
+            ('jarn.com', [
+                'put "foo.zip" ".foo.zip.part"',
+                'rename ".foo.zip.part" "foo.zip"',
+                'bye',
+            ])])
+
+    @quiet
+    def testSftpFails(self):
+        scp = SCP(MockProcess(func=SftpRecorder(rc=1)))
+        self.assertRaises(SystemExit, scp.run_sftp_batch, ['foo.zip'], ['jarn.com:public'])
+
+
+class RemoteDigestsTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'foo')
+
+    def testMissing(self):
+        scp = SCP(MockProcess(rc=0, lines=[]))
+        self.assertEqual(scp.get_remote_digests('foo.zip', 'jarn.com:public'), {})
+
+    def testSizeDiffers(self):
+        scp = SCP(MockProcess(rc=0, lines=['  42']))
+        self.assertEqual(scp.get_remote_digests('foo.zip', 'jarn.com:public'), {'size': 42})
+
+    def testDigest(self):
+        scp = SCP(MockProcess(rc=0, lines=['3', 'abc  public/foo.zip']))
+        self.assertEqual(scp.get_remote_digests('foo.zip', 'jarn.com:public'),
+                         {'size': 3, 'sha256': 'abc'})
+
+    def testSshFails(self):
+        scp = SCP(MockProcess(rc=255))
+        self.assertEqual(scp.get_remote_digests('foo.zip', 'jarn.com:public'), None)
+
+    def testCommand(self):
+        commands = []
+        def func(cmd):
+            commands.append(cmd)
+            return 0, []
+        scp = SCP(MockProcess(func=func))
+        scp.get_remote_digests('foo.zip', 'fred@jarn.com:/var/dist')
+        self.failUnless(commands[0].startswith('ssh -o BatchMode=yes "fred@jarn.com" '))
+        self.failUnless('"/var/dist/foo.zip"' in commands[0])
+        self.failUnless(' -eq 3; ' in commands[0])
+
+
+class UpdateSimpleIndexTests(JailSetup):
+
+    def testUpdate(self):
+        uploads = []
+        def func(cmd):
+            if cmd.startswith('ssh '):
+                if 'simple/index.html' in cmd:
+                    return 0, ['<a href="bar/">bar</a>']
+                return 0, []
+            if cmd.startswith('sftp '):
+                batch = open(re.match(r'sftp -b "(.*)" ', cmd).group(1)).read()
+                for local in re.findall(r'put "(.*?)"', batch):
+                    uploads.append(open(local).read())
+                uploads.append(batch)
+                return 0, []
+        scp = SCP(MockProcess(func=func))
+        scp.update_simple_index('jarn.com:/var/dist', 'foo', 'foo-1.0.zip', 'aaa')
+        self.assertEqual(len(uploads), 3)
+        self.failUnless('href="../../foo-1.0.zip#sha256=aaa"' in uploads[0])
+        self.failUnless('href="bar/"' in uploads[1])
+        self.failUnless('href="foo/"' in uploads[1])
+        self.failUnless('rename "/var/dist/simple/foo/.index.html.part" '
+                        '"/var/dist/simple/foo/index.html"' in uploads[2])
+        self.failUnless('rename "/var/dist/simple/.index.html.part" '
+                        '"/var/dist/simple/index.html"' in uploads[2])
+
+    @quiet
+    def testSshFails(self):
+        scp = SCP(MockProcess(rc=255))
+        self.assertRaises(SystemExit, scp.update_simple_index,
+                          'jarn.com:/var/dist', 'foo', 'foo-1.0.zip', 'aaa')
+
+
+class ListFilesTests(unittest.TestCase):
+
+    def testList(self):
+        commands = []
+        def func(cmd):
+            commands.append(cmd)
+            return 0, ['3 abc  foo-1.0.zip', '4 def  foo-1.1.tar.gz', '']
+        scp = SCP(MockProcess(func=func))
+        self.assertEqual(scp.list_files('jarn.com:/var/dist', ('*.zip', '*.tar.gz')), {
+            'foo-1.0.zip': {'size': 3, 'sha256': 'abc'},
+            'foo-1.1.tar.gz': {'size': 4, 'sha256': 'def'},
+        })
+        self.failUnless('cd "/var/dist" 2>/dev/null || exit 1;' in commands[0])
+        self.failUnless('for f in *.zip *.tar.gz;' in commands[0])
+
+    def testListMissingOk(self):
+        commands = []
+        scp = SCP(MockProcess(func=lambda cmd: commands.append(cmd) or (0, [])))
+        self.assertEqual(scp.list_files('jarn.com:/var/dist', ('*.zip',), True), {})
+        self.failUnless('cd "/var/dist" 2>/dev/null || exit 0;' in commands[0])
+
+    @quiet
+    def testListFails(self):
+        scp = SCP(MockProcess(rc=255))
+        self.assertRaises(SystemExit, scp.list_files, 'jarn.com:/var/dist', ('*.zip',))
+
+    def testFetch(self):
+        commands = []
+        scp = SCP(MockProcess(func=lambda cmd: commands.append(cmd) or (0, [])))
+        self.assertEqual(scp.run_fetch('jarn.com:/var/dist', 'foo-1.0.zip', '/tmp/x'),
+                         '/tmp/x/foo-1.0.zip')
+        self.assertEqual(commands, ['scp "jarn.com:/var/dist/foo-1.0.zip" "/tmp/x/foo-1.0.zip"'])
+
+
+class TransferTimerTests(unittest.TestCase):
+
+    def testDuration(self):
+        timer = TransferTimer()
+        self.assertEqual(timer('sftp> put "foo.zip" "bar"'), False)
+        timer.times[-1] = (timer.times[-1][0], 10.0)
+        timer('sftp> rename "bar" "baz"')
+        timer.times[-1] = (timer.times[-1][0], 12.5)
+        self.assertEqual(timer.get_duration('put "foo.zip" "bar"'), 2.5)
+        self.assertEqual(timer.get_duration('rename "bar" "baz"'), 0)
+
+    def testFormatRate(self):
+        self.assertEqual(format_rate(512, 1), '512.0 B/s')
+        self.assertEqual(format_rate(3 * 1024 * 1024, 2), '1.5 MB/s')
+        self.assertEqual(format_rate(1024, 0), 'n/a')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -254,6 +254,21 @@ testpackage.egg-info/top_level.txt""")
         self.failIf(isfile(join(self.packagedir, 'setup.pyc')))
 
 
+class PackageInfoTests(GitSetup):
+
+    def testPackageInfo(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        future = st.start_package_info(self.packagedir)
+        self.assertEqual(future.result(), ('testpackage', '2.6'))
+
+    def testDevelop(self):
+        self.mkfile(join(self.packagedir, 'setup.cfg'), '[egg_info]\ntag_build = .dev0\n')
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        future = st.start_package_info(self.packagedir, develop=True)
+        # setup.cfg is read from the package, wherever result() is called
+        self.assertEqual(future.result(), ('testpackage', '2.6.dev0'))
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
 
@@ -0,0 +1,72 @@
+import unittest
+import os
+
+from os.path import join
+
+from jarn.mkrelease.simpleindex import SimpleIndex
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import readlines
+
+
+class AddTests(JailSetup):
+
+    def testFirstRelease(self):
+        index = SimpleIndex(self.tempdir)
+        changed = index.add('My.Package', 'My.Package-1.0.zip', 'aaa')
+        self.assertEqual(changed, ['simple/my-package/index.html', 'simple/index.html'])
+        self.failUnless('    <a href="../../My.Package-1.0.zip#sha256=aaa">My.Package-1.0.zip</a><br/>'
+                        in readlines(join('simple', 'my-package', 'index.html')))
+        self.failUnless('    <a href="my-package/">My.Package</a><br/>'
+                        in readlines(join('simple', 'index.html')))
+
+    def testSecondRelease(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo-1.0.zip', 'aaa')
+        changed = index.add('foo', 'foo-1.1.zip', 'bbb')
+        self.assertEqual(changed, ['simple/foo/index.html'])
+        self.assertEqual(index.read_links('simple/foo/index.html'), {
+            'foo-1.0.zip': '../../foo-1.0.zip#sha256=aaa',
+            'foo-1.1.zip': '../../foo-1.1.zip#sha256=bbb',
+        })
+
+    def testSameRelease(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo-1.0.zip', 'aaa')
+        self.assertEqual(index.add('foo', 'foo-1.0.zip', 'aaa'), [])
+
+    def testReplacedRelease(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo-1.0.zip', 'aaa')
+        self.assertEqual(index.add('foo', 'foo-1.0.zip', 'bbb'), ['simple/foo/index.html'])
+        self.assertEqual(index.read_links('simple/foo/index.html'), {
+            'foo-1.0.zip': '../../foo-1.0.zip#sha256=bbb',
+        })
+
+    def testOtherProjectUntouched(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo-1.0.zip', 'aaa')
+        os.utime(join('simple', 'foo', 'index.html'), (0, 0))
+        index.add('bar', 'bar-1.0.zip', 'bbb')
+        self.assertEqual(os.stat(join('simple', 'foo', 'index.html')).st_mtime, 0)
+        self.assertEqual(index.read_links('simple/index.html'), {
+            'bar': 'bar/',
+            'foo': 'foo/',
+        })
+
+    def testNoTempFilesLeft(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo-1.0.zip', 'aaa')
+        self.assertEqual(sorted(os.listdir('simple')), ['foo', 'index.html'])
+        self.assertEqual(os.listdir(join('simple', 'foo')), ['index.html'])
+
+    def testEscaping(self):
+        index = SimpleIndex(self.tempdir)
+        index.add('foo', 'foo&bar-1.0.zip', 'aaa')
+        self.assertEqual(index.read_links('simple/foo/index.html'), {
+            'foo&bar-1.0.zip': '../../foo&bar-1.0.zip#sha256=aaa',
+        })
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import subprocess
+
+from jarn.mkrelease.benchmark import STARTUP_COMMANDS, time_startup
+
+# Generous, to catch regressions like scanning the working set at
+# import time, not to measure
+THRESHOLD = 1.0
+
+HEAVY_MODULES = ('pkg_resources', 'jarn.mkrelease.setuptools', 'jarn.mkrelease.scm',
+                 'jarn.mkrelease.scp', 'jarn.mkrelease.upload', 'jarn.mkrelease.store',
+                 'jarn.mkrelease.history', 'jarn.mkrelease.sync', 'jarn.mkrelease.stream')
+
+SCRIPT = """\
+import sys
+from jarn.mkrelease.mkrelease import main
+main(sys.argv[1:])
+print >>sys.stderr, ' '.join(sorted(m for m in sys.modules if sys.modules[m]))
+"""
+
+
+def get_modules(args):
+    process = subprocess.Popen([sys.executable, '-c', SCRIPT] + args,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return stderr.split()
+
+
+class StartupTests(unittest.TestCase):
+
+    def testListLocations(self):
+        modules = get_modules(['-l'])
+        self.failUnless('jarn.mkrelease.mkrelease' in modules)
+        for name in HEAVY_MODULES:
+            self.failIf(name in modules, name)
+
+    def testHelp(self):
+        modules = get_modules(['--help'])
+        self.failUnless('jarn.mkrelease.mkrelease' in modules)
+        for name in HEAVY_MODULES:
+            self.failIf(name in modules, name)
+
+    def testVersion(self):
+        modules = get_modules(['-v'])
+        self.failUnless('pkg_resources' in modules)
+        self.failIf('jarn.mkrelease.setuptools' in modules)
+
+    def testThreshold(self):
+        for args in STARTUP_COMMANDS:
+            seconds = time_startup(args, repeat=3)
+            self.failUnless(seconds < THRESHOLD, '%s took %.3f s' % (' '.join(args), seconds))
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
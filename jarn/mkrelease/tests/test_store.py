@@ -0,0 +1,106 @@
+import unittest
+import os
+
+from os.path import isfile
+
+from jarn.mkrelease.store import Store
+from jarn.mkrelease.digest import get_digests
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import quiet
+
+
+class StoreTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo-1.0.zip', 'foo')
+        self.mkfile('PKG-INFO', 'Name: foo\n')
+        self.store = Store(os.path.join(self.tempdir, 'store'))
+
+    def testAdd(self):
+        entry = self.store.add('foo-1.0.zip', 'Foo', '1.0', 'foo-1.0', 'PKG-INFO')
+        self.assertEqual(entry['name'], 'foo')
+        self.assertEqual(entry['tag'], 'foo-1.0')
+        self.assertEqual(entry['sha256'], get_digests('foo-1.0.zip')['sha256'])
+        self.failUnless(isfile(self.store.get_object_path(entry['sha256'])))
+        self.failUnless(isfile(self.store.get_object_path(entry['pkginfo'])))
+
+    def testFind(self):
+        self.store.add('foo-1.0.zip', 'foo', '1.0')
+        self.assertEqual(len(self.store.find('Foo', '1.0')), 1)
+        self.assertEqual(self.store.find('foo', '1.1'), [])
+        self.assertEqual(self.store.find('bar', '1.0'), [])
+
+    def testReplace(self):
+        self.store.add('foo-1.0.zip', 'foo', '1.0')
+        self.mkfile('foo-1.0.zip', 'bar')
+        self.store.add('foo-1.0.zip', 'foo', '1.0')
+        entries = self.store.find('foo', '1.0')
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['sha256'], get_digests('foo-1.0.zip')['sha256'])
+
+    def testGetFiles(self):
+        self.store.add('foo-1.0.zip', 'foo', '1.0', pkginfo='PKG-INFO')
+        entry = self.store.find('foo', '1.0')[0]
+        distfile, pkginfo = self.store.get_files(entry, 'out')
+        self.assertEqual(distfile, 'out/foo-1.0.zip')
+        self.assertEqual(pkginfo, 'out/PKG-INFO')
+        with open(distfile) as file:
+            self.assertEqual(file.read(), 'foo')
+
+    def testEvict(self):
+        self.store.maxsize = 5
+        old = self.store.add('foo-1.0.zip', 'foo', '1.0')
+        self.mkfile('foo-1.1.zip', 'food')
+        new = self.store.add('foo-1.1.zip', 'foo', '1.1')
+        self.assertEqual(self.store.find('foo', '1.0'), [])
+        self.assertEqual(len(self.store.find('foo', '1.1')), 1)
+        self.failIf(isfile(self.store.get_object_path(old['sha256'])))
+        self.failUnless(isfile(self.store.get_object_path(new['sha256'])))
+
+    def testKeepNewest(self):
+        # The file just added is kept even if it exceeds the limit
+        self.store.maxsize = 1
+        self.store.add('foo-1.0.zip', 'foo', '1.0')
+        self.assertEqual(len(self.store.find('foo', '1.0')), 1)
+
+    def testSharedObject(self):
+        self.store.maxsize = 5
+        self.store.add('foo-1.0.zip', 'foo', '1.0')
+        self.mkfile('foo-1.1.zip', 'foo')
+        entry = self.store.add('foo-1.1.zip', 'foo', '1.1')
+        self.assertEqual(len(self.store.find('foo', '1.0')), 1)
+        self.failUnless(isfile(self.store.get_object_path(entry['sha256'])))
+
+    @quiet
+    def testBadIndex(self):
+        os.mkdir('store')
+        self.mkfile('store/index.json', '{')
+        self.assertRaises(SystemExit, self.store.find, 'foo', '1.0')
+
+    def testConcurrentWriters(self):
+        # Two processes adding to the same store lose no entries
+        for i in range(20):
+            self.mkfile('foo-1.%d.zip' % i, 'foo%d' % i)
+            self.mkfile('bar-1.%d.zip' % i, 'bar%d' % i)
+        pids = []
+        for name in ('foo', 'bar'):
+            pid = os.fork()
+            if pid == 0:
+                rc = 1
+                try:
+                    store = Store(os.path.join(self.tempdir, 'store'))
+                    for i in range(20):
+                        store.add('%s-1.%d.zip' % (name, i), name, '1.%d' % i)
+                    rc = 0
+                finally:
+                    os._exit(rc)
+            pids.append(pid)
+        for pid in pids:
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(len(self.store.read_index()), 40)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
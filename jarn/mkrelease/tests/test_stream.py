@@ -0,0 +1,118 @@
+import unittest
+import os
+import time
+
+from jarn.mkrelease.stream import Fanout
+from jarn.mkrelease.stream import LocalSink
+from jarn.mkrelease.stream import SSHSink
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+
+class Recorder(object):
+    """A sink collecting the stream."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.blocks = []
+
+    def __call__(self, blocks):
+        for block in blocks:
+            time.sleep(self.delay)
+            self.blocks.append(block)
+
+
+class Failing(object):
+    """A sink giving up after the first block."""
+
+    def __call__(self, blocks):
+        for block in blocks:
+            raise IOError('failing')
+
+
+class FanoutTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('foo.zip', 'abcdefghij')
+
+    def testFanout(self):
+        sinks = [Recorder(), Recorder()]
+        self.assertEqual(Fanout(blocksize=3).run('foo.zip', sinks), 0)
+        for sink in sinks:
+            self.assertEqual(sink.blocks, ['abc', 'def', 'ghi', 'j'])
+
+    def testBackpressure(self):
+        fanout = Fanout(blocksize=1, maxblocks=1)
+        fast, slow = Recorder(), Recorder(delay=0.01)
+        fanout.run('foo.zip', [fast, slow])
+        self.assertEqual(''.join(fast.blocks), 'abcdefghij')
+        self.assertEqual(''.join(slow.blocks), 'abcdefghij')
+
+    def testFailingSink(self):
+        good = Recorder()
+        fanout = Fanout(blocksize=1, maxblocks=1)
+        self.assertRaises(IOError, fanout.run, 'foo.zip', [Failing(), good])
+        self.assertEqual(''.join(good.blocks), 'abcdefghij')
+
+    def testNoSinks(self):
+        self.assertEqual(Fanout().run('foo.zip', []), 0)
+
+
+class LocalSinkTests(JailSetup):
+
+    @quiet
+    def testWrite(self):
+        LocalSink('dist/foo.zip', 'mirror/public')(iter(['foo', 'bar']))
+        self.assertEqual(os.listdir('mirror/public'), ['foo.zip'])
+        with open('mirror/public/foo.zip') as file:
+            self.assertEqual(file.read(), 'foobar')
+
+
+class SSHSinkTests(unittest.TestCase):
+
+    def setUp(self):
+        self.commands = []
+        self.failing = False
+
+    def func(self, cmd):
+        self.commands.append(cmd)
+        if self.failing and cmd.startswith('ssh '):
+            return 1, ['This service allows sftp connections only.']
+        return 0, []
+
+    def testCommand(self):
+        sink = SSHSink('dist/foo.zip', 'jarn.com:/var/dist/public')
+        self.assertEqual(sink.get_command(),
+            'ssh -o BatchMode=yes "jarn.com" '
+            '\'mkdir -p "/var/dist/public" && cat > "/var/dist/public/.foo.zip.part" && '
+            'mv -f "/var/dist/public/.foo.zip.part" "/var/dist/public/foo.zip"\'')
+
+    def testRelativeCommand(self):
+        sink = SSHSink('dist/foo.zip', 'jarn.com:public')
+        self.assertEqual(sink.get_command().split(' ', 4)[-1],
+            '\'mkdir -p "public" && cat > "public/.foo.zip.part" && '
+            'mv -f "public/.foo.zip.part" "public/foo.zip"\'')
+
+    def testStream(self):
+        process = MockProcess(func=self.func)
+        sink = SSHSink('dist/foo.zip', 'jarn.com:public', quiet=True, process=process)
+        sink(iter(['foo', 'bar']))
+        self.assertEqual(process.fed, 'foobar')
+        self.assertEqual(len(self.commands), 1)
+        self.failUnless(self.commands[0].startswith('ssh -o BatchMode=yes "jarn.com" '))
+
+    def testSftpFallback(self):
+        self.failing = True
+        process = MockProcess(func=self.func)
+        sink = SSHSink('dist/foo.zip', 'jarn.com:public', quiet=True, process=process)
+        sink(iter(['foo', 'bar']))
+        self.assertEqual(len(self.commands), 2)
+        self.failUnless(self.commands[1].startswith('sftp -b '))
+        self.failUnless(self.commands[1].endswith(' "jarn.com"'))
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
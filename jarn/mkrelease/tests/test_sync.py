@@ -0,0 +1,145 @@
+import unittest
+import os
+import zipfile
+import tarfile
+
+from os.path import join
+
+from jarn.mkrelease.mkrelease import Locations
+from jarn.mkrelease.urlparser import URLParser
+from jarn.mkrelease.sync import Sync
+from jarn.mkrelease.sync import get_filetype
+from jarn.mkrelease.sync import extract_pkg_info
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import IndexServer
+from jarn.mkrelease.testing import quiet
+
+PKG_INFO = """\
+Metadata-Version: 1.0
+Name: foo
+Version: 1.0
+Summary: Foo
+"""
+
+
+class ServerInfo(object):
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.username = 'fred'
+        self.password = 'secret'
+
+
+class defaults:
+    distbase = ''
+    distdefault = ''
+    aliases = {}
+
+    def __init__(self, servers):
+        self.servers = servers
+
+
+class GetFiletypeTests(unittest.TestCase):
+
+    def testSdist(self):
+        self.assertEqual(get_filetype('foo-1.0.tar.gz'), ('sdist', ''))
+
+    def testEgg(self):
+        self.assertEqual(get_filetype('foo-1.0-py2.7.egg'), ('bdist_egg', '2.7'))
+
+    def testWheel(self):
+        self.assertEqual(get_filetype('foo-1.0-py2-none-any.whl'), ('bdist_wheel', 'py2'))
+
+
+class ExtractPkgInfoTests(JailSetup):
+
+    def testZip(self):
+        with zipfile.ZipFile('foo-1.0.zip', 'w') as archive:
+            archive.writestr('foo-1.0/foo.egg-info/PKG-INFO', 'wrong')
+            archive.writestr('foo-1.0/PKG-INFO', PKG_INFO)
+        self.assertEqual(extract_pkg_info('foo-1.0.zip', self.tempdir),
+                         join(self.tempdir, 'PKG-INFO'))
+        with open('PKG-INFO') as file:
+            self.assertEqual(file.read(), PKG_INFO)
+
+    def testTar(self):
+        os.mkdir('foo-1.0')
+        self.mkfile('foo-1.0/PKG-INFO', PKG_INFO)
+        archive = tarfile.open('foo-1.0.tar.gz', 'w:gz')
+        archive.add('foo-1.0')
+        archive.close()
+        os.mkdir('out')
+        self.assertEqual(extract_pkg_info('foo-1.0.tar.gz', 'out'), 'out/PKG-INFO')
+
+    def testNoArchive(self):
+        self.mkfile('foo-1.0.zip', 'foo')
+        self.assertEqual(extract_pkg_info('foo-1.0.zip', self.tempdir), None)
+
+
+class SyncTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.server = IndexServer()
+        self.locations = Locations(defaults({'index': ServerInfo(self.server.url)}))
+        self.source = join(self.tempdir, 'source')
+        self.dest = join(self.tempdir, 'dest')
+        os.mkdir(self.source)
+        for version in ('1.0', '1.1', '1.2'):
+            with zipfile.ZipFile(join(self.source, 'foo-%s.zip' % version), 'w') as archive:
+                archive.writestr('foo-%s/PKG-INFO' % version,
+                                 PKG_INFO.replace('1.0', version))
+        self.mkfile(join(self.source, 'README.txt'), 'not a dist file')
+
+    def tearDown(self):
+        self.server.stop()
+        JailSetup.tearDown(self)
+
+    def sync(self, source, dest, workers=2):
+        return Sync(self.locations, URLParser(), workers).run(source, [dest])
+
+    @quiet
+    def testLocalToLocal(self):
+        self.assertEqual(self.sync(self.source, self.dest), 3)
+        self.assertEqual(sorted(os.listdir(self.dest)),
+                         ['foo-1.0.zip', 'foo-1.1.zip', 'foo-1.2.zip'])
+
+    @quiet
+    def testDelta(self):
+        os.mkdir(self.dest)
+        with open(join(self.source, 'foo-1.0.zip'), 'rb') as file:
+            self.mkfile(join(self.dest, 'foo-1.0.zip'), file.read())
+        self.assertEqual(self.sync(self.source, self.dest), 2)
+
+    @quiet
+    def testConflictIsLeftAlone(self):
+        os.mkdir(self.dest)
+        self.mkfile(join(self.dest, 'foo-1.0.zip'), 'other')
+        self.assertEqual(self.sync(self.source, self.dest), 2)
+        with open(join(self.dest, 'foo-1.0.zip')) as file:
+            self.assertEqual(file.read(), 'other')
+
+    @quiet
+    def testMissingSource(self):
+        self.assertRaises(SystemExit, self.sync, join(self.tempdir, 'nosuchdir'), self.dest)
+        self.failIf(os.path.exists(self.dest))
+
+    @quiet
+    def testLocalToIndex(self):
+        self.assertEqual(self.sync(self.source, 'index'), 3)
+        self.assertEqual(sorted(self.server.files['foo']),
+                         ['foo-1.0.zip', 'foo-1.1.zip', 'foo-1.2.zip'])
+        # Nothing left to do
+        self.assertEqual(self.sync(self.source, 'index'), 0)
+
+    @quiet
+    def testIndexToLocal(self):
+        self.sync(self.source, 'index')
+        self.assertEqual(self.sync('index', self.dest), 3)
+        with open(join(self.dest, 'foo-1.1.zip'), 'rb') as file:
+            self.assertEqual(file.read(), self.server.files['foo']['foo-1.1.zip'])
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -1,12 +1,15 @@
 import unittest
 import sys
 import os
+import time
+import urllib2
 
 from os.path import join
 
 from jarn.mkrelease.testing import JailSetup
 from jarn.mkrelease.testing import MercurialSetup
 from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import IndexServer
 from jarn.mkrelease.testing import quiet
 
 
@@ -153,6 +156,53 @@ class QuietTests(unittest.TestCase):
         print >>sys.stderr, 'This should not show either'
 
 
+class IndexServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = IndexServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get(self, path):
+        url = self.server.url.replace('/pypi', path)
+        try:
+            return urllib2.urlopen(url).read()
+        except urllib2.HTTPError, e:
+            return e.code
+
+    def testSimpleNotFound(self):
+        self.assertEqual(self.get('/simple/foo/'), 404)
+
+    def testSimple(self):
+        self.server.files['foo'] = {'foo-1.0.zip': 'foo'}
+        self.failUnless('foo-1.0.zip#sha256=2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae'
+                        in self.get('/simple/foo/'))
+
+    def testFailures(self):
+        self.server.files['foo'] = {}
+        self.server.failures = [503]
+        self.assertEqual(self.get('/simple/foo/'), 503)
+        self.failIfEqual(self.get('/simple/foo/'), 503)
+
+    def testLatency(self):
+        self.server.latency = 0.2
+        started = time.time()
+        self.get('/simple/foo/')
+        self.failUnless(time.time() - started >= 0.2)
+
+    def testBandwidth(self):
+        from StringIO import StringIO
+        self.server.bandwidth = 100000
+        started = time.time()
+        self.assertEqual(len(self.server.receive(StringIO('x' * 50000), 50000)), 50000)
+        self.failUnless(time.time() - started >= 0.45)
+
+    def testPypirc(self):
+        self.assertEqual(self.server.get_pypirc('local'),
+            '[local]\nrepository = %s\nusername = fred\npassword = secret\n' % self.server.url)
+
+
 def test_suite():
     return unittest.defaultTestLoader.loadTestsFromName(__name__)
 
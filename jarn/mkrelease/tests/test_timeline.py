@@ -0,0 +1,78 @@
+import unittest
+import json
+import threading
+
+from jarn.mkrelease.timeline import Timeline
+from jarn.mkrelease.timer import Timer
+from jarn.mkrelease.tracing import CommandTracer
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class TimelineTests(unittest.TestCase):
+
+    def spans(self, timeline):
+        return [x for x in timeline.events if x['ph'] == 'X']
+
+    def testAdd(self):
+        timeline = Timeline(lambda: 10.0)
+        timeline.add('dist', 'phase', 11.5, 0.25, {'rc': 0})
+        span = self.spans(timeline)[0]
+        self.assertEqual(span['name'], 'dist')
+        self.assertEqual(span['cat'], 'phase')
+        self.assertEqual(span['ts'], 1500000)
+        self.assertEqual(span['dur'], 250000)
+        self.assertEqual(span['tid'], 1)
+        self.assertEqual(span['args'], {'rc': 0})
+
+    def testLanes(self):
+        timeline = Timeline(lambda: 0)
+        timeline.add('main', 'phase', 0, 1)
+        thread = threading.Thread(target=timeline.add, args=('worker', 'phase', 0, 1))
+        thread.start()
+        thread.join()
+        self.assertEqual([x['tid'] for x in self.spans(timeline)], [1, 2])
+        names = [x['args']['name'] for x in timeline.events if x['ph'] == 'M']
+        self.assertEqual(names, ['MainThread', thread.name])
+
+    def testTimer(self):
+        ticks = iter([0, 1, 3])
+        timer = Timer(lambda: ticks.next())
+        timer.timeline = Timeline(timer.clock, timer.started)
+        with timer.phase('dist'):
+            pass
+        self.assertEqual([(x['name'], x['ts'], x['dur']) for x in self.spans(timer.timeline)],
+                         [('dist', 1000000, 2000000)])
+
+    def testTimerWrap(self):
+        timer = Timer()
+        timer.timeline = Timeline(timer.clock, timer.started)
+        self.assertEqual(timer.wrap('upload', lambda x: x + 1)(1), 2)
+        self.assertEqual([x['name'] for x in self.spans(timer.timeline)], ['upload'])
+        self.assertEqual([name for name, seconds in timer.phases], ['upload'])
+
+    def testCommandTracer(self):
+        timeline = Timeline()
+        tracer = CommandTracer(timeline=timeline)
+        with tracer.command('git config -l') as record:
+            record['rc'] = 0
+        span = self.spans(timeline)[0]
+        self.assertEqual(span['name'], 'git config')
+        self.assertEqual(span['cat'], 'command')
+        self.assertEqual(span['args'], {'cmd': 'git config -l', 'rc': 0})
+
+
+class WriteTests(JailSetup):
+
+    def testWrite(self):
+        timeline = Timeline(lambda: 0)
+        timeline.add('dist', 'phase', 0, 1)
+        timeline.write('trace.json')
+        with open('trace.json') as file:
+            trace = json.load(file)
+        self.assertEqual(len(trace['traceEvents']), 2)
+        self.assertEqual(trace['displayTimeUnit'], 'ms')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,86 @@
+import unittest
+import os
+
+from jarn.mkrelease.process import Process
+from jarn.mkrelease.tracing import CommandTracer, ByteCounter, get_command_name
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class ProcessTracingTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.tracer = CommandTracer()
+        Process.tracer = self.tracer
+
+    def tearDown(self):
+        Process.tracer = None
+        JailSetup.tearDown(self)
+
+    def testPopen(self):
+        process = Process(quiet=True)
+        rc, lines = process.popen('echo "Hello world"; echo oops >&2')
+        self.assertEqual(lines, ['Hello world'])
+        self.assertEqual(len(self.tracer.records), 1)
+        record = self.tracer.records[0]
+        self.assertEqual(record['rc'], rc)
+        self.assertEqual(record['stdout'], 12)
+        self.assertEqual(record['stderr'], 5)
+        self.assertEqual(record['cwd'], os.getcwd())
+        self.failUnless(record['end'] >= record['start'])
+        self.failUnless(record['maxrss'] > 0)
+
+    def testRun(self):
+        process = Process(quiet=True)
+        process.run([process.command('echo foo'), process.command('echo oops >&2; exit 2')])
+        records = sorted(self.tracer.records, key=lambda x: x['cmd'])
+        self.assertEqual([(x['rc'], x['stdout'], x['stderr']) for x in records],
+                         [(0, 4, 0), (2, 0, 5)])
+        self.failIf('started' in records[0])
+
+    def testOsSystem(self):
+        process = Process(quiet=True)
+        self.assertEqual(process.os_system('exit 1'), 256)
+        self.assertEqual(self.tracer.records[0]['rc'], 256)
+        self.assertEqual(self.tracer.records[0]['cmd'], 'exit 1')
+
+    def testOff(self):
+        Process.tracer = None
+        Process(quiet=True).popen('true')
+        self.assertEqual(self.tracer.records, [])
+
+
+class CommandTracerTests(unittest.TestCase):
+
+    def testCommandName(self):
+        self.assertEqual(get_command_name('git config -l'), 'git config')
+        self.assertEqual(get_command_name('svn info "/tmp/foo"'), 'svn info')
+        self.assertEqual(get_command_name('scp "a" "b"'), 'scp')
+        self.assertEqual(get_command_name('hg --version'), 'hg')
+
+    def testByteCounter(self):
+        counter = ByteCounter(False)
+        self.failIf(counter('foo'))
+        self.failIf(counter(''))
+        self.assertEqual(counter.bytes, 5)
+
+    def testSummary(self):
+        ticks = iter([0, 1, 1, 2, 2, 6])
+        tracer = CommandTracer(lambda: ticks.next())
+        for cmd in ('git config -l', 'git config -l', 'svn info'):
+            with tracer.command(cmd):
+                pass
+        self.assertEqual(tracer.get_summary(), [
+            'command    count    seconds  (by count)',
+            'git config     2      2.000',
+            'svn info       1      4.000',
+            'command    count    seconds  (by time)',
+            'svn info       1      4.000',
+            'git config     2      2.000',
+        ])
+        self.assertEqual(len(tracer.get_trace()), 3)
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,189 @@
+import unittest
+import socket
+
+from jarn.mkrelease.upload import Uploader
+from jarn.mkrelease.upload import ConnectionPool
+from jarn.mkrelease.upload import MultipartBody
+from jarn.mkrelease.upload import read_pkg_info
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import IndexServer
+from jarn.mkrelease.testing import quiet
+
+PKG_INFO = """\
+Metadata-Version: 1.0
+Name: foo
+Version: 1.0
+Summary: The foo package
+Home-page: UNKNOWN
+Author: Fred
+Author-email: fred@bedrock.com
+License: BSD
+Description: Foo
+        ===
+        
+        Does foo.
+Keywords: foo bar
+Platform: UNKNOWN
+Classifier: Programming Language :: Python
+Classifier: License :: OSI Approved :: BSD License
+"""
+
+
+class ServerInfo(object):
+
+    def __init__(self, repository, username='fred', password='secret'):
+        self.repository = repository
+        self.username = username
+        self.password = password
+
+
+class ReadPkgInfoTests(JailSetup):
+
+    def testFields(self):
+        self.mkfile('PKG-INFO', PKG_INFO)
+        fields = read_pkg_info('PKG-INFO')
+        self.failUnless(('name', 'foo') in fields)
+        self.failUnless(('version', '1.0') in fields)
+        self.failUnless(('metadata_version', '1.0') in fields)
+        self.failUnless(('author_email', 'fred@bedrock.com') in fields)
+        self.failUnless(('description', 'Foo\n===\n\nDoes foo.') in fields)
+        self.failUnless(('classifiers', 'Programming Language :: Python') in fields)
+        self.failUnless(('classifiers', 'License :: OSI Approved :: BSD License') in fields)
+
+
+class MultipartBodyTests(JailSetup):
+
+    class Connection(object):
+        def __init__(self):
+            self.data = []
+        def send(self, data):
+            self.data.append(data)
+
+    def testLength(self):
+        self.mkfile('foo.zip', 'foo' * 100000)
+        body = MultipartBody([('name', 'foo'), ('version', u'1.0')], [('content', 'foo.zip')])
+        connection = self.Connection()
+        body.send(connection)
+        self.assertEqual(len(body), len(''.join(connection.data)))
+        self.failUnless(len(connection.data) > 5)
+
+    def testEmptyFile(self):
+        self.mkfile('foo.zip', '')
+        body = MultipartBody([], [('content', 'foo.zip')])
+        connection = self.Connection()
+        body.send(connection)
+        self.assertEqual(len(body), len(''.join(connection.data)))
+
+
+class UploaderTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('PKG-INFO', PKG_INFO)
+        self.mkfile('foo-1.0.zip', 'foo')
+        self.mkfile('foo-1.0.zip.asc', 'sig')
+        self.server = IndexServer()
+
+    def tearDown(self):
+        self.server.stop()
+        JailSetup.tearDown(self)
+
+    def testUpload(self):
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertEqual(uploader.run_upload(
+            server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '', signature='foo-1.0.zip.asc'), 0)
+        address, headers, form = self.server.requests[0]
+        self.assertEqual(headers['Authorization'], 'Basic ZnJlZDpzZWNyZXQ=')
+        self.assertEqual(form.getvalue(':action'), 'file_upload')
+        self.assertEqual(form.getvalue('name'), 'foo')
+        self.assertEqual(form.getvalue('filetype'), 'sdist')
+        self.assertEqual(form.getvalue('md5_digest'), 'acbd18db4cc2f85cedef654fccc4a4d8')
+        self.assertEqual(form['content'].filename, 'foo-1.0.zip')
+        self.assertEqual(form['content'].value, 'foo')
+        self.assertEqual(form['gpg_signature'].value, 'sig')
+
+    def testRegister(self):
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertEqual(uploader.run_register(server, 'PKG-INFO'), 0)
+        address, headers, form = self.server.requests[0]
+        self.assertEqual(form.getvalue(':action'), 'submit')
+        self.assertEqual(form.getvalue('version'), '1.0')
+
+    def testKeepAlive(self):
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        uploader.run_register(server, 'PKG-INFO')
+        uploader.run_upload(server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+        uploader.run_upload(server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(set(x[0] for x in self.server.requests)), 1)
+
+    def testReconnect(self):
+        pool = ConnectionPool()
+        uploader = Uploader(pool, quiet=True)
+        server = ServerInfo(self.server.url)
+        uploader.run_upload(server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+        # Simulate the server dropping the idle connection
+        pool.connections.values()[0].sock.close()
+        uploader.run_upload(server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+        self.assertEqual(len(self.server.requests), 2)
+
+    @quiet
+    def testUploadFails(self):
+        self.server.failures = [403]
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertRaises(SystemExit, uploader.run_upload,
+                          server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+
+    @quiet
+    def testDroppedConnection(self):
+        # The server may have processed the request; do not send it again
+        self.server.failures = [0]
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertRaises(SystemExit, uploader.run_upload,
+                          server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def testStaleConnection(self):
+        pool = ConnectionPool()
+        connection = pool.get_connection(self.server.url)
+        self.failIf(pool.is_stale(connection))
+        local, remote = socket.socketpair()
+        connection.sock = local
+        self.failIf(pool.is_stale(connection))
+        remote.close()
+        self.failUnless(pool.is_stale(connection))
+        local.close()
+        self.failUnless(pool.is_stale(connection))
+
+    def testStream(self):
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertEqual(uploader.run_upload(
+            server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '', stream=iter(['f', 'oo'])), 0)
+        self.assertEqual(self.server.files, {'foo': {'foo-1.0.zip': 'foo'}})
+
+    @quiet
+    def testStreamNoRetry(self):
+        # A consumed stream cannot be sent again
+        self.server.failures = [0]
+        uploader = Uploader(quiet=True)
+        server = ServerInfo(self.server.url)
+        self.assertRaises(SystemExit, uploader.run_upload,
+            server, 'PKG-INFO', 'foo-1.0.zip', 'sdist', '', stream=iter(['foo']))
+        self.assertEqual(len(self.server.requests), 1)
+
+    @quiet
+    def testNoServer(self):
+        uploader = Uploader(quiet=True)
+        server = ServerInfo('http://127.0.0.1:1/pypi')
+        self.assertRaises(SystemExit, uploader.run_register, server, 'PKG-INFO')
+
+
+def test_suite():
+    return unittest.defaultTestLoader.loadTestsFromName(__name__)
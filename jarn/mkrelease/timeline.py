@@ -0,0 +1,62 @@
+import os
+import json
+import threading
+
+from timer import monotonic
+from exit import err_exit
+
+
+class Timeline(object):
+    """Collect spans for the Chrome trace event format.
+
+    Every thread gets its own lane. Times are given in seconds of
+    'clock' and are stored relative to 'origin'.
+    """
+
+    def __init__(self, clock=monotonic, origin=None):
+        self.clock = clock
+        self.origin = clock() if origin is None else origin
+        self.pid = os.getpid()
+        self.events = []
+        self.lanes = {}
+        self.lock = threading.Lock()
+
+    def get_lane(self):
+        """Return the lane of the current thread.
+        """
+        thread = threading.current_thread()
+        with self.lock:
+            if thread.ident not in self.lanes:
+                tid = len(self.lanes) + 1
+                self.lanes[thread.ident] = tid
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                    'args': {'name': thread.name}})
+            return self.lanes[thread.ident]
+
+    def add(self, name, category, started, seconds, args=None):
+        """Add a span that began at clock time 'started'.
+        """
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int((started - self.origin) * 1000000),
+            'dur': int(seconds * 1000000),
+            'pid': self.pid,
+            'tid': self.get_lane(),
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    def write(self, filename):
+        """Write the trace to 'filename'.
+        """
+        try:
+            with open(filename, 'wt') as file:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, file)
+                file.write('\n')
+        except (IOError, OSError), e:
+            err_exit('ERROR: Failed to write %(filename)s: %(e)s' % locals())
@@ -0,0 +1,138 @@
+import time
+import json
+
+from contextlib import contextmanager
+
+from exit import err_exit
+
+
+def get_monotonic_clock():
+    """Return a function returning monotonic seconds.
+
+    Python 2 has no time.monotonic; we call clock_gettime from libc
+    where possible and fall back to wall-clock time.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+
+    import ctypes
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    try:
+        try:
+            libc = ctypes.CDLL('libc.so.6')
+        except OSError:
+            # Slow: find_library may run ldconfig
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError, TypeError):
+        return time.time
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    CLOCK_MONOTONIC = 1
+    ts = timespec()
+
+    def monotonic():
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+            return time.time()
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+        return time.time
+    return monotonic
+
+_monotonic = None
+
+
+def monotonic():
+    """Return monotonic seconds.
+
+    The clock is looked up on first use, loading ctypes only when
+    something is timed.
+    """
+    global _monotonic
+    if _monotonic is None:
+        _monotonic = get_monotonic_clock()
+    return _monotonic()
+
+
+class Timer(object):
+    """Measure the durations of release phases.
+
+    Phases are recorded in the order they finish, as (name, seconds)
+    tuples. Phases may nest; a phase that is entered more than once
+    is recorded once per run. If 'timeline' is set, phases are added
+    to it as spans. The innermost phase left by an exception is kept
+    in 'failed'.
+    """
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self.timestamp = time.time()
+        self.started = clock()
+        self.phases = []
+        self.timeline = None
+        self.failed = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as phase 'name'.
+        """
+        started = self.clock()
+        try:
+            yield
+        except BaseException:
+            if self.failed is None:
+                self.failed = name
+            raise
+        finally:
+            seconds = self.clock() - started
+            self.phases.append((name, seconds))
+            if self.timeline is not None:
+                self.timeline.add(name, 'phase', started, seconds)
+
+    def wrap(self, name, func):
+        """Return a function timing calls of 'func' as phase 'name'.
+        """
+        def wrapper(*args, **kw):
+            with self.phase(name):
+                return func(*args, **kw)
+        return wrapper
+
+    def total(self):
+        """Return the seconds elapsed since the timer was created.
+        """
+        return self.clock() - self.started
+
+    def get_summary(self):
+        """Return the summary table as a list of lines.
+
+        Phases are sorted by duration, longest first.
+        """
+        phases = sorted(self.phases, key=lambda x: -x[1])
+        width = max([len(name) for name, seconds in phases] + [len('total')])
+        lines = ['%-*s %10s' % (width, 'phase', 'seconds')]
+        for name, seconds in phases:
+            lines.append('%-*s %10.3f' % (width, name, seconds))
+        lines.append('%-*s %10.3f' % (width, 'total', self.total()))
+        return lines
+
+    def write_report(self, filename, status=0):
+        """Write the timings to 'filename' as JSON.
+        """
+        report = {
+            'timestamp': self.timestamp,
+            'status': status,
+            'total': self.total(),
+            'phases': [{'name': name, 'seconds': seconds}
+                       for name, seconds in self.phases],
+        }
+        try:
+            with open(filename, 'wt') as file:
+                json.dump(report, file, indent=1, sort_keys=True)
+                file.write('\n')
+        except (IOError, OSError), e:
+            err_exit('ERROR: Failed to write %(filename)s: %(e)s' % locals())
@@ -0,0 +1,130 @@
+import os
+import time
+import resource
+import threading
+
+from contextlib import contextmanager
+
+from tee import On, Off
+from timer import monotonic
+
+
+class ByteCounter(object):
+    """A tee filter counting the bytes passing through it.
+
+    Wraps another filter, or a boolean as accepted by tee.popen.
+    Lines are counted with their newline but without trailing
+    whitespace.
+    """
+
+    def __init__(self, filter):
+        if not callable(filter):
+            filter = On() if filter else Off()
+        self.filter = filter
+        self.bytes = 0
+
+    def __call__(self, line):
+        self.bytes += len(line) + 1
+        return self.filter(line)
+
+
+def get_command_name(cmd):
+    """Return the first two words of 'cmd', e.g. 'git config'.
+    """
+    words = cmd.split()
+    if len(words) > 1 and not words[1].startswith(('-', '"', "'")):
+        return ' '.join(words[:2])
+    return ' '.join(words[:1])
+
+
+class CommandTracer(object):
+    """Record the external commands run by Process.
+
+    Every record is a dict with the command, working directory,
+    start and end time, exit code, stdout and stderr byte counts,
+    and the user and system CPU time and maximum RSS of children.
+
+    Resource usage is measured with RUSAGE_CHILDREN; when commands
+    run concurrently, their CPU times may be attributed to each
+    other. Max RSS is the high-water mark of all children so far.
+
+    If 'timeline' is given, commands are added to it as spans.
+    """
+
+    def __init__(self, clock=monotonic, timeline=None):
+        self.clock = clock
+        self.timeline = timeline
+        self.records = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def command(self, cmd):
+        """Trace the command run in the body of a with statement.
+
+        Yields the record, so the caller can fill in 'rc', 'stdout',
+        and 'stderr'.
+        """
+        record = self.start(cmd)
+        try:
+            yield record
+        finally:
+            self.finish(record)
+
+    def start(self, cmd):
+        """Return a new record for 'cmd', which is starting now.
+        """
+        return {
+            'cmd': cmd,
+            'cwd': os.getcwd(),
+            'start': time.time(),
+            'rc': None,
+            'stdout': 0,
+            'stderr': 0,
+            'started': self.clock(),
+            'rusage': resource.getrusage(resource.RUSAGE_CHILDREN),
+        }
+
+    def finish(self, record):
+        """Complete 'record' of a command that has finished.
+        """
+        started = record.pop('started')
+        before = record.pop('rusage')
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        record['seconds'] = self.clock() - started
+        record['end'] = record['start'] + record['seconds']
+        record['utime'] = after.ru_utime - before.ru_utime
+        record['stime'] = after.ru_stime - before.ru_stime
+        record['maxrss'] = after.ru_maxrss
+        with self.lock:
+            self.records.append(record)
+        if self.timeline is not None:
+            self.timeline.add(get_command_name(record['cmd']), 'command', started,
+                              record['seconds'], {'cmd': record['cmd'], 'rc': record['rc']})
+
+    def get_trace(self):
+        """Return the trace as a list of lines.
+        """
+        lines = []
+        for x in sorted(self.records, key=lambda x: x['start']):
+            lines.append('%7.3fs rc=%s out=%d err=%d user=%.3f sys=%.3f rss=%dK %s $ %s' %
+                         (x['seconds'], x['rc'], x['stdout'], x['stderr'],
+                          x['utime'], x['stime'], x['maxrss'], x['cwd'], x['cmd']))
+        return lines
+
+    def get_summary(self, top=10):
+        """Return the 'top' commands by count and by time as a list of lines.
+        """
+        totals = {}
+        for x in self.records:
+            count, seconds = totals.get(get_command_name(x['cmd']), (0, 0.0))
+            totals[get_command_name(x['cmd'])] = (count + 1, seconds + x['seconds'])
+        items = totals.items()
+        width = max([len(name) for name in totals] + [len('command')])
+
+        lines = []
+        for title, key in (('by count', lambda x: (-x[1][0], -x[1][1])),
+                           ('by time', lambda x: (-x[1][1], -x[1][0]))):
+            lines.append('%-*s %5s %10s  (%s)' % (width, 'command', 'count', 'seconds', title))
+            for name, (count, seconds) in sorted(items, key=key)[:top]:
+                lines.append('%-*s %5d %10.3f' % (width, name, count, seconds))
+        return lines
@@ -0,0 +1,279 @@
+import socket
+import select
+import httplib
+import getpass
+
+from base64 import standard_b64encode
+from email.parser import Parser
+from os.path import basename, getsize
+from urlparse import urlsplit
+
+from digest import get_digests
+from exit import err_exit
+
+BOUNDARY = '--------------GHSKFJDLGDS7543FJKLFHRE75642756743254'
+BLOCKSIZE = 64 * 1024
+
+LIST_FIELDS = ('platform', 'classifiers', 'provides', 'requires', 'obsoletes')
+
+PKG_INFO_FIELDS = (
+    ('Metadata-Version', 'metadata_version'),
+    ('Name', 'name'),
+    ('Version', 'version'),
+    ('Summary', 'summary'),
+    ('Home-page', 'home_page'),
+    ('Author', 'author'),
+    ('Author-email', 'author_email'),
+    ('License', 'license'),
+    ('Description', 'description'),
+    ('Keywords', 'keywords'),
+    ('Platform', 'platform'),
+    ('Classifier', 'classifiers'),
+    ('Download-URL', 'download_url'),
+    ('Provides', 'provides'),
+    ('Requires', 'requires'),
+    ('Obsoletes', 'obsoletes'),
+)
+
+
+def read_pkg_info(filename):
+    """Read the PKG-INFO file 'filename' and return a list of form fields.
+    """
+    with open(filename, 'rt') as file:
+        message = Parser().parse(file, headersonly=True)
+    fields = []
+    for header, field in PKG_INFO_FIELDS:
+        if field in LIST_FIELDS:
+            for value in message.get_all(header, []):
+                fields.append((field, value))
+        elif header in message:
+            value = message[header]
+            if header == 'Description':
+                value = value.replace('\n' + 8*' ', '\n')
+            fields.append((field, value))
+    return fields
+
+
+class MultipartBody(object):
+    """A multipart/form-data body streamed from disk.
+
+    The 'fields' argument is a list of (name, value) tuples, the
+    'files' argument a list of (name, filename) or (name, filename,
+    blocks) tuples. If 'blocks' is given, the file's content is taken
+    from that iterable instead of being read from disk.
+    """
+
+    def __init__(self, fields, files=()):
+        self.parts = []
+        sep_boundary = '\r\n--' + BOUNDARY
+        for name, value in fields:
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            self.parts.append(
+                '%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s' %
+                (sep_boundary, name, value))
+        for file in files:
+            name, filename = file[:2]
+            self.parts.append(
+                '%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n' %
+                (sep_boundary, name, basename(filename)))
+            self.parts.append(FilePart(*file[1:]))
+        self.parts.append(sep_boundary + '--\r\n')
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % BOUNDARY
+
+    def send(self, connection):
+        for part in self.parts:
+            if isinstance(part, FilePart):
+                part.send(connection)
+            else:
+                connection.send(part)
+
+
+class FilePart(object):
+    """A file sent in blocks."""
+
+    def __init__(self, filename, blocks=None):
+        self.filename = filename
+        self.size = getsize(filename)
+        self.blocks = blocks
+
+    def __len__(self):
+        return self.size
+
+    def send(self, connection):
+        if self.blocks is not None:
+            for block in self.blocks:
+                connection.send(block)
+            return
+        with open(self.filename, 'rb') as file:
+            while True:
+                block = file.read(BLOCKSIZE)
+                if not block:
+                    break
+                connection.send(block)
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP connections, one per scheme, host, and port."""
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self.connections = {}
+
+    def get_connection(self, url, fresh=False):
+        """Return a connection for 'url'.
+
+        If 'fresh' is True, a pooled connection is discarded first.
+        """
+        scheme, netloc = urlsplit(url)[:2]
+        if scheme not in ('http', 'https'):
+            err_exit('Unsupported URL scheme: %(scheme)s' % locals())
+        key = (scheme, netloc.split('@')[-1])
+        if fresh or self.is_stale(self.connections.get(key)):
+            self.discard(key)
+        if key not in self.connections:
+            if scheme == 'https':
+                factory = httplib.HTTPSConnection
+            else:
+                factory = httplib.HTTPConnection
+            self.connections[key] = factory(key[1], timeout=self.timeout)
+        return self.connections[key]
+
+    def is_stale(self, connection):
+        """Return True if the server has closed the pooled 'connection'.
+
+        An idle keep-alive connection is readable only if the server
+        has closed it.
+        """
+        if connection is None or connection.sock is None:
+            return False
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (select.error, socket.error, ValueError):
+            return True
+
+    def discard(self, key):
+        connection = self.connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for key in self.connections.keys():
+            self.discard(key)
+
+
+class Uploader(object):
+    """In-process register and upload to index servers."""
+
+    def __init__(self, pool=None, quiet=False):
+        self.pool = pool or ConnectionPool()
+        self.quiet = quiet
+
+    def get_password(self, server):
+        if not server.password:
+            server.password = getpass.getpass('Password for %s: ' % server.repository)
+        return server.password
+
+    def post(self, server, body):
+        """POST 'body' to the repository of 'server'.
+
+        Returns a (status, reason) tuple. If the connection fails before
+        the request is sent, it is retried once with a new connection.
+        Once the request is on its way, it is never sent again, since
+        the server may already have received it.
+        """
+        url = server.repository
+        path = urlsplit(url)[2] or '/'
+        auth = 'Basic ' + standard_b64encode(
+            '%s:%s' % (server.username, self.get_password(server)))
+
+        for fresh in (False, True):
+            connection = self.pool.get_connection(url, fresh)
+            sent = False
+            try:
+                if connection.sock is None:
+                    connection.connect()
+                sent = True
+                connection.putrequest('POST', path)
+                connection.putheader('Content-Type', body.content_type)
+                connection.putheader('Content-Length', str(len(body)))
+                connection.putheader('Authorization', auth)
+                connection.endheaders()
+                body.send(connection)
+                response = connection.getresponse()
+                response.read()
+                return response.status, response.reason
+            except (httplib.HTTPException, socket.error), e:
+                connection.close()
+                if fresh or sent:
+                    return 0, str(e)
+
+    def run_register(self, server, pkginfo, quiet=False):
+        """Register the release described by 'pkginfo' with 'server'.
+        """
+        if not self.quiet:
+            print 'running register'
+            if not quiet:
+                print 'Registering to %s' % server.repository
+
+        fields = [(':action', 'submit')] + read_pkg_info(pkginfo)
+        status, reason = self.post(server, MultipartBody(fields))
+
+        if status == 200:
+            self.report(status, reason, quiet)
+            return 0
+        err_exit('ERROR: register failed (%s): %s' % (status, reason))
+
+    def run_upload(self, server, pkginfo, distfile, filetype, pyversion,
+                   digests=None, signature=None, quiet=False, stream=None):
+        """Upload 'distfile' to 'server'.
+
+        The 'digests' argument allows to pass precomputed digests.
+        If 'signature' is given, it must be the name of a detached
+        GnuPG signature of 'distfile'. If 'stream' is given, it must
+        be an iterable of the blocks of 'distfile'.
+        """
+        if not self.quiet:
+            print 'running upload'
+            if not quiet:
+                print 'Submitting dist/%s to %s' % (basename(distfile), server.repository)
+
+        if digests is None:
+            digests = get_digests(distfile)
+
+        fields = [
+            (':action', 'file_upload'),
+            ('protocol_version', '1'),
+            ('filetype', filetype),
+            ('pyversion', pyversion),
+            ('md5_digest', digests['md5']),
+            ('sha256_digest', digests['sha256']),
+            ('comment', ''),
+        ]
+        if 'blake2_256' in digests:
+            fields.append(('blake2_256_digest', digests['blake2_256']))
+        fields += read_pkg_info(pkginfo)
+        files = [('content', distfile, stream)]
+        if signature:
+            files.append(('gpg_signature', signature))
+
+        status, reason = self.post(server, MultipartBody(fields, files))
+
+        if status == 200:
+            self.report(status, reason, quiet)
+            return 0
+        err_exit('ERROR: upload failed (%s): %s' % (status, reason))
+
+    def report(self, status, reason, quiet):
+        if not self.quiet:
+            if quiet:
+                print 'OK'
+            else:
+                print 'Server response (%s): %s' % (status, reason)